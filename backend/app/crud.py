@@ -1,6 +1,13 @@
+import numpy as np
+from typing import Optional
+from sqlalchemy import tuple_, update
 from sqlalchemy.orm import Session
 from app.models import catalog as models
+from app.models.catalog import MinHashBucket
+from app.models.chunk import Chunk, EmbeddingCache
+from app.models.scene import Scene, Character
 from app import schemas
+from app.utils.fingerprint import lsh_buckets, similarity
 
 def get_book_by_title(db: Session, title: str):
     # Simple case-insensitive search (ILIKE equivalent in python logic or SQL)
@@ -19,4 +26,129 @@ def create_book(db: Session, book: schemas.CatalogCreate):
     return db_book
 
 def get_all_books(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Catalog).offset(skip).limit(limit).all()
\ No newline at end of file
+    return db.query(models.Catalog).offset(skip).limit(limit).all()
+
+# --- BULK WRITES ---
+# Rows per INSERT round-trip for big ingests (chunks, scenes, characters)
+BULK_INSERT_BATCH = 1000
+
+def _insert_for(db: Session, table):
+    """INSERT that supports ON CONFLICT DO NOTHING on Postgres (and SQLite for local dev)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy import insert
+    return insert(table)
+
+def bulk_insert(db: Session, model, rows: list, conflict_columns: Optional[list] = None,
+                batch_size: int = BULK_INSERT_BATCH) -> int:
+    """
+    Inserts many rows (dicts of column -> value) with one statement per batch instead
+    of one ORM object per row. With conflict_columns, rows that hit that unique key
+    are skipped (ON CONFLICT DO NOTHING). Column defaults (ids etc.) still apply.
+    Does not commit. Returns the number of rows sent.
+    """
+    if not rows:
+        return 0
+    stmt = _insert_for(db, model.__table__)
+    if conflict_columns and hasattr(stmt, "on_conflict_do_nothing"):
+        stmt = stmt.on_conflict_do_nothing(index_elements=conflict_columns)
+
+    for start in range(0, len(rows), batch_size):
+        db.execute(stmt, rows[start:start + batch_size])
+    return len(rows)
+
+def bulk_insert_chunks(db: Session, rows: list) -> int:
+    return bulk_insert(db, Chunk, rows)
+
+def update_chunks(db: Session, rows: list, batch_size: int = BULK_INSERT_BATCH) -> int:
+    """Bulk UPDATE by primary key (rows are dicts with "id" + the columns to set). Does not commit."""
+    for start in range(0, len(rows), batch_size):
+        db.execute(update(Chunk), rows[start:start + batch_size])
+    return len(rows)
+
+def delete_chunks(db: Session, chunk_ids: list, batch_size: int = BULK_INSERT_BATCH) -> int:
+    """Does not commit."""
+    for start in range(0, len(chunk_ids), batch_size):
+        db.query(Chunk).filter(Chunk.id.in_(chunk_ids[start:start + batch_size])).delete(synchronize_session=False)
+    return len(chunk_ids)
+
+def bulk_insert_scenes(db: Session, rows: list) -> int:
+    return bulk_insert(db, Scene, rows)
+
+def bulk_insert_characters(db: Session, catalog_id: str, names: list, aliases: Optional[dict] = None) -> int:
+    """Adds characters; names the book already has are skipped by the unique key."""
+    aliases = aliases or {}
+    rows = [
+        {"catalog_id": catalog_id, "name": name, "aliases": aliases.get(name) or []}
+        for name in dict.fromkeys(names)
+    ]
+    return bulk_insert(db, Character, rows, conflict_columns=["catalog_id", "name"])
+
+# --- EMBEDDING CACHE ---
+def get_cached_embeddings(db: Session, hashes: list, model: str) -> dict:
+    """{content_hash: float32 vector} for the hashes already embedded with this model."""
+    found = {}
+    wanted = list(dict.fromkeys(hashes))
+    for start in range(0, len(wanted), BULK_INSERT_BATCH):
+        rows = db.query(EmbeddingCache.content_hash, EmbeddingCache.vector).filter(
+            EmbeddingCache.model == model,
+            EmbeddingCache.content_hash.in_(wanted[start:start + BULK_INSERT_BATCH])
+        ).all()
+        for content_hash, vector in rows:
+            found[content_hash] = np.frombuffer(vector, dtype="float32")
+    return found
+
+def cache_embeddings(db: Session, hashes: list, vectors: np.ndarray, model: str) -> int:
+    """Stores embeddings by content hash (already cached ones are skipped). Does not commit."""
+    rows = {
+        content_hash: {"content_hash": content_hash, "model": model,
+                       "vector": np.ascontiguousarray(vector, dtype="float32").tobytes()}
+        for content_hash, vector in zip(hashes, vectors)
+    }
+    return bulk_insert(db, EmbeddingCache, list(rows.values()), conflict_columns=["content_hash", "model"])
+
+# --- NEAR-DUPLICATE BOOKS (MinHash LSH) ---
+def index_fingerprint(db: Session, catalog_id: str, signature: list) -> int:
+    """Adds the book's LSH buckets (replacing old ones). Does not commit."""
+    db.query(MinHashBucket).filter(MinHashBucket.catalog_id == catalog_id).delete()
+    if not signature:
+        return 0  # No fingerprint (text too short): never a duplicate candidate
+    rows = [{"band": band, "bucket": bucket, "catalog_id": catalog_id} for band, bucket in lsh_buckets(signature)]
+    return bulk_insert(db, MinHashBucket, rows, conflict_columns=["band", "bucket", "catalog_id"])
+
+def find_similar_books(db: Session, signature: list, exclude_id: Optional[str] = None,
+                       min_similarity: float = 0.0, limit: int = 10) -> list:
+    """
+    Books whose signature shares an LSH bucket with this one, as [(Catalog, similarity)],
+    most similar first. Only candidates from the buckets are compared, never the whole catalog.
+    """
+    if not signature:
+        return []
+    pairs = lsh_buckets(signature)
+    query = db.query(MinHashBucket.catalog_id).filter(
+        tuple_(MinHashBucket.band, MinHashBucket.bucket).in_(pairs)
+    )
+    candidate_ids = {row[0] for row in query.distinct().all()} - {exclude_id}
+    if not candidate_ids:
+        return []
+
+    scored = []
+    for book in db.query(models.Catalog).filter(models.Catalog.id.in_(candidate_ids)).all():
+        score = similarity(signature, book.fingerprints) # type: ignore
+        if score >= min_similarity:
+            scored.append((book, score))
+    scored.sort(key=lambda pair: pair[1], reverse=True)
+    return scored[:limit]
+
+def resolve_linked_books(db: Session, catalog_ids: list) -> list:
+    """Maps books linked as duplicates to the book that holds their content."""
+    links = dict(
+        db.query(models.Catalog.id, models.Catalog.duplicate_of)
+        .filter(models.Catalog.id.in_(catalog_ids), models.Catalog.duplicate_of.isnot(None))
+        .all()
+    )
+    return list(dict.fromkeys(links.get(c_id, c_id) for c_id in catalog_ids))
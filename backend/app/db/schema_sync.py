@@ -0,0 +1,33 @@
+from sqlalchemy import inspect, text
+
+def sync_schema(engine, base):
+    """
+    create_all() only creates missing tables. This also adds nullable columns and
+    indexes that were added to existing models later, so an existing database keeps working.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"🛠️ Added column {table.name}.{column.name}")
+
+    for table in base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=engine)
+                print(f"🛠️ Added index {index.name}")
+            except Exception as e:
+                # e.g. a unique index over rows that already contain duplicates
+                print(f"⚠️ Could not add index {index.name}: {e}")
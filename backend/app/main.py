@@ -2,8 +2,6 @@ import os
 import requests
 from fastapi import FastAPI, Depends, UploadFile, File, HTTPException, Form
 from pydantic import BaseModel
-import shutil
-import fitz # PyMuPDF
 import math
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -11,10 +9,13 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from app.db.session import engine, Base, get_db
+from app.db.schema_sync import sync_schema
+from app import crud
+from app.utils.parsing import iter_pdf_pages, spool_upload
 
 # Import Models
-from app.models import catalog, content
-from app.models.scene import Scene
+from app.models import catalog, content, job
+from app.models.scene import Scene, SceneAsset
 
 # Import Routes
 from app.routes import catalog as catalog_router
@@ -32,8 +33,9 @@ APP_DIR = os.path.dirname(CURRENT_FILE)
 BACKEND_DIR = os.path.dirname(APP_DIR)
 STATIC_DIR = os.path.join(BACKEND_DIR, "static")
 
-# Create tables
+# Create tables (+ columns added to models since the database was created)
 Base.metadata.create_all(bind=engine)
+sync_schema(engine, Base)
 
 app = FastAPI(title="Historabook AI", version="0.6.0")
 
@@ -62,6 +64,33 @@ app.include_router(listen_router.router, prefix="/api/listen", tags=["Listen"])
 app.include_router(chat_router.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(visuals_router.router, prefix="/api/visuals", tags=["Visuals"])
 
+# --- INGEST WORKERS ---
+# Production runs `python worker.py --processes N` next to the API (any number of machines).
+# For a single-process dev setup, INGEST_LOCAL_WORKERS=1 runs the same job loop in-process.
+INGEST_LOCAL_WORKERS = int(os.getenv("INGEST_LOCAL_WORKERS", "0"))
+
+@app.on_event("startup")
+def start_ingest_workers():
+    if INGEST_LOCAL_WORKERS > 0:
+        from app.utils.job_queue import start_local_workers
+        start_local_workers(ingest_router.run_ingest_job, INGEST_LOCAL_WORKERS)
+        print(f"👷 Started {INGEST_LOCAL_WORKERS} local ingest worker(s).")
+
+# --- TTS WORKERS ---
+# Voices in TTS_PRELOAD_VOICES are loaded at startup so the first request is warm too
+@app.on_event("startup")
+def start_tts_pool():
+    from app.utils.tts_pool import TTS_PRELOAD_VOICES, get_tts_pool
+    if TTS_PRELOAD_VOICES:
+        get_tts_pool()
+
+# --- MODEL RESIDENCY ---
+@app.get("/api/models")
+def model_stats():
+    """Which models are loaded, their measured RAM/VRAM, loads and evictions."""
+    from app.utils.model_registry import model_registry
+    return model_registry.stats()
+
 @app.get("/")
 async def root():
     index_path = os.path.join(STATIC_DIR, "index.html")
@@ -84,21 +113,14 @@ async def upload_book(
         os.makedirs("storage", exist_ok=True)
         file_path = f"storage/{filename}"
         
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        file_size = os.path.getsize(file_path)
+        # Stream the upload to disk instead of holding it in memory
+        file_size = await spool_upload(file, file_path)
         
-        # Extract Text
-        doc = fitz.open(file_path)
-        full_text = ""
+        # Extract Text (pages are parsed in parallel; list + join instead of repeated +=)
         # Read more pages for Series mode to get every detail
         page_limit = 200 if mode == "series" else 50 
-        for i in range(len(doc)):
-            if i > page_limit: break 
-            page = doc[i]
-            text = page.get_text()
-            if text: full_text += str(text)
+        page_texts = [page["text"] for page in iter_pdf_pages(file_path, max_pages=page_limit + 1)]
+        full_text = "".join(text for text in page_texts if text)
             
         book_id = filename.replace(".pdf", "").replace(" ", "_").lower()
         
@@ -124,6 +146,8 @@ async def upload_book(
             db.add(new_content)
 
         # --- SMART SLICING ---
+        # Manifests first: they reference the scenes (and the scene ids are reused)
+        db.query(SceneAsset).filter(SceneAsset.catalog_id == book_id).delete()
         db.query(Scene).filter(Scene.catalog_id == book_id).delete()
         db.commit()
 
@@ -141,6 +165,7 @@ async def upload_book(
             
             print(f"📖 Slicing into {num_scenes} scenes (Mode: {mode})...")
 
+            scene_rows = []
             for i in range(num_scenes):
                 start = i * CHUNK_SIZE
                 end = min(start + CHUNK_SIZE, total_chars)
@@ -152,15 +177,17 @@ async def upload_book(
                 if i == 0: scene_title = "Chapter 1: The Beginning"
                 elif i == num_scenes - 1: scene_title = "Final Chapter: Conclusion"
 
-                new_scene = Scene(
-                    id=f"{book_id}_s{i+1}",
-                    catalog_id=book_id,
-                    order_index=i,
-                    title=scene_title,
-                    content_summary=chunk_text,
-                    characters_present=[]
-                )
-                db.add(new_scene)
+                scene_rows.append({
+                    "id": f"{book_id}_s{i+1}",
+                    "catalog_id": book_id,
+                    "order_index": i,
+                    "title": scene_title,
+                    "content_summary": chunk_text,
+                    "characters_present": [],
+                })
+
+            # One INSERT per batch instead of one ORM object per scene
+            crud.bulk_insert_scenes(db, scene_rows)
 
         db.commit()
         
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Text, Boolean, JSON  # <--- Added JSON
+from sqlalchemy import Column, String, Integer, Text, Boolean, JSON, BigInteger, ForeignKey  # <--- Added JSON
 from app.db.session import Base
 import uuid
 
@@ -16,4 +16,19 @@ class Catalog(Base):
     is_public = Column(Boolean, default=True)
     
     # NEW: Stores the MinHash signature
-    fingerprints = Column(JSON, nullable=True)
\ No newline at end of file
+    fingerprints = Column(JSON, nullable=True)
+
+    # Set when an upload was a near-duplicate of an ingested book: this entry reuses
+    # that book's chunks/vectors/scenes instead of running the pipeline again
+    duplicate_of = Column(String, ForeignKey("catalog.id"), nullable=True)
+
+class MinHashBucket(Base):
+    """
+    Persistent LSH index over Catalog.fingerprints: the signature is cut into bands and
+    every band is hashed to a bucket. Books sharing any (band, bucket) are candidates.
+    """
+    __tablename__ = "minhash_buckets"
+
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    catalog_id = Column(String, ForeignKey("catalog.id"), primary_key=True, index=True)
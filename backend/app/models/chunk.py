@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Integer, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, ForeignKey, LargeBinary
 from app.db.session import Base
 import uuid
 
@@ -15,7 +15,22 @@ class Chunk(Base):
     chunk_index = Column(Integer) # Order (0, 1, 2, 3...)
     
     # Metadata for citations
-    page_number = Column(Integer, nullable=True) 
+    page_number = Column(Integer, nullable=True)  # Page the chunk starts on
+    page_end = Column(Integer, nullable=True)     # Page it ends on (chunks can span a page break)
+
+    # sha256 of the normalized text: a re-ingest keeps chunks whose hash is unchanged
+    content_hash = Column(String(64), nullable=True, index=True)
     
     # We will fill this in Day 9 (Embeddings)
-    # embedding_id = Column(String, nullable=True)
\ No newline at end of file
+    # embedding_id = Column(String, nullable=True)
+
+class EmbeddingCache(Base):
+    """
+    Embedding of a chunk text, keyed by Chunk.content_hash + model name, so the same
+    text is never embedded twice (re-ingests, re-uploads, books sharing passages).
+    """
+    __tablename__ = "embedding_cache"
+
+    content_hash = Column(String(64), primary_key=True)
+    model = Column(String, primary_key=True)
+    vector = Column(LargeBinary)  # float32 bytes
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, JSON, DateTime
+from app.db.session import Base
+from datetime import datetime
+import uuid
+
+def generate_uuid():
+    return str(uuid.uuid4())
+
+class IngestJob(Base):
+    """A queued book ingestion (parse -> chunk -> embed -> index -> scene graph)"""
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String, primary_key=True, default=generate_uuid, index=True)
+    catalog_id = Column(String, ForeignKey("catalog.id"), index=True)
+    file_path = Column(String)  # Uploaded PDF spooled to storage/
+
+    # queued -> running -> done | failed (failed attempts go back to queued until max_attempts)
+    status = Column(String, default="queued", index=True)
+    stage = Column(String, nullable=True)  # Stage currently running
+    # Per-stage progress: {"parse": {"done": 1, "total": 1}, "embed": {"done": 512, "total": 2048}, ...}
+    progress = Column(JSON, default=dict)
+
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    error = Column(Text, nullable=True)
+
+    # Lease: a worker that dies mid-job stops renewing this and the job is picked up again
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    run_after = Column(DateTime, default=datetime.utcnow)  # Retry backoff
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, String, Integer, Text, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, JSON, Index, DateTime
 from sqlalchemy.orm import relationship
 from app.db.session import Base
+from datetime import datetime
 import uuid
 
 def generate_uuid():
@@ -26,6 +27,8 @@ class Scene(Base):
 class Character(Base):
     """Profile of a person found in the book (Day 11 & 12)"""
     __tablename__ = "characters"
+    # One row per name per book (bulk inserts rely on it: ON CONFLICT DO NOTHING)
+    __table_args__ = (Index("uq_characters_catalog_name", "catalog_id", "name", unique=True),)
     
     id = Column(String, primary_key=True, default=generate_uuid)
     catalog_id = Column(String, ForeignKey("catalog.id"))
@@ -34,4 +37,24 @@ class Character(Base):
     aliases = Column(JSON) # ["Leonardo", "da Vinci", "The Artist"]
     
     # We will use this later for Voice Cloning (Day 27)
-    voice_profile_id = Column(String, nullable=True)
\ No newline at end of file
+    voice_profile_id = Column(String, nullable=True)
+
+class SceneAsset(Base):
+    """What has been rendered for a scene: its lesson plan and the cache keys of its audio and frames"""
+    __tablename__ = "scene_assets"
+
+    scene_id = Column(String, ForeignKey("scenes.id"), primary_key=True)
+    catalog_id = Column(String, ForeignKey("catalog.id"), index=True)
+
+    # pending -> rendering -> ready | failed
+    status = Column(String, default="pending", index=True)
+    plan = Column(JSON, nullable=True)  # LessonPlan as a dict
+    # Per plan segment: [{"key": ..., "filename": ...}] and [{"key": ..., "filenames": [...]}]
+    audio = Column(JSON, default=list)
+    images = Column(JSON, default=list)
+    # Models it was made with: {"planner": ..., "voice": ..., "image": ..., "frames": 3}
+    models = Column(JSON, default=dict)
+    error = Column(Text, nullable=True)
+
+    locked_at = Column(DateTime, nullable=True)  # Render lease
+    updated_at = Column(DateTime, default=datetime.utcnow)
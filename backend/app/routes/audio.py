@@ -1,9 +1,13 @@
 import os
-import hashlib
-import subprocess
+import queue
+import threading
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+from app.utils.chunking import split_sentences
+from app.utils.asset_cache import audio_cache, encode_audio
+from app.utils.tts_piper import narration_key
+from app.utils.tts_pool import get_tts_pool, TTSBusyError, pcm_to_wav, wav_stream_header
 
 router = APIRouter()
 
@@ -26,6 +30,9 @@ MODELS_DIR = os.path.join(PIPER_ROOT, "models")
 DEFAULT_MODEL_NAME = "en_US-libritts_r-medium.onnx"
 MODEL_PATH = os.path.join(MODELS_DIR, DEFAULT_MODEL_NAME)
 
+# Silence between streamed sentences (each is synthesized on its own)
+SENTENCE_PAUSE_SECONDS = float(os.getenv("TTS_SENTENCE_PAUSE_SECONDS", "0.25"))
+
 print(f"🔍 Piper EXE: {PIPER_EXE}")
 print(f"🔍 Voice Model: {MODEL_PATH}")
 
@@ -33,57 +40,152 @@ class TTSRequest(BaseModel):
     text: str
     lang: str = "en"
 
+def _cache_audio(key: str, wav: bytes, lang: str) -> str:
+    """Stores a synthesized WAV (transcoded if configured), returns its filename."""
+    data, extension = encode_audio(wav)
+    return audio_cache.put(key, [(f"{key}{extension}", data)], {"lang": lang})[0]
+
+def _voice_model(lang: str) -> str:
+    # Dynamic Model Selection (Optional: Switch based on lang)
+    current_model = MODEL_PATH
+    if lang.startswith("hi"): # Hindi support if requested
+         hindi_model = os.path.join(MODELS_DIR, "hi_IN-pratham-medium.onnx")
+         if os.path.exists(hindi_model):
+             current_model = hindi_model
+
+    if not os.path.exists(current_model):
+         print(f"❌ Voice Model missing at: {current_model}")
+         raise HTTPException(500, f"Voice Model not found at {current_model}")
+    return current_model
+
 @router.post("/speak")
 def text_to_speech(request: TTSRequest):
     try:
         if not request.text:
             raise HTTPException(status_code=400, detail="No text provided")
 
-        # 1. Cache Check
-        text_hash = hashlib.md5(request.text.encode('utf-8')).hexdigest()
-        filename = f"{text_hash}.wav"
-        file_path = os.path.join(AUDIO_DIR, filename)
-
-        if os.path.exists(file_path):
-            print(f"⏩ Audio Cached: {filename}")
-            return {"audio_url": f"/api/audio/file/{filename}"}
-
-        # 2. Validation
-        if not os.path.exists(PIPER_EXE):
-             print(f"❌ Piper EXE missing at: {PIPER_EXE}")
-             raise HTTPException(500, f"Piper EXE not found at {PIPER_EXE}")
-        
-        # Dynamic Model Selection (Optional: Switch based on lang)
-        current_model = MODEL_PATH
-        if request.lang.startswith("hi"): # Hindi support if requested
-             hindi_model = os.path.join(MODELS_DIR, "hi_IN-pratham-medium.onnx")
-             if os.path.exists(hindi_model):
-                 current_model = hindi_model
-
-        if not os.path.exists(current_model):
-             print(f"❌ Voice Model missing at: {current_model}")
-             raise HTTPException(500, f"Voice Model not found at {current_model}")
-
-        # 3. Generation
-        print(f"🎙️ Generating ({request.lang}): {request.text[:30]}...")
-        
-        proc = subprocess.run(
-            [PIPER_EXE, "--model", current_model, "--output_file", file_path],
-            input=request.text.encode('utf-8'),
-            capture_output=True
-        )
-        
-        if proc.returncode != 0:
-            error_msg = proc.stderr.decode()
-            print(f"❌ Piper Error: {error_msg}")
-            raise Exception(f"Piper failed: {error_msg}")
+        # 1. Voice
+        current_model = _voice_model(request.lang)
+
+        # 2. Cache Check
+        key = narration_key(request.text, request.lang, current_model)
+        cached = audio_cache.get(key)
+        if cached:
+            print(f"⏩ Audio Cached: {cached[0]}")
+            return {"audio_url": f"/api/audio/file/{cached[0]}"}
+
+        # 3. Generation (warm worker from the TTS pool, voice already loaded).
+        # Identical requests arriving meanwhile wait for this one instead.
+        def generate():
+            print(f"🎙️ Generating ({request.lang}): {request.text[:30]}...")
+            wav = get_tts_pool().synthesize_wav(request.text, current_model)
+            return [_cache_audio(key, wav, request.lang)]
+
+        filename = audio_cache.generate_once(key, generate)[0]
 
         return {"audio_url": f"/api/audio/file/{filename}"}
 
+    except TTSBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"TTS Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _cached_file(filename: str) -> FileResponse:
+    return FileResponse(audio_cache.path(filename), headers={"X-Audio-Url": f"/api/audio/file/{filename}"})
+
+def _stream_speech(text: str, lang: str):
+    """
+    Streams a narration as WAV while it is being synthesized: split into sentences,
+    synthesized in order (a few in parallel on the TTS pool), each sent as soon as it
+    is ready, so playback starts after one sentence instead of the whole text.
+    Goes through the cache's single-flight like /speak: an identical request already
+    synthesizing (here or in another worker) is waited for and its file served instead.
+    X-Audio-Url is only sent with files that exist.
+    """
+    if not text:
+        raise HTTPException(status_code=400, detail="No text provided")
+
+    current_model = _voice_model(lang)
+    key = narration_key(text, lang, current_model)
+    cached = audio_cache.get(key)
+    if cached:
+        print(f"⏩ Audio Cached: {cached[0]}")
+        return _cached_file(cached[0])
+
+    sentences = split_sentences(text) or [text]
+    events = queue.Queue()  # ("pcm", rate, bytes) while leading, then ("done", files) or ("error", e)
+
+    def generate():
+        # Only runs if this request leads: synthesizes everything (even if its client
+        # leaves, identical requests may be waiting for the file) and caches it
+        chunks = get_tts_pool().stream(sentences, current_model)
+        parts, sample_rate = [], 0
+        for sample_rate, pcm in chunks:
+            if parts:
+                pcm = b"\0\0" * int(sample_rate * SENTENCE_PAUSE_SECONDS) + pcm
+            parts.append(pcm)
+            events.put(("pcm", sample_rate, pcm))
+        return [_cache_audio(key, pcm_to_wav(b"".join(parts), sample_rate), lang)]
+
+    def run():
+        try:
+            events.put(("done", audio_cache.generate_once(key, generate)))
+        except Exception as e:
+            events.put(("error", e))
+
+    threading.Thread(target=run, name="tts-stream", daemon=True).start()
+
+    # Wait for the first sentence (or another request's file) here, so a full
+    # queue is still a proper 503
+    first = events.get()
+    if first[0] == "error":
+        if isinstance(first[1], TTSBusyError):
+            raise HTTPException(status_code=503, detail=str(first[1]), headers={"Retry-After": "1"})
+        print(f"TTS Error: {first[1]}")
+        raise HTTPException(status_code=500, detail=str(first[1]))
+    if first[0] == "done":
+        print(f"⏩ Audio Coalesced: {first[1][0]}")
+        return _cached_file(first[1][0])
+
+    _, sample_rate, first_pcm = first
+    print(f"🎙️ Streaming ({lang}, {len(sentences)} sentences): {text[:30]}...")
+
+    def body():
+        yield wav_stream_header(sample_rate) + first_pcm
+        while True:
+            event = events.get()
+            if event[0] == "pcm":
+                yield event[2]
+            elif event[0] == "error":
+                print(f"TTS Error: {event[1]}")
+                return  # Headers are sent; the stream just ends early
+            else:
+                return
+
+    return StreamingResponse(body(), media_type="audio/wav")
+
+@router.post("/stream")
+def stream_speech(request: TTSRequest):
+    return _stream_speech(request.text, request.lang)
+
+@router.get("/stream")
+def stream_speech_get(text: str, lang: str = "en"):
+    """Same as POST /stream, usable directly as an <audio src>."""
+    return _stream_speech(text, lang)
+
+@router.get("/pool")
+def tts_pool_stats():
+    """Queue depth, loaded voices and synthesis times of the TTS workers."""
+    return get_tts_pool().stats()
+
+@router.get("/cache")
+def audio_cache_stats():
+    """Size, budget and hit rate of the narration cache."""
+    return audio_cache.stats()
+
 @router.get("/file/{filename}")
 def get_audio_file(filename: str):
     path = os.path.join(AUDIO_DIR, filename)
@@ -4,6 +4,7 @@ from typing import List
 
 from app.db.session import get_db
 from app import schemas, crud
+from app.models.catalog import Catalog
 
 router = APIRouter()
 
@@ -28,4 +29,20 @@ def resolve_book(query: str, db: Session = Depends(get_db)):
 @router.get("/", response_model=List[schemas.Catalog])
 def read_catalog(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """List all books in the catalog."""
-    return crud.get_all_books(db, skip=skip, limit=limit)
\ No newline at end of file
+    return crud.get_all_books(db, skip=skip, limit=limit)
+
+@router.get("/{catalog_id}/similar", response_model=schemas.SimilarBooksResponse)
+def similar_books(catalog_id: str, min_similarity: float = 0.0, limit: int = 10, db: Session = Depends(get_db)):
+    """
+    Near-duplicate / related editions of a book, found through the MinHash LSH index.
+    """
+    book = db.get(Catalog, catalog_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    if not book.fingerprints:
+        return {"results": []}
+
+    matches = crud.find_similar_books(
+        db, book.fingerprints, exclude_id=catalog_id, min_similarity=min_similarity, limit=limit # type: ignore
+    )
+    return {"results": [{"book": match, "similarity": score} for match, score in matches]}
@@ -1,143 +1,387 @@
+import os
 import uuid
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
+import time
+import numpy as np
+from typing import Callable, Iterable, Optional
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.db.session import get_db
-from app.utils.parsing import extract_text_from_pdf
-from app.utils.chunking import chunk_text
+from app.db.session import get_db, SessionLocal
+from app import schemas, crud
+from app.utils.parsing import iter_pdf_pages, pdf_page_count, save_upload, sample_pdf_text
+from app.utils.chunking import chunk_pages, content_hash
 from app.models.catalog import Catalog
 from app.models.content import BookContent
 from app.models.chunk import Chunk
-from app.utils.fingerprint import create_minhash
-from app.utils.embeddings import get_embedding
+from app.models.job import IngestJob
+from app.utils.fingerprint import create_minhash, FINGERPRINT_CHARS, DUPLICATE_THRESHOLD
+from app.utils.embeddings import get_embeddings, count_tokens, MODEL_NAME
 from app.utils.vector_store import vector_store
-from app.models.scene import Scene, Character         
+from app.utils.lexical_index import lexical_index
+from app.models.scene import Scene, Character, SceneAsset
 from app.utils.scene_extraction import extract_scenes
+from app.utils.job_queue import enqueue_ingest_job
 
 router = APIRouter()
 
-def process_chunks(db: Session, catalog_id: str, full_text: str):
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "storage")
+# Chunks are embedded in slices of this size while the PDF is still being parsed
+EMBED_SLICE = int(os.getenv("EMBED_SLICE", "256"))
+
+def _no_progress(stage: str, done: int, total: int):
+    pass
+
+def embed_cached(db: Session, hashes: list, texts: list):
     """
-    Background task to:
-    1. Split text into chunks
-    2. Generate AI embeddings (Vectors)
-    3. Save chunks to Postgres
-    4. Save vectors to FAISS Index
+    Embeddings for texts (float32 matrix), taken from the embedding cache by content
+    hash where possible; only the misses go through the model (and are cached).
+    Returns (vectors, number of texts actually embedded).
     """
-    # 1. Split the text
-    text_chunks = chunk_text(full_text, chunk_size=1000, overlap=100)
-    print(f"Split into {len(text_chunks)} chunks. Generating embeddings...")
-    
-    chunk_objects = []
-    vectors = []
+    cached = crud.get_cached_embeddings(db, hashes, MODEL_NAME)
+    missing = [i for i, h in enumerate(hashes) if h not in cached]
+    vectors = np.empty((len(texts), vector_store.dimension), dtype="float32")
+    if missing:
+        fresh = get_embeddings([texts[i] for i in missing])
+        crud.cache_embeddings(db, [hashes[i] for i in missing], fresh, MODEL_NAME)
+        vectors[missing] = fresh
+    for i, h in enumerate(hashes):
+        if h in cached:
+            vectors[i] = cached[h]
+    return vectors, len(missing)
+
+def index_chunks(db: Session, catalog_id: str, chunks: Iterable[dict], progress: Optional[Callable] = None) -> int:
+    """
+    Embeds and indexes chunks as they arrive (chunks is usually the chunk_pages generator
+    fed by the streaming PDF extractor, so embedding overlaps parsing):
+    1. Generate AI embeddings (Vectors), EMBED_SLICE chunks at a time
+    2. Save chunks to Postgres (one bulk INSERT per slice, nothing piles up in memory)
+    3. Save vectors to FAISS Index
+    4. Add chunks to the BM25 lexical index
+    Incremental when the book was ingested before (re-upload, retry): chunks whose
+    content hash it already has keep their row and vector, other texts come from the
+    embedding cache if possible, and only the rest is embedded. Old chunks that are no
+    longer in the text are deleted and their vectors removed from the index.
+    Returns the number of chunks.
+    """
+    progress = progress or _no_progress
+    embed_seconds = 0.0
+    embedded = 0
+
+    # The book's current chunks by hash. Rows whose vector never made it into the
+    # index (an attempt that failed half-way) can't be reused.
+    indexed = vector_store.book_chunk_ids(catalog_id)
+    reusable = {}
+    stale = []
+    existing = db.query(Chunk.id, Chunk.content_hash, Chunk.content).filter(Chunk.catalog_id == catalog_id)
+    for c_id, c_hash, content in existing:
+        if c_id in indexed:
+            # Rows from before content hashes existed are hashed here
+            reusable.setdefault(c_hash or content_hash(content or ""), []).append(c_id)
+        else:
+            stale.append(c_id)
+
+    pending = []     # New Chunk rows (dicts) of the slice being filled
+    kept = []        # Reused rows: new position in the book
     chunk_ids = []
+    text_chunks = []
+    new_ids = []
+    parts = []
 
-    for i, content in enumerate(text_chunks):
-        # Generate ID explicitly so we can send it to both DB and FAISS
-        c_id = str(uuid.uuid4())
-
-        # Create DB Object
-        chunk_obj = Chunk(
-            id=c_id,
-            catalog_id=catalog_id,
-            content=content,
-            chunk_index=i
-        )
-        
-        # Calculate Vector (The AI Part)
-        # This converts text -> list of 384 numbers
-        vec = get_embedding(content)
-        
-        chunk_objects.append(chunk_obj)
-        vectors.append(vec)
+    def flush_slice():
+        nonlocal embed_seconds, embedded
+        embed_start = time.perf_counter()
+        # One batched call converts the slice -> rows of 384 numbers (float32 matrix)
+        vectors, misses = embed_cached(db, [row["content_hash"] for row in pending], [row["content"] for row in pending])
+        parts.append(vectors)
+        embedded += misses
+        embed_seconds += time.perf_counter() - embed_start
+        progress("embed", len(text_chunks), 0)
+
+        crud.bulk_insert_chunks(db, pending)
+        db.commit()
+        pending.clear()
+
+    for i, chunk in enumerate(chunks):
+        c_hash = chunk.get("content_hash") or content_hash(chunk["content"])
+        location = {
+            "chunk_index": i,
+            "page_number": chunk["page_start"],
+            "page_end": chunk["page_end"],
+            "content_hash": c_hash,
+        }
+        same_text = reusable.get(c_hash)
+        if same_text:
+            c_id = same_text.pop()
+            kept.append({"id": c_id, **location})
+        else:
+            # Generate ID explicitly so we can send it to both DB and FAISS
+            c_id = str(uuid.uuid4())
+            # DB row (inserted in bulk per slice)
+            pending.append({"id": c_id, "catalog_id": catalog_id, "content": chunk["content"], **location})
+            new_ids.append(c_id)
         chunk_ids.append(c_id)
-    
-    # 2. Save Chunks to Postgres
-    db.add_all(chunk_objects)
-    db.commit()
-    
+        text_chunks.append(chunk["content"])
+        progress("chunk", len(text_chunks), 0)
+
+        if len(pending) >= EMBED_SLICE:
+            flush_slice()
+
+    if pending:
+        flush_slice()
+    total = len(text_chunks)
+    progress("chunk", total, total)
+    progress("embed", total, total)
+    vectors = np.vstack(parts) if parts else np.zeros((0, 384), dtype="float32")
+    rate = embedded / embed_seconds if embed_seconds > 0 else 0.0
+    print(f"⚡ Embedded {embedded} chunks in {embed_seconds:.2f}s ({rate:.1f} chunks/sec); "
+          f"{len(kept)} unchanged, {len(new_ids) - embedded} from the embedding cache")
+
     # 3. Save Vectors to FAISS
     # This makes the chunks "searchable" by meaning
-    vector_store.add_vectors(vectors, chunk_ids)
+    progress("index", 0, total)
+    vector_store.add_vectors(vectors, new_ids, catalog_id=catalog_id)
+
+    # Kept chunks move to their new position; chunks the text no longer has go away
+    crud.update_chunks(db, kept)
+    removed = stale + [c_id for ids in reusable.values() for c_id in ids]
+    if removed:
+        vector_store.remove_chunks(removed, catalog_id)
+        crud.delete_chunks(db, removed)
+        print(f"🧹 Removed {len(removed)} superseded chunks of book {catalog_id}")
+    db.commit()
+
+    # 4. Add a BM25 segment for exact-term (names, dates) lookups (replaces the book's old one)
+    lexical_index.add_documents(chunk_ids, text_chunks, catalog_id)
+    progress("index", total, total)
+    return total
 
-    # 2. --- NEW: SCENE GRAPH EXTRACTION ---
+def build_scene_graph(db: Session, catalog_id: str, full_text: str, progress: Optional[Callable] = None):
+    """Extracts scenes + characters from the whole book and saves them."""
+    progress = progress or _no_progress
     print("🎬 Extracting Scene Graph...")
-    graph_data = extract_scenes(full_text)
+    progress("scene_graph", 0, 1)
+    # Scenes are rebuilt from scratch (re-ingest); characters are kept. Their asset
+    # manifests go too (the audio/image files stay in the asset caches)
+    db.query(SceneAsset).filter(SceneAsset.catalog_id == catalog_id).delete()
+    db.query(Scene).filter(Scene.catalog_id == catalog_id).delete()
+
+    # Aliases saved earlier (e.g. edited by hand) are matched too
+    known_aliases = {
+        str(c.name): c.aliases
+        for c in db.query(Character).filter(Character.catalog_id == catalog_id).all()
+        if c.aliases
+    }
+    graph_data = extract_scenes(full_text, known_aliases=known_aliases)
     
-    # Save Characters
-    for name in graph_data["characters"]:
-        # Only add unique names
-        exists = db.query(Character).filter(Character.catalog_id == catalog_id, Character.name == name).first()
-        if not exists:
-            char_obj = Character(catalog_id=catalog_id, name=name)
-            db.add(char_obj)
-            
+    # Save Characters (names the book already has are skipped by the unique key)
+    crud.bulk_insert_characters(db, catalog_id, graph_data["characters"], graph_data["aliases"])
+
     # Save Scenes
-    for scene_data in graph_data["scenes"]:
-        scene_obj = Scene(
-            catalog_id=catalog_id,
-            order_index=scene_data["index"],
-            title=scene_data["title"],
-            content_summary=scene_data["content"],
-            characters_present=scene_data["characters"],
-            dialogues=scene_data["dialogues"]
-        )
-        db.add(scene_obj)
+    crud.bulk_insert_scenes(db, [
+        {
+            "catalog_id": catalog_id,
+            "order_index": scene_data["index"],
+            "title": scene_data["title"],
+            "content_summary": scene_data["content"],
+            "characters_present": scene_data["characters"],
+            "dialogues": scene_data["dialogues"],
+        }
+        for scene_data in graph_data["scenes"]
+    ])
     db.commit()
+    progress("scene_graph", 1, 1)
     print(f"✅ Extracted {len(graph_data['scenes'])} scenes and {len(graph_data['characters'])} characters.")
-    print(f"✅ Automatically created {len(text_chunks)} chunks + embeddings for book {catalog_id}")
+
+def process_chunks(db: Session, catalog_id: str, full_text: str, progress: Optional[Callable] = None):
+    """
+    Chunk + embed + index + scene graph for a book whose text is already in memory.
+    """
+    ingest_start = time.perf_counter()
+
+    # 1. Split the text (no page information here)
+    chunks = chunk_pages([{"page_number": None, "text": full_text}], count_tokens=count_tokens)
+    total = index_chunks(db, catalog_id, chunks, progress)
+    build_scene_graph(db, catalog_id, full_text, progress)
+
+    total_seconds = time.perf_counter() - ingest_start
+    total_rate = total / total_seconds if total_seconds > 0 else 0.0
+    print(f"✅ Automatically created {total} chunks + embeddings for book {catalog_id}")
+    print(f"⏱️ Ingest took {total_seconds:.2f}s ({total_rate:.1f} chunks/sec end-to-end)")
+
+def run_ingest_job(job_id: str, progress: Callable):
+    """
+    Worker entry point for one IngestJob: streams the stored PDF through
+    parse -> chunk -> embed -> index, then builds the scene graph.
+    Uses its own session (the request that queued the job is long gone).
+    """
+    db = SessionLocal()
+    try:
+        job = db.get(IngestJob, job_id)
+        if job is None:
+            raise ValueError(f"Job {job_id} not found")
+        catalog_id = str(job.catalog_id)
+        book = db.get(Catalog, catalog_id)
+        if book is None:
+            raise ValueError(f"Book {catalog_id} was deleted")
+
+        # A retry drops the characters an earlier attempt left behind. Chunks are
+        # reconciled by index_chunks (what made it into the index is reused).
+        if job.attempts > 1: # type: ignore
+            db.query(Character).filter(Character.catalog_id == catalog_id).delete()
+            db.commit()
+
+        ingest_start = time.perf_counter()
+        file_path = str(job.file_path)
+        page_count = pdf_page_count(file_path)
+        book.page_count = page_count # type: ignore
+        db.commit()
+
+        # 1. Parse (streaming): pages flow straight into the chunker -> embedder
+        pages = []
+
+        def tracked_pages():
+            for page in iter_pdf_pages(file_path):
+                pages.append(page["text"])
+                progress("parse", page["page_number"], page_count)
+                yield page
+
+        chunks = chunk_pages(tracked_pages(), count_tokens=count_tokens)
+        total = index_chunks(db, catalog_id, chunks, progress)
+        full_text = "\n".join(pages)
+
+        # Calculate Fingerprint (Digital ID), normally already done at upload
+        if not book.fingerprints:
+            book.fingerprints = create_minhash(full_text[:FINGERPRINT_CHARS]) # type: ignore
+            if book.fingerprints:
+                crud.index_fingerprint(db, catalog_id, book.fingerprints) # type: ignore
+
+        # Save Content (Full Text)
+        content = db.query(BookContent).filter(BookContent.catalog_id == catalog_id).first()
+        if content is None:
+            content = BookContent(catalog_id=catalog_id)
+            db.add(content)
+        content.full_text = full_text # type: ignore
+        content.filename = os.path.basename(file_path) # type: ignore
+        content.file_size_bytes = os.path.getsize(file_path) # type: ignore
+        db.commit()
+
+        build_scene_graph(db, catalog_id, full_text, progress)
+
+        total_seconds = time.perf_counter() - ingest_start
+        print(f"✅ Automatically created {total} chunks + embeddings for book {catalog_id}")
+        print(f"⏱️ Ingest took {total_seconds:.2f}s ({page_count} pages, {total} chunks)")
+    finally:
+        db.close()
 
 @router.post("/upload")
-async def upload_book(
-    background_tasks: BackgroundTasks,
+def upload_book(
     file: UploadFile = File(...), 
     title: str = "", 
     author: str = "Unknown",
+    on_duplicate: str = "skip",
     db: Session = Depends(get_db)
 ):
+    """
+    Queues a PDF for ingestion. Before that, its MinHash fingerprint is looked up in the
+    LSH index; when an ingested book is at least DUPLICATE_THRESHOLD similar:
+      on_duplicate="skip"   -> nothing is created, the existing book is returned
+      on_duplicate="link"   -> a catalog entry (own title/author) is created that reuses
+                               the existing book's content, without running the pipeline
+      on_duplicate="update" -> re-ingest the file into the existing book (a corrected
+                               edition): only new/changed chunks are embedded
+      on_duplicate="ingest" -> ingest anyway
+    A plain def: the spooling, PDF sampling and queries run in FastAPI's threadpool,
+    not on the event loop.
+    """
     # FIX: Check if filename exists AND if it ends with .pdf (Satisfies Pylance)
     if not file.filename or not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files allowed for now.")
-    
-    file_content = await file.read()
-    
+    if on_duplicate not in ("skip", "link", "update", "ingest"):
+        raise HTTPException(status_code=400, detail="on_duplicate must be skip, link, update or ingest")
+
+    # Spool the upload to disk; a worker picks it up from there
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.pdf")
+    save_upload(file, file_path)
+
+    final_title = title if title else file.filename
+
+    # Near-duplicate check (reads only the first pages)
     try:
-        data = extract_text_from_pdf(file_content)
+        signature = create_minhash(sample_pdf_text(file_path, FINGERPRINT_CHARS))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PDF Parsing failed: {str(e)}")
-    
-    # Calculate Fingerprint (Digital ID)
-    sample_text = data["full_text"][:5000] 
-    signature = create_minhash(sample_text)
+        os.remove(file_path)
+        raise HTTPException(status_code=400, detail=f"PDF could not be read: {str(e)}")
 
-    final_title = title if title else file.filename
-    
-    # Create Catalog Entry
-    new_book = Catalog(
-        title=final_title, 
-        author=author, 
-        page_count=data["page_count"], 
-        fingerprints=signature
+    # No text to fingerprint (e.g. a scanned PDF): it can't be compared, so it's ingested
+    if not signature:
+        print(f"⚠️ '{final_title}' has too little text for a fingerprint; skipping the duplicate check.")
+    matches = [] if on_duplicate == "ingest" or not signature else crud.find_similar_books(
+        db, signature, min_similarity=DUPLICATE_THRESHOLD, limit=1
     )
+    if matches:
+        original, score = matches[0]
+        original_id = str(original.duplicate_of or original.id)
+        if on_duplicate == "update":
+            book = db.get(Catalog, original_id)
+            book.fingerprints = signature # type: ignore
+            crud.index_fingerprint(db, original_id, signature)
+            db.commit()
+            job = enqueue_ingest_job(db, original_id, file_path)
+            return {
+                "status": "queued",
+                "book_id": original_id,
+                "job_id": job.id,
+                "similarity": score,
+                "message": "Near-duplicate of a book already in the library; re-ingesting it in place "
+                           "(only changed text is embedded). Track it at /api/ingest/jobs/{job_id}."
+            }
+        os.remove(file_path)
+        if on_duplicate == "link":
+            linked = Catalog(
+                title=final_title, author=author, page_count=original.page_count,
+                fingerprints=signature, duplicate_of=original_id
+            )
+            db.add(linked)
+            db.flush()
+            crud.index_fingerprint(db, str(linked.id), signature)
+            db.commit()
+            db.refresh(linked)
+            return {
+                "status": "linked",
+                "book_id": linked.id,
+                "duplicate_of": original_id,
+                "similarity": score,
+                "message": "Near-duplicate of a book already in the library; linked to its content."
+            }
+        return {
+            "status": "duplicate",
+            "book_id": original_id,
+            "similarity": score,
+            "message": "Near-duplicate of a book already in the library; nothing was ingested."
+        }
+
+    # Create Catalog Entry (page count is filled in by the parse stage)
+    new_book = Catalog(title=final_title, author=author, fingerprints=signature)
     db.add(new_book)
+    db.flush()
+    # Indexed now, so a second copy uploaded while this one is queued is caught too
+    if signature:
+        crud.index_fingerprint(db, str(new_book.id), signature)
     db.commit()
     db.refresh(new_book)
-    
-    # Save Content (Full Text)
-    content = BookContent(
-        catalog_id=new_book.id,
-        full_text=data["full_text"],
-        filename=file.filename,
-        file_size_bytes=len(file_content)
-    )
-    db.add(content)
-    db.commit()
-    
-    # TRIGGER CHUNKING + EMBEDDING (Background Task)
-    # Wraps ID in str() to satisfy type checkers
-    background_tasks.add_task(process_chunks, db, str(new_book.id), data["full_text"])
-    
+
+    job = enqueue_ingest_job(db, str(new_book.id), file_path)
+
     return {
-        "status": "success",
+        "status": "queued",
         "book_id": new_book.id,
-        "message": "Book ingested! Chunking and Embedding started in background."
-    }
\ No newline at end of file
+        "job_id": job.id,
+        "message": "Book queued! Track ingestion at /api/ingest/jobs/{job_id}."
+    }
+
+@router.get("/jobs/{job_id}", response_model=schemas.IngestJobStatus)
+def get_ingest_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(IngestJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,18 +1,162 @@
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.utils.embeddings import get_embedding
+from app.utils.embeddings import get_embeddings
 from app.utils.vector_store import vector_store
+from app.utils.lexical_index import lexical_index, reciprocal_rank_fusion
+from app.utils.cache import make_cache
 from app.models.chunk import Chunk
-from app import schemas
-from typing import List
+from app import schemas, crud
+from typing import List, Optional
 
 router = APIRouter()
 
+SEARCH_MODES = ("semantic", "lexical", "hybrid")
+MAX_BATCH_QUERIES = int(os.getenv("SEARCH_MAX_BATCH_QUERIES", "256"))
+
+# --- CACHES ---
+# Students in a class ask near-identical questions; skip the embed + search + DB trip.
+query_vector_cache = make_cache(
+    "query_vectors",
+    max_items=int(os.getenv("QUERY_VECTOR_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.getenv("QUERY_VECTOR_CACHE_TTL", "86400")),
+)
+search_result_cache = make_cache(
+    "search_results",
+    max_items=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", "600")),
+)
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def _cache_key(*parts) -> str:
+    return hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+def get_query_vectors(queries: List[str]) -> list:
+    """
+    Embeddings for many queries, cached by normalized text (the model is deterministic).
+    All cache misses are embedded together in ONE model.encode call.
+    """
+    keys = [_cache_key(normalize_query(q)) for q in queries]
+    vectors = [query_vector_cache.get(key) for key in keys]
+
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = get_embeddings([queries[i] for i in missing])
+        for i, vector in zip(missing, fresh):
+            vectors[i] = vector
+            query_vector_cache.set(keys[i], vector)
+    return vectors
+
+def get_query_vector(query: str):
+    return get_query_vectors([query])[0]
+
+def _rank_chunks(queries: List[str], k: int, mode: str, nprobe: int, ef_search: int, catalog_id: Optional[List[str]]) -> list:
+    """
+    Runs the retrieval part for a list of queries.
+    Returns one ranked list of (chunk_id, score) per query.
+    """
+    # Hybrid pulls a deeper list from each side so fusion has something to work with
+    fetch_k = max(k * 4, 20) if mode == "hybrid" else k
+
+    semantic_results = [[] for _ in queries]
+    lexical_results = [[] for _ in queries]
+
+    if mode in ("semantic", "hybrid"):
+        # 1. Convert Queries to Vectors
+        query_vectors = get_query_vectors(queries)
+    
+        # 2. Search Vector Store (one multi-row search for all queries)
+        # Returns lists of tuples: (chunk_id, distance_score)
+        semantic_results = vector_store.search_batch(
+            query_vectors, k=fetch_k, nprobe=nprobe, ef_search=ef_search, catalog_ids=catalog_id
+        )
+
+    if mode in ("lexical", "hybrid"):
+        # Returns lists of tuples: (chunk_id, bm25_score), best first
+        lexical_results = [lexical_index.search(q, k=fetch_k, catalog_ids=catalog_id) for q in queries]
+
+    if mode != "hybrid":
+        return [sem or lex for sem, lex in zip(semantic_results, lexical_results)]
+
+    return [
+        reciprocal_rank_fusion([[c_id for c_id, _ in sem], [c_id for c_id, _ in lex]])[:k]
+        for sem, lex in zip(semantic_results, lexical_results)
+    ]
+
+def _hydrate(db: Session, ranked_lists: list) -> list:
+    """
+    Fetches the text for every ranked list with ONE Postgres query.
+    Returns one list of SearchResult per ranked list (best match first).
+    """
+    found_ids = {c_id for ranked in ranked_lists for c_id, _ in ranked}
+    if not found_ids:
+        return [[] for _ in ranked_lists]
+
+    # 3. Fetch Content from DB
+    # We fetch only the chunks that the indexes found
+    chunks = db.query(Chunk).filter(Chunk.id.in_(found_ids)).all()
+    by_id = {str(chunk.id): chunk for chunk in chunks}
+
+    # 4. Format Response
+    # We cast to str() to make Pylance happy
+    # List order is the ranking (closest distance / highest BM25 / highest fused score first)
+    all_results = []
+    for ranked in ranked_lists:
+        results = []
+        for c_id, score in ranked:
+            chunk = by_id.get(c_id)
+            if chunk is None:
+                continue
+            results.append(schemas.SearchResult(
+                chunk_id=c_id,
+                content=str(chunk.content),
+                page_number=chunk.page_number, # type: ignore
+                page_end=chunk.page_end, # type: ignore
+                score=score
+            ))
+        all_results.append(results)
+    return all_results
+
+def _check_mode(mode: str):
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {SEARCH_MODES}")
+
+def _result_key(query: str, k: int, mode: str, nprobe: int, ef_search: int, catalog_id: Optional[List[str]]) -> str:
+    # Index versions are part of the key: once a new book lands, old entries are never hit again
+    catalog_key = ",".join(sorted(catalog_id)) if catalog_id else "*"
+    return _cache_key(
+        normalize_query(query), k, mode, nprobe, ef_search, catalog_key,
+        vector_store.version, lexical_index.version
+    )
+
+def _search_many(db: Session, queries: List[str], k: int, mode: str, nprobe: int, ef_search: int, catalog_id: Optional[List[str]]) -> list:
+    """Cache lookup per query; everything that misses goes through one batched pass."""
+    if catalog_id:
+        # Books linked as near-duplicates are searched through the book holding the content
+        catalog_id = crud.resolve_linked_books(db, catalog_id)
+    keys = [_result_key(q, k, mode, nprobe, ef_search, catalog_id) for q in queries]
+    results = [search_result_cache.get(key) for key in keys]
+
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        ranked = _rank_chunks([queries[i] for i in missing], k, mode, nprobe, ef_search, catalog_id)
+        for i, found in zip(missing, _hydrate(db, ranked)):
+            results[i] = [r.model_dump() for r in found]
+            search_result_cache.set(keys[i], results[i])
+    return results
+
 @router.get("/", response_model=schemas.SearchResponse)
 def search_knowledge_base(
     query: str, 
     k: int = 5, 
+    mode: str = "semantic",
+    nprobe: int = 0,
+    ef_search: int = 0,
+    catalog_id: Optional[List[str]] = Query(None),
     db: Session = Depends(get_db)
 ):
     """
@@ -20,43 +164,43 @@ def search_knowledge_base(
     1. Embeds the user query.
     2. Searches FAISS for the nearest chunks.
     3. Fetches the actual text content from Postgres.
+
+    mode: "semantic" (vectors, score = distance), "lexical" (BM25, score = bm25)
+          or "hybrid" (both fused with reciprocal rank fusion, score = fused score).
+    nprobe / ef_search tune recall vs speed for IVF / HNSW indexes (0 = server default).
+    catalog_id (repeatable) limits the search to those books.
     """
     if not query:
         raise HTTPException(status_code=400, detail="Query cannot be empty")
+    _check_mode(mode)
 
-    # 1. Convert Query to Vector
-    query_vector = get_embedding(query)
-    
-    # 2. Search Vector Store
-    # Returns list of tuples: (chunk_id, distance_score)
-    search_results = vector_store.search(query_vector, k=k)
-    
-    if not search_results:
-        return {"results": []}
-
-    # Unpack IDs to fetch from DB
-    found_ids = [res[0] for res in search_results]
-    id_to_score = {res[0]: res[1] for res in search_results}
+    results = _search_many(db, [query], k, mode, nprobe, ef_search, catalog_id)[0]
+    return {"results": results}
 
-    # 3. Fetch Content from DB
-    # We fetch only the chunks that FAISS found
-    chunks = db.query(Chunk).filter(Chunk.id.in_(found_ids)).all()
+@router.post("/batch", response_model=schemas.BatchSearchResponse)
+def search_knowledge_base_batch(request: schemas.BatchSearchRequest, db: Session = Depends(get_db)):
+    """
+    Many searches in one call (lesson plans, quiz context).
+    Embeds all queries in one model call, runs one multi-row index search and
+    hydrates every chunk with one DB query. Results are grouped per query, in order.
+    """
+    queries = [q for q in request.queries if q and q.strip()]
+    if not queries:
+        raise HTTPException(status_code=400, detail="At least one non-empty query is required")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    _check_mode(request.mode)
 
-    # 4. Format Response
-    # We cast to str() to make Pylance happy
-    results = []
-    for chunk in chunks:
-        c_id = str(chunk.id)
-        
-        results.append(schemas.SearchResult(
-            chunk_id=c_id,
-            content=str(chunk.content),
-            page_number=chunk.page_number, # type: ignore
-            score=id_to_score.get(c_id, 0.0)
-        ))
-    
-    # Sort by score (lower is better distance, but typically we want closest match first)
-    # Since FAISS returns distances, we just keep the list order or sort by score ascending
-    results.sort(key=lambda x: x.score)
+    results = _search_many(
+        db, queries, request.k, request.mode, request.nprobe, request.ef_search, request.catalog_id
+    )
+    return {"results": [{"query": q, "results": r} for q, r in zip(queries, results)]}
 
-    return {"results": results}
\ No newline at end of file
+@router.get("/cache/stats")
+def search_cache_stats():
+    """Hit/miss counters for the query-embedding and search-result caches."""
+    return {
+        "query_vectors": query_vector_cache.stats(),
+        "results": search_result_cache.stats(),
+        "index_version": {"vectors": vector_store.version, "lexical": lexical_index.version},
+    }
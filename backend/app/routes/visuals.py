@@ -1,57 +1,128 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from app.utils.visual_engine import generate_visual_draft, ABSOLUTE_IMAGE_DIR
-from fastapi.responses import FileResponse
+from app.utils.visual_engine import ABSOLUTE_IMAGE_DIR, build_visual_prompt
+from app.utils.asset_cache import image_cache
+from app.utils.visual_scheduler import get_visual_scheduler, VisualQueueFullError
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import List, Optional
+import asyncio
+import json
 import os
 
 router = APIRouter()
 
+# How often the SSE endpoint checks a job, and sends a keep-alive when nothing changed
+SSE_POLL_SECONDS = 0.5
+SSE_KEEPALIVE_SECONDS = 15
+
 # --- DAY 32 UPDATE: Enhanced Request Schema ---
 class VisualRequest(BaseModel):
     prompt: str
     style: str = "cinematic"
     character_focus: Optional[str] = None
+    # "current" = the scene being watched, "prefetch" = upcoming scenes (run after)
+    priority: str = "current"
 
 class VisualResponse(BaseModel):
     image_urls: List[str]
 
+class VisualJobStatus(BaseModel):
+    job_id: str
+    status: str
+    priority: str
+    position: Optional[int] = None
+    image_urls: List[str] = []
+    error: Optional[str] = None
+    created_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+def _submit(request: VisualRequest):
+    """Queues the generation; a full queue is an immediate 429 with Retry-After."""
+    if not request.prompt:
+        raise HTTPException(status_code=400, detail="Prompt required.")
+    if request.priority not in ("current", "prefetch"):
+        raise HTTPException(status_code=400, detail="priority must be 'current' or 'prefetch'.")
+
+    full_prompt = build_visual_prompt(request.prompt, request.style, request.character_focus)
+    try:
+        job = get_visual_scheduler().submit(full_prompt, request.priority)
+    except VisualQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    print(f"🎨 Visual job {job.id[:8]} ({request.priority}, {job.status}): '{full_prompt}'")
+    return job
+
+def _job_status(job_id: str) -> dict:
+    scheduler = get_visual_scheduler()
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (or expired).")
+    return job.to_dict(scheduler.position(job))
+
 @router.post("/generate", response_model=VisualResponse)
-def generate_draft(request: VisualRequest):
+async def generate_draft(request: VisualRequest):
     """
-    Day 32: Receives full Visual Spec to construct a better prompt.
+    Queues the generation and waits for it without holding a server thread
+    (the work runs on the visual scheduler's own threads).
     """
-    if not request.prompt:
-        raise HTTPException(status_code=400, detail="Prompt required.")
+    job = _submit(request)
+    try:
+        filenames = await asyncio.wrap_future(job.future)
+    except VisualQueueFullError as e:
+        # Dropped while queued to make room for the scene on screen
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception:
+        raise HTTPException(status_code=503, detail=job.error or "Visual generation failed.")
 
-    # Construct a rich prompt based on the spec
-    # This helps consistency (Day 33/45 goal)
-    full_prompt = request.prompt
-    
-    if request.character_focus:
-        full_prompt = f"focus on {request.character_focus}, {full_prompt}"
-        
-    # Append style modifiers
-    if request.style == "cinematic":
-        full_prompt += ", cinematic lighting, 8k, detailed, depth of field"
-    elif request.style == "sketch":
-        full_prompt += ", pencil sketch, rough style, concept art"
-    else:
-        full_prompt += f", {request.style}"
-
-    print(f"🎨 Generating Visual: '{full_prompt}'")
-
-    # Get the list of filenames from the generation utility
-    filenames = generate_visual_draft(full_prompt) 
-    
-    if filenames == ["error.png"]:
-        raise HTTPException(status_code=503, detail="Visual generation failed (VRAM limit reached or SD error).")
-        
     # Convert filenames to full URLs
     image_urls = [f"/static/images/{filename}" for filename in filenames]
-    
+
     return VisualResponse(image_urls=image_urls)
 
+@router.post("/jobs", response_model=VisualJobStatus, status_code=202)
+def create_visual_job(request: VisualRequest):
+    """Queues the generation and returns at once; follow it at /jobs/{job_id} or /jobs/{job_id}/events."""
+    job = _submit(request)
+    return _job_status(job.id)
+
+@router.get("/jobs/{job_id}", response_model=VisualJobStatus)
+def get_visual_job(job_id: str):
+    return _job_status(job_id)
+
+@router.get("/jobs/{job_id}/events")
+async def visual_job_events(job_id: str):
+    """Server-Sent Events: a 'status' event whenever the job changes, the last one when it is done or failed."""
+    _job_status(job_id)  # 404 before the stream starts
+
+    async def events():
+        last, idle = None, 0.0
+        while True:
+            status = _job_status(job_id)
+            snapshot = (status["status"], status["position"])
+            if snapshot != last:
+                last, idle = snapshot, 0.0
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+                if status["status"] in ("done", "failed"):
+                    return
+            elif idle >= SSE_KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(SSE_POLL_SECONDS)
+            idle += SSE_POLL_SECONDS
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@router.get("/scheduler")
+def visual_scheduler_stats():
+    """Queue depth, running generations and the current retry estimate."""
+    return get_visual_scheduler().stats()
+
+@router.get("/cache")
+def image_cache_stats():
+    """Size, budget and hit rate of the image cache."""
+    return image_cache.stats()
+
 @router.get("/file/{filename}")
 def get_image_file(filename: str):
     """
@@ -60,5 +131,5 @@ def get_image_file(filename: str):
     file_path = os.path.join(ABSOLUTE_IMAGE_DIR, filename)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Image file not found.")
-        
-    return FileResponse(file_path, media_type="image/png")
\ No newline at end of file
+
+    return FileResponse(file_path)
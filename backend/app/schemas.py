@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
+from datetime import datetime
 
 # --- 1. Catalog Schemas ---
 class CatalogBase(BaseModel):
@@ -15,10 +16,18 @@ class CatalogCreate(CatalogBase):
 class Catalog(CatalogBase):
     id: str
     fingerprints: Optional[List[int]] = None
+    duplicate_of: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class SimilarBook(BaseModel):
+    book: Catalog
+    similarity: float  # Estimated Jaccard similarity of the opening text (0-1)
+
+class SimilarBooksResponse(BaseModel):
+    results: List[SimilarBook]
+
 # --- 2. Search & Resolve ---
 class ResolveResult(BaseModel):
     results: List[Catalog]
@@ -28,11 +37,47 @@ class SearchResult(BaseModel):
     chunk_id: str
     content: str
     page_number: Optional[int] = None
+    page_end: Optional[int] = None
     score: float
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
 
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = 5
+    mode: str = "semantic"
+    catalog_id: Optional[List[str]] = None
+    nprobe: int = 0
+    ef_search: int = 0
+
+class BatchSearchGroup(BaseModel):
+    query: str
+    results: List[SearchResult]
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchGroup]
+
+# --- Ingestion Jobs ---
+class StageProgress(BaseModel):
+    done: int = 0
+    total: int = 0
+
+class IngestJobStatus(BaseModel):
+    id: str
+    catalog_id: str
+    status: str
+    stage: Optional[str] = None
+    progress: Dict[str, StageProgress] = {}
+    attempts: int = 0
+    max_attempts: int = 3
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # --- 3. Scene Schemas ---
 class Scene(BaseModel):
     id: str
@@ -0,0 +1,79 @@
+from collections import deque
+from typing import Iterator
+
+# Multi-pattern string search (Aho-Corasick): finds every occurrence of every pattern in
+# one pass over the text, no matter how many patterns there are.
+# Uses the C implementation (pip install pyahocorasick) when present, else pure Python.
+try:
+    import ahocorasick  # type: ignore
+except ImportError:
+    ahocorasick = None
+
+class _PyAutomaton:
+    """Pure-Python automaton: goto dicts + failure links + merged outputs."""
+
+    def __init__(self, patterns: dict):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pattern, value in patterns.items():
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = nxt
+            self.out[state].append((len(pattern), value))
+
+        # Breadth-first: a node's failure link is the longest proper suffix that is also a prefix
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter(self, text: str) -> Iterator[tuple]:
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value in out[state]:
+                yield i + 1 - length, i + 1, value
+
+class Automaton:
+    """
+    Build once from {pattern: value}, then matches(text) yields (start, end, value)
+    for every occurrence, overlapping ones included.
+    """
+
+    def __init__(self, patterns: dict):
+        self.patterns = {p: v for p, v in patterns.items() if p}
+        if ahocorasick is not None and self.patterns:
+            self._c = ahocorasick.Automaton()
+            for pattern, value in self.patterns.items():
+                self._c.add_word(pattern, (len(pattern), value))
+            self._c.make_automaton()
+            self._py = None
+        else:
+            self._c = None
+            self._py = _PyAutomaton(self.patterns)
+
+    def matches(self, text: str) -> Iterator[tuple]:
+        if not self.patterns:
+            return
+        if self._c is not None:
+            for end, (length, value) in self._c.iter(text):
+                yield end + 1 - length, end + 1, value
+        else:
+            yield from self._py.iter(text) # type: ignore
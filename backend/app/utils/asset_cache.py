@@ -0,0 +1,231 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import Optional
+from app.utils.fileio import atomic_write
+from app.utils.file_lock import file_lock
+from app.utils.single_flight import SingleFlight
+
+# Generated audio/images, kept on disk under a size budget.
+# Each folder has a manifest.json: {key: {"files": [...], "size": bytes, "meta": {...}}}.
+# A key is only a hit once its entry is in the manifest, and files are written
+# (temp file + rename) before the entry, so a half-written file is never served.
+# Hits just touch the files' mtime; when a write takes the folder over its budget the
+# least recently used entries are deleted.
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(os.path.dirname(CURRENT_DIR))
+STATIC_DIR = os.path.join(BACKEND_DIR, "static")
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".manifest.lock"
+
+# --- BUDGETS ---
+AUDIO_CACHE_MB = float(os.getenv("ASSET_AUDIO_CACHE_MB", "2048"))
+IMAGE_CACHE_MB = float(os.getenv("ASSET_IMAGE_CACHE_MB", "4096"))
+# Eviction goes down to this share of the budget, so it doesn't run on every write
+EVICT_TO_FRACTION = float(os.getenv("ASSET_EVICT_TO_FRACTION", "0.9"))
+
+# --- COMPRESSION ---
+# "opus" stores narration as Ogg/Opus (~10x smaller than WAV, needs ffmpeg on PATH),
+# "wav" keeps it as synthesized
+AUDIO_FORMAT = os.getenv("ASSET_AUDIO_FORMAT", "wav")
+AUDIO_OPUS_BITRATE = os.getenv("ASSET_AUDIO_OPUS_BITRATE", "32k")
+# "webp" or "png"
+IMAGE_FORMAT = os.getenv("ASSET_IMAGE_FORMAT", "png")
+IMAGE_WEBP_QUALITY = int(os.getenv("ASSET_IMAGE_WEBP_QUALITY", "85"))
+
+def asset_key(*parts) -> str:
+    """Cache key from everything that changes the output (text + voice + model, prompt + style + model...)."""
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+def audio_extension() -> str:
+    return ".ogg" if AUDIO_FORMAT == "opus" and shutil.which("ffmpeg") else ".wav"
+
+def encode_audio(wav: bytes):
+    """WAV bytes -> (bytes, extension) in the configured format (WAV if transcoding fails)."""
+    if audio_extension() != ".ogg":
+        return wav, ".wav"
+    try:
+        proc = subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+             "-c:a", "libopus", "-b:a", AUDIO_OPUS_BITRATE, "-f", "ogg", "pipe:1"],
+            input=wav, capture_output=True, timeout=120,
+        )
+        if proc.returncode == 0 and proc.stdout:
+            return proc.stdout, ".ogg"
+        print(f"⚠️ Opus transcoding failed, keeping WAV: {proc.stderr.decode(errors='ignore')[:200]}")
+    except Exception as e:
+        print(f"⚠️ Opus transcoding failed, keeping WAV: {e}")
+    return wav, ".wav"
+
+def encode_image(image):
+    """PIL image -> (bytes, extension) in the configured format."""
+    buffer = io.BytesIO()
+    if IMAGE_FORMAT == "webp":
+        image.save(buffer, format="WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+        return buffer.getvalue(), ".webp"
+    image.save(buffer, format="PNG")
+    return buffer.getvalue(), ".png"
+
+class AssetCache:
+    def __init__(self, folder: str, budget_mb: float, name: str = ""):
+        self.folder = folder
+        self.name = name or os.path.basename(folder)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.manifest_path = os.path.join(folder, MANIFEST_FILE)
+        self.lock_path = os.path.join(folder, LOCK_FILE)
+        os.makedirs(folder, exist_ok=True)
+
+        self._entries = {}
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+        self.flight = SingleFlight(self.name, folder)
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.folder, filename)
+
+    # --- MANIFEST ---
+    def _load(self):
+        """Re-reads the manifest if another process changed it (one stat per call)."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._manifest_mtime:
+            return
+        entries = {}
+        if mtime is not None:
+            try:
+                with open(self.manifest_path, "rb") as f:
+                    entries = json.loads(f.read() or b"{}")
+            except ValueError:
+                print(f"⚠️ Asset manifest {self.manifest_path} unreadable, rebuilding it.")
+        with self._lock:
+            self._entries, self._manifest_mtime = entries, mtime
+
+    def _save(self, entries: dict):
+        atomic_write(self.manifest_path, json.dumps(entries).encode("utf-8"))
+        with self._lock:
+            self._entries = entries
+            self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def _adopt_untracked(self, entries: dict, new_files: set):
+        """Files written before the manifest existed become evictable entries too."""
+        tracked = new_files | {f for entry in entries.values() for f in entry["files"]}
+        for filename in os.listdir(self.folder):
+            if filename.startswith(".") or filename == MANIFEST_FILE or filename in tracked:
+                continue
+            path = self.path(filename)
+            if os.path.isfile(path):
+                entries[f"legacy:{filename}"] = {"files": [filename], "size": os.path.getsize(path), "meta": {}}
+
+    # --- READ / WRITE ---
+    def get(self, key: str) -> Optional[list]:
+        """Filenames stored under key, or None. A hit counts as a use for LRU eviction."""
+        self._load()
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.time()
+            try:
+                for filename in entry["files"]:
+                    os.utime(self.path(filename), (now, now))
+                self.hits += 1
+                return list(entry["files"])
+            except FileNotFoundError:
+                pass  # Evicted by another process a moment ago
+        self.misses += 1
+        return None
+
+    def peek(self, key: str) -> Optional[list]:
+        """Like get() when all the files exist, but not counted as a hit or a use (status checks)."""
+        self._load()
+        entry = self._entries.get(key)
+        if entry is not None and all(os.path.exists(self.path(f)) for f in entry["files"]):
+            return list(entry["files"])
+        return None
+
+    def put(self, key: str, files: list, meta: Optional[dict] = None) -> list:
+        """
+        Stores [(filename, bytes), ...] under key, then evicts least recently used
+        entries while the folder is over budget. Returns the filenames.
+        """
+        for filename, data in files:
+            atomic_write(self.path(filename), data)
+
+        with file_lock(self.lock_path):
+            self._manifest_mtime = None  # Always re-read under the lock
+            self._load()
+            entries = dict(self._entries)
+            if not os.path.exists(self.manifest_path):
+                self._adopt_untracked(entries, {filename for filename, _ in files})
+            entries[key] = {
+                "files": [filename for filename, _ in files],
+                "size": sum(len(data) for _, data in files),
+                "meta": meta or {},
+            }
+            self._evict(entries, keep=key)
+            self._save(entries)
+        return [filename for filename, _ in files]
+
+    def generate_once(self, key: str, generate) -> list:
+        """
+        After a miss: runs generate() (which put()s and returns the filenames) unless an
+        identical request in this or another worker is already doing it, in which case
+        this one waits and returns its files. The re-check after waiting is a peek():
+        the caller's get() already counted this lookup.
+        """
+        return self.flight.do(key, lambda: self.peek(key), generate)
+
+    def _last_used(self, entry: dict) -> float:
+        try:
+            return max(os.path.getmtime(self.path(f)) for f in entry["files"])
+        except (OSError, ValueError):
+            return 0.0
+
+    def _evict(self, entries: dict, keep: str):
+        total = sum(entry["size"] for entry in entries.values())
+        if total <= self.budget_bytes:
+            return
+        target = self.budget_bytes * EVICT_TO_FRACTION
+        freed = 0
+        for key in sorted(entries, key=lambda k: self._last_used(entries[k])):
+            if total - freed <= target:
+                break
+            if key == keep:
+                continue
+            entry = entries.pop(key)
+            for filename in entry["files"]:
+                try:
+                    os.remove(self.path(filename))
+                except FileNotFoundError:
+                    pass
+            freed += entry["size"]
+            self.evicted += 1
+        print(f"🧹 {self.name} cache: evicted {freed / 1e6:.1f} MB (budget {self.budget_bytes / 1e6:.0f} MB)")
+
+    def stats(self) -> dict:
+        self._load()
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_mb": round(sum(e["size"] for e in self._entries.values()) / 1e6, 1),
+            "budget_mb": round(self.budget_bytes / 1e6, 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evicted": self.evicted,
+            "single_flight": self.flight.stats(),
+        }
+
+# Global instances
+audio_cache = AssetCache(os.path.join(STATIC_DIR, "audio"), AUDIO_CACHE_MB, "audio")
+image_cache = AssetCache(os.path.join(STATIC_DIR, "images"), IMAGE_CACHE_MB, "images")
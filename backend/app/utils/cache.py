@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# Shared cache backend. docker-compose.yml already runs Redis on localhost:6379;
+# when it's not reachable (or the redis package isn't installed) every worker
+# falls back to its own in-process LRU.
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_redis_client = None
+_redis_checked = False
+
+def get_redis():
+    """Returns a connected Redis client, or None. Checked once per process."""
+    global _redis_client, _redis_checked
+    if not _redis_checked:
+        _redis_checked = True
+        if REDIS_URL:
+            try:
+                import redis
+                client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+                client.ping()
+                _redis_client = client
+                print(f"🧰 Redis connected at {REDIS_URL}")
+            except ImportError:
+                print("⚠️ redis package not installed. Using in-process caches.")
+            except Exception as e:
+                print(f"⚠️ Redis unavailable ({e}). Using in-process caches.")
+    return _redis_client
+
+class LRUCache:
+    """Thread-safe in-process LRU with a per-entry TTL and hit/miss counters."""
+    backend = "memory"
+
+    def __init__(self, name: str, max_items: int = 1024, ttl_seconds: float = 600):
+        self.name = name
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "size": len(self._data),
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+def _encode(value) -> bytes:
+    """JSON (never pickle: anyone who can write to Redis could run code on load). Arrays are tagged."""
+    def default(obj):
+        if isinstance(obj, np.ndarray):
+            return {"__ndarray__": obj.tolist(), "dtype": str(obj.dtype)}
+        if isinstance(obj, np.generic):
+            return obj.item()
+        raise TypeError(f"{type(obj).__name__} can't be cached in Redis")
+    return json.dumps(value, default=default).encode("utf-8")
+
+def _decode(raw: bytes):
+    def object_hook(obj):
+        if "__ndarray__" in obj:
+            return np.asarray(obj["__ndarray__"], dtype=obj["dtype"])
+        return obj
+    return json.loads(raw, object_hook=object_hook)
+
+class RedisCache(LRUCache):
+    """
+    Same interface, stored in Redis so every worker shares it. Entries expire by TTL,
+    and a sorted set of keys by last use keeps the namespace at max_items (least
+    recently used are deleted in set()). Hit/miss counters are per worker.
+    """
+    backend = "redis"
+
+    def __init__(self, client, name: str, max_items: int = 1024, ttl_seconds: float = 600):
+        super().__init__(name, max_items, ttl_seconds)
+        self.client = client
+        self.prefix = f"historabook:{name}:"
+        self.index = f"historabook:{name}#lru"
+
+    def get(self, key: str):
+        try:
+            pipe = self.client.pipeline()
+            pipe.get(self.prefix + key)
+            pipe.zadd(self.index, {key: time.time()}, xx=True)  # Only refreshes existing keys
+            raw = pipe.execute()[0]
+            if raw is None:
+                self.client.zrem(self.index, key)  # Expired
+        except Exception as e:
+            print(f"⚠️ Redis get failed ({e})")
+            raw = None
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return _decode(raw)
+
+    def set(self, key: str, value):
+        now = time.time()
+        try:
+            pipe = self.client.pipeline()
+            pipe.setex(self.prefix + key, int(self.ttl_seconds), _encode(value))
+            pipe.zadd(self.index, {key: now})
+            # Unused for longer than the TTL: certainly expired
+            pipe.zremrangebyscore(self.index, 0, now - self.ttl_seconds)
+            pipe.zcard(self.index)
+            size = pipe.execute()[-1]
+            if size > self.max_items:
+                oldest = [k.decode() if isinstance(k, bytes) else k
+                          for k in self.client.zrange(self.index, 0, size - self.max_items - 1)]
+                pipe = self.client.pipeline()
+                pipe.delete(*[self.prefix + k for k in oldest])
+                pipe.zrem(self.index, *oldest)
+                pipe.execute()
+        except Exception as e:
+            print(f"⚠️ Redis set failed ({e})")
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+        self.client.delete(self.index)
+
+    def stats(self) -> dict:
+        data = super().stats()
+        try:
+            data["size"] = self.client.zcard(self.index)
+        except Exception:
+            data["size"] = None
+        return data
+
+def make_cache(name: str, max_items: int, ttl_seconds: float):
+    """Redis-backed cache when Redis is reachable, otherwise an in-process LRU."""
+    client = get_redis()
+    if client is not None:
+        return RedisCache(client, name, max_items, ttl_seconds)
+    return LRUCache(name, max_items, ttl_seconds)
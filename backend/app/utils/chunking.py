@@ -1,3 +1,25 @@
+import hashlib
+import os
+import re
+import zlib
+from typing import Callable, Iterable, Iterator, Optional
+
+# --- PAGE-AWARE CHUNKING CONFIG ---
+# all-MiniLM-L6-v2 reads at most 256 tokens; 2 of them are [CLS]/[SEP]
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "254"))
+# Trailing sentences (up to this many tokens) repeated at the start of the next chunk
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# Content-defined boundaries: a chunk that is at least half full also ends before any
+# sentence whose checksum is divisible by this. After an edit, boundaries line up
+# again at the next such sentence instead of shifting to the end of the book, so a
+# re-ingest finds most chunks unchanged. 0 = always pack chunks to the limit.
+CHUNK_ANCHOR_EVERY = int(os.getenv("CHUNK_ANCHOR_EVERY", "8"))
+
+# Sentence end: . ! ? (optionally followed by a closing quote/bracket) then whitespace
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|(?<=[.!?]["\'\)\]\u201d\u2019])\s+')
+_SENTENCE_END = re.compile(r'[.!?]["\'\)\]\u201d\u2019]?$')
+_WORD_PIECE = re.compile(r"\w+|[^\w\s]")
+
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100):
     """
     Splits text into chunks of `chunk_size` characters with `overlap`.
@@ -24,4 +46,131 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100):
         # Move the window forward, but step back by 'overlap' amount
         start += (chunk_size - overlap)
         
-    return chunks
\ No newline at end of file
+    return chunks
+
+
+def content_hash(text: str) -> str:
+    """sha256 of the whitespace-normalized text (key for reusing a chunk's embedding)."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+def _is_anchor(sentence: str, every: int) -> bool:
+    return every > 0 and zlib.crc32(sentence.encode("utf-8")) % every == 0
+
+def estimate_tokens(text: str) -> int:
+    """Cheap stand-in for the model tokenizer: words + punctuation marks."""
+    return len(_WORD_PIECE.findall(text))
+
+def split_sentences(text: str) -> list:
+    """Splits on sentence punctuation and collapses PDF line breaks inside sentences."""
+    sentences = []
+    for piece in _SENTENCE_BREAK.split(text):
+        sentence = " ".join(piece.split())
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+def _split_long_sentence(sentence: str, max_tokens: int, count_tokens: Callable) -> list:
+    """A "sentence" over the budget (tables, run-on OCR text) is cut between words."""
+    parts, words, used = [], [], 0
+    for word in sentence.split():
+        n = count_tokens(word)
+        if words and used + n > max_tokens:
+            parts.append(" ".join(words))
+            words, used = [], 0
+        words.append(word)
+        used += n
+    if words:
+        parts.append(" ".join(words))
+    return parts
+
+def _page_sentences(pages: Iterable[dict]) -> Iterator[tuple]:
+    """
+    Yields (sentence, first_page, last_page). A sentence that runs over a page break
+    is glued back together and keeps both page numbers.
+    """
+    carry, carry_page, page_number = "", None, None
+    for page in pages:
+        sentences = split_sentences(page["text"] or "")
+        if not sentences:
+            continue
+        if carry:
+            sentences[0] = carry + " " + sentences[0]
+            first_page = carry_page
+        else:
+            first_page = page["page_number"]
+
+        page_number = page["page_number"]
+
+        # The last sentence may continue on the next page
+        last = sentences.pop()
+        for sentence in sentences:
+            yield sentence, first_page, page_number
+            first_page = page_number
+
+        if _SENTENCE_END.search(last):
+            yield last, first_page, page_number
+            carry, carry_page = "", None
+        else:
+            carry, carry_page = last, first_page
+    if carry:
+        yield carry, carry_page, page_number
+
+def chunk_pages(
+    pages: Iterable[dict],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    count_tokens: Optional[Callable] = None,
+    anchor_every: int = CHUNK_ANCHOR_EVERY,
+) -> Iterator[dict]:
+    """
+    Page-aware chunker. Takes page records ({"page_number", "text"}, e.g. from
+    iter_pdf_pages) and yields chunks as they fill up:
+        {"content": str, "page_start": int, "page_end": int, "token_count": int, "content_hash": str}
+    Chunks end on sentence boundaries and stay within max_tokens (so nothing is
+    truncated by the embedding model); the last sentences of a chunk, up to
+    overlap_tokens, are repeated at the start of the next one for context.
+    Pages with page_number None (plain text) give chunks with None page numbers.
+    """
+    count_tokens = count_tokens or estimate_tokens
+    window = []      # [(sentence, first_page, last_page, tokens)]
+    used = 0
+    fresh = False    # Window holds something not yet emitted
+
+    def emit():
+        content = " ".join(s for s, _, _, _ in window)
+        # Text without page information (page_number None) gives None page numbers
+        last_pages = [last for _, _, last, _ in window if last is not None]
+        return {
+            "content": content,
+            "page_start": window[0][1],
+            "page_end": max(last_pages) if last_pages else None,
+            "token_count": used,
+            "content_hash": content_hash(content),
+        }
+
+    for sentence, first_page, last_page in _page_sentences(pages):
+        n = count_tokens(sentence)
+        pieces = [(sentence, n)] if n <= max_tokens else [
+            (part, count_tokens(part)) for part in _split_long_sentence(sentence, max_tokens, count_tokens)
+        ]
+
+        for text, n in pieces:
+            anchor = fresh and used * 2 >= max_tokens and _is_anchor(text, anchor_every)
+            if window and (used + n > max_tokens or anchor):
+                if fresh:
+                    yield emit()
+                # Keep a short tail as overlap, as long as the new sentence still fits
+                tail, tail_used = [], 0
+                for item in reversed(window):
+                    if tail_used + item[3] > overlap_tokens or tail_used + item[3] + n > max_tokens:
+                        break
+                    tail.insert(0, item)
+                    tail_used += item[3]
+                window, used, fresh = tail, tail_used, False
+
+            window.append((text, first_page, last_page, n))
+            used += n
+            fresh = True
+
+    if window and fresh:
+        yield emit()
@@ -1,16 +1,36 @@
 from sentence_transformers import SentenceTransformer
+import numpy as np
+import atexit
 import os
+from app.utils.model_registry import model_registry, disk_size_mb
 
-# Load model once (singleton pattern)
-# This downloads about 80MB the first time you run it.
+# The model lives in the model registry (see model_registry.py)
 # POINT TO THE LOCAL FOLDER
 model_path = "./local_models/all-MiniLM-L6-v2"
+# Part of the embedding cache key, so vectors from another model are never reused
+MODEL_NAME = os.path.basename(model_path)
 
 # Check if it exists to be safe
 if not os.path.exists(model_path):
     raise RuntimeError(f"Offline model not found at {model_path}. Please run download_model.py")
 
-model = SentenceTransformer(model_path)
+def _load_model():
+    return SentenceTransformer(model_path)
+
+# Loaded on first use; the model registry may unload it when memory is needed
+model_registry.register(
+    "embeddings", _load_model,
+    unloader=lambda model: _stop_process_pool(),
+    estimate_mb=lambda: disk_size_mb(model_path),
+)
+
+# --- BATCHING CONFIG ---
+# How many texts go through the model per forward pass
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Number of CPU processes used for big ingests (0 or 1 = encode in this process)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+
+_process_pool = None
 
 def get_embedding(text: str) -> list:
     """
@@ -20,5 +40,57 @@ def get_embedding(text: str) -> list:
         return []
         
     # Model returns a numpy array, convert to list for JSON storage
-    vector = model.encode(text)
-    return vector.tolist()
\ No newline at end of file
+    with model_registry.use("embeddings") as model:
+        vector = model.encode(text)
+    return vector.tolist()
+
+def count_tokens(text: str) -> int:
+    """
+    Word-piece tokens the model will see for this text (without [CLS]/[SEP]).
+    Used by the chunker so chunks fit the model's window exactly.
+    """
+    with model_registry.use("embeddings") as model:
+        return len(model.tokenizer.tokenize(text))
+
+def _get_process_pool(model, num_workers: int):
+    """Starts the multi-process encode pool once and reuses it for every ingest."""
+    global _process_pool
+    if _process_pool is None:
+        print(f"🧵 Starting embedding pool with {num_workers} CPU workers...")
+        _process_pool = model.start_multi_process_pool(target_devices=["cpu"] * num_workers)
+        atexit.register(_stop_process_pool)
+    return _process_pool
+
+def _stop_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        SentenceTransformer.stop_multi_process_pool(_process_pool)
+        _process_pool = None
+
+def get_embeddings(texts: list, batch_size: int = 0, num_workers: int = -1) -> np.ndarray:
+    """
+    Converts many texts into a (N, 384) float32 matrix in one go.
+    The result can be passed straight to vector_store.add_vectors().
+    """
+    with model_registry.use("embeddings") as model:
+        dimension = model.get_sentence_embedding_dimension()
+        if not texts:
+            return np.zeros((0, dimension), dtype=np.float32)
+
+        batch_size = batch_size or EMBED_BATCH_SIZE
+        workers = EMBED_WORKERS if num_workers < 0 else num_workers
+
+        # Spreading work over processes only pays off when every worker gets a few batches
+        if workers > 1 and len(texts) >= batch_size * workers:
+            pool = _get_process_pool(model, workers)
+            vectors = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        else:
+            vectors = model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+
+    # FAISS wants C-contiguous float32; this is a no-op when the model already returns that
+    return np.ascontiguousarray(vectors, dtype=np.float32)
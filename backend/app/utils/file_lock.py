@@ -0,0 +1,78 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Cross-process exclusive lock on a file (works between uvicorn workers and ingest
+# workers on the same machine). Every `with` opens its own handle, so it also
+# excludes other threads of the same process.
+if os.name == "nt":
+    import msvcrt
+
+    def _try_lock(fd) -> bool:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _try_lock(fd) -> bool:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+def _is_current(path: str, fd) -> bool:
+    """Whether `path` still names the file open as fd (not deleted or replaced)."""
+    try:
+        return os.stat(path).st_ino == os.fstat(fd).st_ino
+    except FileNotFoundError:
+        return False
+
+@contextmanager
+def file_lock(path: str, timeout: Optional[float] = None, poll_seconds: float = 0.05,
+              remove: bool = False):
+    """
+    Holds an exclusive lock on `path` (created if missing) for the `with` block.
+    Raises TimeoutError if it can't be taken within `timeout` seconds (None = wait forever).
+    remove=True deletes the file on release (one lock file per key, e.g. single-flight);
+    a waiter that got the lock of the deleted file notices and locks the new one.
+    Windows can't delete open files, so there they are left in place.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    remove = remove and os.name != "nt"
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            while not _try_lock(fd):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Could not lock {path} within {timeout}s")
+                time.sleep(poll_seconds)
+            if remove and not _is_current(path, fd):
+                # The holder deleted it just before we got the lock: start over
+                _unlock(fd)
+                continue
+            try:
+                yield
+            finally:
+                if remove:
+                    # Deleted while still locked, so the next holder can tell
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                _unlock(fd)
+            return
+        finally:
+            os.close(fd)
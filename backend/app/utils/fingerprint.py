@@ -1,19 +1,59 @@
 from datasketch import MinHash
+import hashlib
+import os
 import re
+import numpy as np
 
-def create_minhash(text: str, num_perm: int = 128) -> list:
+# --- NEAR-DUPLICATE DETECTION CONFIG ---
+NUM_PERM = 128
+# Words per shingle (3-word shingles tell editions apart far better than single words)
+SHINGLE_WORDS = 3
+# How much text (from the start of the book) goes into the signature
+FINGERPRINT_CHARS = int(os.getenv("FINGERPRINT_CHARS", "20000"))
+# LSH banding: 16 bands x 8 rows = 128. Books become candidates from ~0.7 similarity up
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+# Estimated Jaccard similarity at which an upload counts as the same book
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.85"))
+# Samples with fewer shingles (scanned PDFs without a text layer, near-empty files) get
+# no signature: they would all hash alike and match each other at similarity 1.0
+FINGERPRINT_MIN_SHINGLES = int(os.getenv("FINGERPRINT_MIN_SHINGLES", "50"))
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> list:
+    """Unique k-word shingles of the text, as bytes (lowercased, punctuation dropped)."""
+    words = [w for w in re.split(r'\W+', text.lower()) if w]
+    if len(words) < k:
+        return list({w.encode('utf8') for w in words})
+    return list({" ".join(words[i:i + k]).encode('utf8') for i in range(len(words) - k + 1)})
+
+def create_minhash(text: str, num_perm: int = NUM_PERM) -> list:
     """
     Creates a MinHash signature for the given text.
-    Returns a list of integers (the signature).
+    All shingles are hashed + permuted in one vectorized update_batch call.
+    Returns a list of integers (the signature), or [] when the text is too short
+    to fingerprint (fewer than FINGERPRINT_MIN_SHINGLES shingles).
     """
+    text_shingles = shingles(text)
+    if len(text_shingles) < FINGERPRINT_MIN_SHINGLES:
+        return []
     m = MinHash(num_perm=num_perm)
-    
-    # Simple tokenization: split by whitespace, lowercase
-    tokens = set(re.split(r'\W+', text.lower()))
-    
-    for token in tokens:
-        if token:
-            m.update(token.encode('utf8'))
-            
+    m.update_batch(text_shingles)
+
     # Return the hash values as a standard list (so it can be stored as JSON)
-    return m.hashvalues.tolist()
\ No newline at end of file
+    return m.hashvalues.tolist()
+
+def lsh_buckets(signature: list) -> list:
+    """[(band, bucket)] for a signature; bucket is a signed 64-bit hash of the band's rows."""
+    values = np.asarray(signature, dtype=np.uint64)
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows = values[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(rows.tobytes(), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "little", signed=True)))
+    return buckets
+
+def similarity(signature_a: list, signature_b: list) -> float:
+    """Estimated Jaccard similarity of the two texts (share of equal signature slots)."""
+    if not signature_a or not signature_b or len(signature_a) != len(signature_b):
+        return 0.0
+    return float(np.mean(np.asarray(signature_a) == np.asarray(signature_b)))
@@ -0,0 +1,244 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from sqlalchemy import or_, and_
+from app.db.session import SessionLocal
+from app.models.job import IngestJob
+from app.utils.cache import get_redis, REDIS_URL
+
+# Durable ingestion queue.
+# The ingest_jobs table is the source of truth (survives restarts, shows progress).
+# Redis (when available) only wakes idle workers up immediately; without it workers
+# poll the table every INGEST_POLL_SECONDS.
+
+INGEST_STAGES = ("parse", "chunk", "embed", "index", "scene_graph")
+QUEUE_KEY = "historabook:ingest_jobs"
+
+POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "2"))
+# A running job whose worker hasn't renewed its lease for this long is picked up again
+LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", "900"))
+# While a job runs, its worker renews the lease this often (long stages such as
+# whole-book NER report no progress for minutes)
+HEARTBEAT_SECONDS = float(os.getenv("INGEST_HEARTBEAT_SECONDS", str(LEASE_SECONDS / 3)))
+# Failed attempt n waits BACKOFF * 2^(n-1) seconds before the retry
+RETRY_BACKOFF_SECONDS = float(os.getenv("INGEST_RETRY_BACKOFF_SECONDS", "30"))
+
+_wakeup_client = None
+
+def _get_wakeup_client():
+    """Separate Redis client for BRPOP (the shared one has a short socket timeout)."""
+    global _wakeup_client
+    if _wakeup_client is None and get_redis() is not None:
+        import redis
+        _wakeup_client = redis.Redis.from_url(REDIS_URL, socket_timeout=POLL_SECONDS + 5)
+    return _wakeup_client
+
+def enqueue_ingest_job(db, catalog_id: str, file_path: str) -> IngestJob:
+    job = IngestJob(
+        catalog_id=catalog_id,
+        file_path=file_path,
+        status="queued",
+        progress={stage: {"done": 0, "total": 0} for stage in INGEST_STAGES},
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    client = get_redis()
+    if client is not None:
+        try:
+            client.lpush(QUEUE_KEY, str(job.id))
+        except Exception as e:
+            print(f"⚠️ Could not notify workers through Redis ({e}). They will poll.")
+    return job
+
+def _wait_for_work():
+    client = _get_wakeup_client()
+    if client is not None:
+        try:
+            client.brpop([QUEUE_KEY], timeout=int(POLL_SECONDS) or 1)
+            return
+        except Exception:
+            pass
+    time.sleep(POLL_SECONDS)
+
+def claim_next_job(worker_id: str) -> Optional[str]:
+    """
+    Atomically takes the oldest runnable job (queued and past its backoff, or running
+    with an expired lease). SKIP LOCKED lets many workers claim in parallel.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=LEASE_SECONDS)
+        job = (
+            db.query(IngestJob)
+            .filter(or_(
+                and_(IngestJob.status == "queued", IngestJob.run_after <= now),
+                and_(IngestJob.status == "running", IngestJob.locked_at < stale),
+            ))
+            .order_by(IngestJob.created_at)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.rollback()
+            return None
+
+        if job.status == "running" and job.attempts >= job.max_attempts: # type: ignore
+            job.status = "failed" # type: ignore
+            job.error = f"Worker {job.locked_by} stopped responding on the last attempt." # type: ignore
+            job.updated_at = now # type: ignore
+            db.commit()
+            return None
+
+        # Conditional update: only one worker wins even on databases without SKIP LOCKED
+        claimed = (
+            db.query(IngestJob)
+            .filter(
+                IngestJob.id == job.id,
+                IngestJob.status == job.status,
+                IngestJob.attempts == job.attempts,
+            )
+            .update({
+                IngestJob.status: "running",
+                IngestJob.locked_by: worker_id,
+                IngestJob.locked_at: now,
+                IngestJob.attempts: (job.attempts or 0) + 1,
+                IngestJob.updated_at: now,
+            }, synchronize_session=False)
+        )
+        db.commit()
+        return str(job.id) if claimed else None
+    finally:
+        db.close()
+
+class JobProgress:
+    """
+    Callable handed to the pipeline: progress(stage, done, total).
+    Writes through its own session (never touches the pipeline's transaction) and
+    renews the job lease. Mid-stage updates are throttled.
+    """
+    def __init__(self, job_id: str, min_interval: float = 1.0):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_write = 0.0
+
+    def __call__(self, stage: str, done: int, total: int):
+        now = time.monotonic()
+        # total == 0 means "not known yet" (streaming stages)
+        if done != total and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+
+        db = SessionLocal()
+        try:
+            job = db.get(IngestJob, self.job_id)
+            if job is None:
+                return
+            progress = dict(job.progress or {}) # type: ignore
+            progress[stage] = {"done": done, "total": total}
+            job.progress = progress # type: ignore
+            job.stage = stage # type: ignore
+            job.locked_at = datetime.utcnow() # type: ignore
+            job.updated_at = datetime.utcnow() # type: ignore
+            db.commit()
+        finally:
+            db.close()
+
+def _renew_lease(job_id: str, worker_id: str) -> bool:
+    """Extends the lease if this worker still holds it. Returns whether it did."""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        renewed = (
+            db.query(IngestJob)
+            .filter(IngestJob.id == job_id, IngestJob.status == "running", IngestJob.locked_by == worker_id)
+            .update({IngestJob.locked_at: now, IngestJob.updated_at: now}, synchronize_session=False)
+        )
+        db.commit()
+        return bool(renewed)
+    finally:
+        db.close()
+
+def _heartbeat(job_id: str, worker_id: str, done: threading.Event):
+    """Renews the lease every HEARTBEAT_SECONDS until the job is done."""
+    while not done.wait(HEARTBEAT_SECONDS):
+        try:
+            if not _renew_lease(job_id, worker_id):
+                print(f"⚠️ Worker {worker_id} lost the lease on job {job_id}")
+                return
+        except Exception as e:
+            print(f"⚠️ Lease renewal for job {job_id} failed ({e}). Retrying.")
+
+def _finish_job(job_id: str, worker_id: str, error: Optional[str] = None):
+    db = SessionLocal()
+    try:
+        job = db.get(IngestJob, job_id)
+        if job is None or job.locked_by != worker_id: # type: ignore
+            # Our lease expired and another worker owns the job now
+            return
+        now = datetime.utcnow()
+        job.locked_by = None # type: ignore
+        job.updated_at = now # type: ignore
+        if error is None:
+            job.status = "done" # type: ignore
+            job.stage = None # type: ignore
+            job.error = None # type: ignore
+        elif job.attempts < job.max_attempts: # type: ignore
+            delay = RETRY_BACKOFF_SECONDS * (2 ** (job.attempts - 1)) # type: ignore
+            job.status = "queued" # type: ignore
+            job.error = error # type: ignore
+            job.run_after = now + timedelta(seconds=delay) # type: ignore
+            print(f"🔁 Job {job_id} failed (attempt {job.attempts}/{job.max_attempts}), retrying in {delay:.0f}s")
+        else:
+            job.status = "failed" # type: ignore
+            job.error = error # type: ignore
+            print(f"❌ Job {job_id} failed for good: {error}")
+        db.commit()
+    finally:
+        db.close()
+
+def work_forever(handler: Callable, worker_id: str = "", stop_event: Optional[threading.Event] = None):
+    """
+    Worker loop: claim a job, run handler(job_id, progress), record the outcome.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+    print(f"👷 Ingest worker {worker_id} ready.")
+    while stop_event is None or not stop_event.is_set():
+        job_id = claim_next_job(worker_id)
+        if job_id is None:
+            _wait_for_work()
+            continue
+
+        print(f"📥 Worker {worker_id} took job {job_id}")
+        done = threading.Event()
+        threading.Thread(target=_heartbeat, args=(job_id, worker_id, done),
+                         name=f"lease-{job_id[:8]}", daemon=True).start()
+        try:
+            handler(job_id, JobProgress(job_id))
+            _finish_job(job_id, worker_id)
+            print(f"✅ Job {job_id} done.")
+        except Exception as e:
+            traceback.print_exc()
+            _finish_job(job_id, worker_id, error=str(e) or e.__class__.__name__)
+        finally:
+            done.set()
+
+def start_local_workers(handler: Callable, count: int) -> threading.Event:
+    """
+    Local stand-in for `python worker.py`: runs the same loop on daemon threads of
+    this process. Returns an Event that stops them.
+    """
+    stop_event = threading.Event()
+    for n in range(count):
+        threading.Thread(
+            target=work_forever,
+            args=(handler, f"{socket.gethostname()}-{os.getpid()}-local{n}", stop_event),
+            daemon=True,
+        ).start()
+    return stop_event
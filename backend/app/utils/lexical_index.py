@@ -0,0 +1,237 @@
+import io
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Optional
+import numpy as np
+from app.utils.fileio import atomic_write
+
+# BM25 inverted index over chunk text (exact names, dates: "Treaty of 1648").
+# Every ingested book becomes one immutable segment saved as its own .npz file, so
+# adding a book costs O(new chunks). Re-indexing a book writes a new segment that
+# supersedes the old one (names sort by time, the newest per book wins).
+# Inside a segment the postings are CSR arrays:
+#   vocab    sorted UTF-8 terms                  (n_terms,)   bytes
+#   offsets  start of each term's postings       (n_terms+1,) int64
+#   docs     chunk row inside the segment        (n_postings,) int32
+#   tfs      term frequency in that chunk        (n_postings,) int32
+#   doc_len  tokens per chunk                    (n_docs,)    int32
+#   chunk_ids Chunk UUIDs                        (n_docs,)    bytes
+
+LEXICAL_DIR = "lexical_index"
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Tokens longer than this are junk (URLs, OCR noise) and would bloat the vocab
+MAX_TOKEN_LEN = 32
+RELOAD_CHECK_SECONDS = float(os.getenv("LEXICAL_RELOAD_CHECK_SECONDS", "2"))
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) <= MAX_TOKEN_LEN]
+
+class Segment:
+    def __init__(self, catalog_id: str, vocab, offsets, docs, tfs, doc_len, chunk_ids):
+        self.catalog_id = catalog_id
+        self.vocab = vocab
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.chunk_ids = chunk_ids
+
+    @classmethod
+    def build(cls, catalog_id: str, chunk_ids: list, texts: list):
+        terms, docs, tfs = [], [], []
+        doc_len = np.zeros(len(texts), dtype="int32")
+        for d, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[d] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                terms.append(term.encode("utf-8"))
+                docs.append(d)
+                tfs.append(tf)
+
+        vocab, term_ids = np.unique(np.array(terms, dtype="S"), return_inverse=True)
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype="int64")
+        offsets[1:] = np.cumsum(np.bincount(term_ids, minlength=len(vocab)))
+
+        return cls(
+            catalog_id,
+            vocab,
+            offsets,
+            np.array(docs, dtype="int32")[order],
+            np.array(tfs, dtype="int32")[order],
+            doc_len,
+            np.array([c.encode("ascii") for c in chunk_ids], dtype="S"),
+        )
+
+    def postings(self, term: bytes):
+        """(docs, tfs) for a term, or None. Binary search over the sorted vocab."""
+        pos = int(np.searchsorted(self.vocab, term))
+        if pos >= len(self.vocab) or self.vocab[pos] != term:
+            return None
+        start, end = self.offsets[pos], self.offsets[pos + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            catalog_id=np.array(self.catalog_id.encode("utf-8")),
+            vocab=self.vocab, offsets=self.offsets, docs=self.docs,
+            tfs=self.tfs, doc_len=self.doc_len, chunk_ids=self.chunk_ids,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            return cls(
+                data["catalog_id"].item().decode("utf-8"),
+                data["vocab"], data["offsets"], data["docs"],
+                data["tfs"], data["doc_len"], data["chunk_ids"],
+            )
+
+class LexicalIndex:
+    def __init__(self, base_dir: str = "."):
+        self.folder = os.path.join(base_dir, LEXICAL_DIR)
+        self.segments = {}  # filename -> Segment
+        self._superseded = set()  # Old segment files still on disk, not loaded again
+        self.total_docs = 0
+        self.total_len = 0
+
+        self._lock = threading.Lock()
+        self._last_reload_check = 0.0
+        self.load()
+
+    def _register(self, name: str, segment: Segment) -> list:
+        """Adds a segment, dropping older segments of the same book. Returns the dropped names."""
+        older = [n for n, s in self.segments.items() if s.catalog_id == segment.catalog_id]
+        if any(n > name for n in older):
+            self._superseded.add(name)  # A newer version of this book is already loaded
+            return []
+        self._superseded.update(older)
+        for n in older:
+            old = self.segments.pop(n)
+            self.total_docs -= len(old.doc_len)
+            self.total_len -= int(old.doc_len.sum())
+        self.segments[name] = segment
+        self.total_docs += len(segment.doc_len)
+        self.total_len += int(segment.doc_len.sum())
+        return older
+
+    def add_documents(self, chunk_ids: list, texts: list, catalog_id: str):
+        """
+        Indexes one book's chunks as a new segment. If the book was indexed before,
+        the new segment replaces the old one, so pass all of the book's chunks.
+        """
+        if not texts:
+            return
+        segment = Segment.build(catalog_id, chunk_ids, texts)
+        name = f"{time.time_ns():020d}.npz"
+        atomic_write(os.path.join(self.folder, name), segment.to_bytes())
+        with self._lock:
+            replaced = self._register(name, segment)
+        for old in replaced:
+            try:
+                os.remove(os.path.join(self.folder, old))
+            except FileNotFoundError:
+                pass  # Another process got there first
+        print(f"🔤 Lexical index: +{len(texts)} chunks, {len(segment.vocab)} terms for book {catalog_id}")
+
+    @property
+    def version(self) -> str:
+        """Changes whenever a segment is added or replaced."""
+        self._maybe_reload()
+        return f"{len(self.segments)}:{self.total_docs}:{max(self.segments, default='')}"
+
+    def has_book(self, catalog_id: str) -> bool:
+        return any(s.catalog_id == catalog_id for s in self.segments.values())
+
+    def load(self):
+        """Loads any segment files not seen yet (other processes may have written them)."""
+        if not os.path.exists(self.folder):
+            return
+        for name in sorted(os.listdir(self.folder)):
+            if name.endswith(".npz") and not name.startswith(".") and name not in self.segments \
+                    and name not in self._superseded:
+                try:
+                    segment = Segment.load(os.path.join(self.folder, name))
+                except FileNotFoundError:
+                    continue  # Superseded and deleted since listdir
+                with self._lock:
+                    self._register(name, segment)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_reload_check >= RELOAD_CHECK_SECONDS:
+            self._last_reload_check = now
+            self.load()
+
+    def search(self, query: str, k: int = 5, catalog_ids: Optional[list] = None):
+        """Returns list of (chunk_id, bm25_score), best first."""
+        self._maybe_reload()
+        terms = list(dict.fromkeys(t.encode("utf-8") for t in tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            segments = list(self.segments.values())
+            total_docs, total_len = self.total_docs, self.total_len
+        if total_docs == 0:
+            return []
+        avg_len = total_len / total_docs
+
+        # Document frequency is global (all segments), so scores are comparable across books
+        df = Counter()
+        for segment in segments:
+            for term in terms:
+                hit = segment.postings(term)
+                if hit is not None:
+                    df[term] += len(hit[0])
+        idf = {t: np.log(1 + (total_docs - n + 0.5) / (n + 0.5)) for t, n in df.items()}
+
+        candidates = []
+        for segment in segments:
+            if catalog_ids and segment.catalog_id not in catalog_ids:
+                continue
+            scores = None
+            for term in idf:
+                hit = segment.postings(term)
+                if hit is None:
+                    continue
+                docs, tfs = hit
+                if scores is None:
+                    scores = np.zeros(len(segment.doc_len), dtype="float32")
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.doc_len[docs] / avg_len)
+                scores[docs] += idf[term] * tfs * (BM25_K1 + 1) / (tfs + norm)
+            if scores is None:
+                continue
+
+            # Best k of this segment, then merge across segments
+            top = np.flatnonzero(scores)
+            if len(top) > k:
+                top = top[np.argpartition(scores[top], -k)[-k:]]
+            for d in top:
+                candidates.append((segment.chunk_ids[d].decode("ascii"), float(scores[d])))
+
+        candidates.sort(key=lambda x: x[1], reverse=True)
+        return candidates[:k]
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """
+    Fuses several ranked lists of chunk_ids: score = sum of 1 / (k + rank).
+    Returns list of (chunk_id, fused_score), best first.
+    """
+    fused = Counter()
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            fused[chunk_id] += 1.0 / (k + rank + 1)
+    return fused.most_common()
+
+# Global instance
+lexical_index = LexicalIndex()
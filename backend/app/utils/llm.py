@@ -1,46 +1,37 @@
 from llama_cpp import Llama
 import os
 import re
+from app.utils.model_registry import model_registry, disk_size_mb
 
 # Your specific model path
 MODEL_PATH = "app/models/llm_weights/phimini.gguf"
 
-_model_instance = None
+def _load_llm():
+    if not os.path.exists(MODEL_PATH):
+        raise FileNotFoundError(f"Model not found at {MODEL_PATH}")
+        
+    print("🤖 Loading Phi-3 LLM...")
+    return Llama(
+        model_path=MODEL_PATH,
+        n_ctx=4096,
+        n_gpu_layers=-1, 
+        verbose=False
+    )
+
+model_registry.register(
+    "llm", _load_llm,
+    estimate_mb=lambda: disk_size_mb(MODEL_PATH) if os.path.exists(MODEL_PATH) else 0,
+)
 
 def get_model():
-    """Singleton: Loads the model only once."""
-    global _model_instance
-    if _model_instance is None:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model not found at {MODEL_PATH}")
-            
-        print("🤖 Loading Phi-3 LLM...")
-        _model_instance = Llama(
-            model_path=MODEL_PATH,
-            n_ctx=4096,
-            n_gpu_layers=-1, 
-            verbose=False
-        )
-    return _model_instance
+    """Loads the model on first use (the model registry may unload it when memory is needed)."""
+    return model_registry.get("llm")
 
 def unload_model():
-    """Removes Phi-3 LLM from GPU/RAM to free VRAM."""
-    global _model_instance
-    if _model_instance is not None:
-        print("🪓 Unloading Phi-3 LLM from memory...")
-        del _model_instance
-        _model_instance = None
-        
-        # PyTorch/CUDA cleanup
-        try:
-            import torch
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-        except ImportError:
-            pass # Ignore if torch isn't used
+    """Removes Phi-3 LLM from GPU/RAM to free VRAM (no-op while it is generating)."""
+    model_registry.unload("llm")
         
 def generate_narration(scene_content: str, characters: list) -> dict:
-    llm = get_model()
     char_str = ", ".join(characters) if characters else "Unknown characters"
     
     # Prompt
@@ -63,15 +54,16 @@ QUIZ:
 <|end|>
 <|assistant|>"""
 
-    # Run Inference
-    output = llm(
-        prompt, 
-        max_tokens=256, 
-        stop=["<|end|>"], 
-        temperature=0.7,
-        echo=False,
-        stream=False  # <--- FIX 1: Explicitly disable streaming
-    )
+    # Run Inference (the registry won't unload the model meanwhile)
+    with model_registry.use("llm") as llm:
+        output = llm(
+            prompt, 
+            max_tokens=256, 
+            stop=["<|end|>"], 
+            temperature=0.7,
+            echo=False,
+            stream=False  # <--- FIX 1: Explicitly disable streaming
+        )
     
     # FIX 2: Add type: ignore because Pylance thinks this might be a stream
     text = output["choices"][0]["text"].strip() # type: ignore
@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# One place that decides which models stay loaded. Every model (LLM, SD-Turbo,
+# Whisper, embeddings) is registered with a loader; get()/use() load it on demand and
+# the least recently used idle models are unloaded when the next one wouldn't fit the
+# RAM/VRAM budget. Models inside a use() block are never unloaded, so narration and
+# image requests can alternate without reloading multi-GB weights each time.
+
+# Budgets in MB. 0 = automatic: MODEL_RAM_AUTO_FRACTION of physical RAM,
+# MODEL_VRAM_AUTO_FRACTION of the GPU's memory.
+MODEL_RAM_BUDGET_MB = float(os.getenv("MODEL_RAM_BUDGET_MB", "0"))
+MODEL_VRAM_BUDGET_MB = float(os.getenv("MODEL_VRAM_BUDGET_MB", "0"))
+MODEL_RAM_AUTO_FRACTION = float(os.getenv("MODEL_RAM_AUTO_FRACTION", "0.6"))
+MODEL_VRAM_AUTO_FRACTION = float(os.getenv("MODEL_VRAM_AUTO_FRACTION", "0.9"))
+
+MB = 1024 * 1024
+
+try:
+    import psutil  # type: ignore
+except ImportError:
+    psutil = None
+
+def _rss_bytes() -> Optional[int]:
+    """Resident memory of this process (psutil, else /proc), None if unknown."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _cuda():
+    """torch.cuda if torch is installed and a GPU is present, else None."""
+    try:
+        import torch
+        return torch.cuda if torch.cuda.is_available() else None
+    except ImportError:
+        return None
+
+def _vram_used_bytes() -> Optional[int]:
+    """GPU memory in use by anyone (also sees llama.cpp, which torch doesn't allocate)."""
+    cuda = _cuda()
+    if cuda is None:
+        return None
+    free, total = cuda.mem_get_info()
+    return total - free
+
+def _physical_ram_bytes() -> Optional[int]:
+    if psutil is not None:
+        return psutil.virtual_memory().total
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, AttributeError, OSError):
+        return None
+
+def disk_size_mb(path: str) -> float:
+    """Size of a weights file or folder: the footprint estimate before the first load."""
+    if os.path.isfile(path):
+        return os.path.getsize(path) / MB
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / MB
+
+class _Entry:
+    def __init__(self, name: str, loader: Callable, unloader: Optional[Callable], estimate_mb, gpu: bool):
+        self.name = name
+        self.loader = loader
+        self.unloader = unloader
+        self.estimate_mb = estimate_mb  # number or callable, used until measured
+        self.gpu = gpu                  # Lands in VRAM when a GPU is present
+        self.model = None
+        self.refs = 0
+        self.last_used = 0.0
+        self.ram_mb = None              # Measured on load
+        self.vram_mb = None
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def estimate(self) -> float:
+        value = self.estimate_mb() if callable(self.estimate_mb) else self.estimate_mb
+        return float(value or 0)
+
+    def footprint(self, on_gpu: bool):
+        """(RAM MB, VRAM MB) it takes or will take when loaded."""
+        if self.ram_mb is not None:
+            return self.ram_mb, self.vram_mb or 0.0
+        if self.gpu and on_gpu:
+            return 0.0, self.estimate()
+        return self.estimate(), 0.0
+
+class ModelRegistry:
+    def __init__(self, ram_budget_mb: float = 0, vram_budget_mb: float = 0):
+        self._entries = {}
+        self._lock = threading.RLock()
+        # Loads run one at a time: each one's budget check sees the previous one's
+        # footprint, and the memory measured around loader() is its own
+        self._load_lock = threading.Lock()
+        self.ram_budget_mb = ram_budget_mb or MODEL_RAM_BUDGET_MB or self._auto_ram_mb()
+        self.vram_budget_mb = vram_budget_mb or MODEL_VRAM_BUDGET_MB or self._auto_vram_mb()
+
+    @staticmethod
+    def _auto_ram_mb() -> float:
+        total = _physical_ram_bytes()
+        return total * MODEL_RAM_AUTO_FRACTION / MB if total else float("inf")
+
+    @staticmethod
+    def _auto_vram_mb() -> float:
+        cuda = _cuda()
+        if cuda is None:
+            return 0.0
+        _, total = cuda.mem_get_info()
+        return total * MODEL_VRAM_AUTO_FRACTION / MB
+
+    def register(self, name: str, loader: Callable, unloader: Optional[Callable] = None,
+                 estimate_mb=0, gpu: bool = True):
+        """
+        loader() returns the model; unloader(model) frees anything del doesn't (process
+        pools...). estimate_mb (number or callable) is used until the real footprint
+        is measured on the first load.
+        """
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(name, loader, unloader, estimate_mb, gpu)
+
+    # --- ACCESS ---
+    @contextmanager
+    def use(self, name: str):
+        """The loaded model, which can't be unloaded until the block ends."""
+        model = self._acquire(name)
+        try:
+            yield model
+        finally:
+            with self._lock:
+                entry = self._entries[name]
+                entry.refs -= 1
+                entry.last_used = time.monotonic()
+
+    def get(self, name: str):
+        """The loaded model, without holding it (fine for short calls)."""
+        with self.use(name) as model:
+            return model
+
+    def _acquire(self, name: str):
+        entry = self._entries[name]
+        with self._lock:
+            entry.refs += 1
+            entry.last_used = time.monotonic()
+            if entry.model is not None:
+                return entry.model
+        try:
+            with self._load_lock:
+                if entry.model is None:
+                    self._load(entry)
+            return entry.model
+        except BaseException:
+            with self._lock:
+                entry.refs -= 1
+            raise
+
+    def _load(self, entry: _Entry):
+        on_gpu = _cuda() is not None
+        ram_mb, vram_mb = entry.footprint(on_gpu)
+        with self._lock:
+            self._make_room(entry, ram_mb, vram_mb)
+
+        rss_before, vram_before = _rss_bytes(), _vram_used_bytes()
+        start = time.perf_counter()
+        model = entry.loader()
+        seconds = time.perf_counter() - start
+        rss_after, vram_after = _rss_bytes(), _vram_used_bytes()
+
+        with self._lock:
+            entry.model = model
+            entry.loads += 1
+            entry.load_seconds += seconds
+            # Measured footprint replaces the estimate. The largest measurement is
+            # kept: a reload can reuse memory the allocator never gave back, and
+            # then looks almost free
+            if rss_before is not None and rss_after is not None:
+                entry.ram_mb = max(entry.ram_mb or 0.0, (rss_after - rss_before) / MB)
+            if vram_before is not None and vram_after is not None:
+                entry.vram_mb = max(entry.vram_mb or 0.0, (vram_after - vram_before) / MB)
+            # The estimate may have been low: trim again with the real size
+            measured = entry.footprint(on_gpu)
+            self._make_room(entry, *measured)
+        print(f"📦 Loaded {entry.name} in {seconds:.1f}s "
+              f"(RAM {measured[0]:.0f} MB, VRAM {measured[1]:.0f} MB)")
+
+    def _loaded(self, exclude: _Entry) -> list:
+        return [e for e in self._entries.values() if e.model is not None and e is not exclude]
+
+    def _used(self, exclude: _Entry, on_gpu: bool):
+        loaded = [e.footprint(on_gpu) for e in self._loaded(exclude)]
+        return sum(r for r, _ in loaded), sum(v for _, v in loaded)
+
+    def _make_room(self, entry: _Entry, ram_mb: float, vram_mb: float):
+        """Unloads idle models, least recently used first, until `entry` fits."""
+        on_gpu = _cuda() is not None
+        while True:
+            used_ram, used_vram = self._used(entry, on_gpu)
+            fits_ram = used_ram + ram_mb <= self.ram_budget_mb
+            fits_vram = not on_gpu or used_vram + vram_mb <= self.vram_budget_mb
+            if fits_ram and fits_vram:
+                return
+            idle = [e for e in self._loaded(entry) if e.refs == 0]
+            if not idle:
+                print(f"⚠️ Loading {entry.name} over the model budget: everything else is in use.")
+                return
+            self._unload(min(idle, key=lambda e: e.last_used), reason="budget")
+
+    # --- UNLOAD ---
+    def _unload(self, entry: _Entry, reason: str):
+        model, entry.model = entry.model, None
+        entry.evictions += 1
+        print(f"🪓 Unloading {entry.name} ({reason})...")
+        if entry.unloader is not None:
+            try:
+                entry.unloader(model)
+            except Exception as e:
+                print(f"⚠️ Unloading {entry.name} failed: {e}")
+        del model
+        cuda = _cuda()
+        if cuda is not None:
+            cuda.empty_cache()
+
+    def unload(self, name: str) -> bool:
+        """Unloads a model now unless it is in use. Returns whether it was unloaded."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.model is None or entry.refs > 0:
+                return False
+            self._unload(entry, reason="requested")
+            return True
+
+    def is_loaded(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry.model is not None
+
+    def stats(self) -> dict:
+        on_gpu = _cuda() is not None
+        with self._lock:
+            used_ram, used_vram = self._used(None, on_gpu) # type: ignore
+            return {
+                "ram_budget_mb": round(self.ram_budget_mb, 1),
+                "vram_budget_mb": round(self.vram_budget_mb, 1),
+                "ram_used_mb": round(used_ram, 1),
+                "vram_used_mb": round(used_vram, 1),
+                "models": {
+                    e.name: {
+                        "loaded": e.model is not None,
+                        "in_use": e.refs,
+                        "ram_mb": round(e.footprint(on_gpu)[0], 1),
+                        "vram_mb": round(e.footprint(on_gpu)[1], 1),
+                        "measured": e.ram_mb is not None,
+                        "loads": e.loads,
+                        "evictions": e.evictions,
+                        "avg_load_seconds": round(e.load_seconds / e.loads, 2) if e.loads else 0.0,
+                    }
+                    for e in self._entries.values()
+                },
+            }
+
+# Global instance
+model_registry = ModelRegistry()
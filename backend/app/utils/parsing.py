@@ -1,5 +1,20 @@
 import fitz  # PyMuPDF
 import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from starlette.concurrency import run_in_threadpool
+from typing import Iterator, Optional
+
+# --- STREAMING EXTRACTION CONFIG ---
+# Processes used to extract pages (0 = one per CPU, 1 = extract in this process)
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", "0"))
+# Smaller books are extracted in-process (starting the pool costs more than it saves)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+# Pages handed to a worker per task (each task re-opens the file, so not too small)
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+# Upload bytes copied to disk per read
+SPOOL_CHUNK_BYTES = 1024 * 1024
 
 def extract_text_from_pdf(file_bytes: bytes) -> dict:
     """
@@ -8,13 +23,118 @@ def extract_text_from_pdf(file_bytes: bytes) -> dict:
     """
     doc = fitz.open(stream=file_bytes, filetype="pdf")
     full_text = []
-    
+
     for page in doc:
         # FIX: Pylance gets confused by fitz types, so we ignore strict checking here
         text = page.get_text() # type: ignore
         full_text.append(text)
-        
+
     return {
         "full_text": "\n".join(full_text),
         "page_count": len(doc)
-    }
\ No newline at end of file
+    }
+
+def save_upload(upload, file_path: str) -> int:
+    """
+    Copies a FastAPI UploadFile to disk SPOOL_CHUNK_BYTES at a time
+    (never holds the whole PDF in memory). Returns the file size in bytes.
+    Blocking: call it from a plain `def` route or through spool_upload.
+    """
+    size = 0
+    upload.file.seek(0)
+    with open(file_path, "wb") as out:
+        while True:
+            chunk = upload.file.read(SPOOL_CHUNK_BYTES)
+            if not chunk:
+                break
+            out.write(chunk)
+            size += len(chunk)
+    return size
+
+async def spool_upload(upload, file_path: str) -> int:
+    """save_upload for async routes: the copy runs in the threadpool, off the event loop."""
+    return await run_in_threadpool(save_upload, upload, file_path)
+
+def pdf_page_count(file_path: str) -> int:
+    doc = fitz.open(file_path)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> list:
+    """Worker task: text of pages [start, stop). Each process opens its own document."""
+    doc = fitz.open(file_path)
+    try:
+        return [(i + 1, doc[i].get_text()) for i in range(start, stop)] # type: ignore
+    finally:
+        doc.close()
+
+def iter_pdf_pages(file_path: str, max_pages: Optional[int] = None, workers: int = -1) -> Iterator[dict]:
+    """
+    Streams {"page_number": int, "text": str} records, in page order, from a PDF on disk.
+    Page ranges are extracted in parallel in a process pool (PyMuPDF holds the GIL, so
+    threads would not help). Only a few ranges are in flight at once, so memory stays
+    bounded however long the book is, and callers can start chunking/embedding as soon
+    as the first pages arrive.
+    """
+    page_count = pdf_page_count(file_path)
+    if max_pages is not None:
+        page_count = min(page_count, max_pages)
+
+    ranges = [
+        (start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    ]
+    workers = PDF_PARSE_WORKERS if workers < 0 else workers
+    workers = min(workers or (os.cpu_count() or 1), len(ranges))
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        workers = 1
+
+    if workers <= 1:
+        for start, stop in ranges:
+            for page_number, text in _extract_page_range(file_path, start, stop):
+                yield {"page_number": page_number, "text": text}
+        return
+
+    max_in_flight = workers * 2
+    # "spawn": callers are often threaded (ingest workers) and have torch/FAISS loaded,
+    # which is not fork-safe. Children only import this module.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = []
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            # Keep the pool busy without queueing the whole book
+            while next_range < len(ranges) and len(pending) < max_in_flight:
+                start, stop = ranges[next_range]
+                pending.append(pool.submit(_extract_page_range, file_path, start, stop))
+                next_range += 1
+
+            for page_number, text in pending.pop(0).result():
+                yield {"page_number": page_number, "text": text}
+
+def extract_text_from_pdf_file(file_path: str, max_pages: Optional[int] = None) -> dict:
+    """
+    Same result as extract_text_from_pdf, but reads from disk with the streaming extractor.
+    Returns: {"full_text": str, "page_count": int}
+    """
+    pages = [page["text"] for page in iter_pdf_pages(file_path, max_pages=max_pages)]
+    return {
+        "full_text": "\n".join(pages),
+        "page_count": len(pages)
+    }
+
+def sample_pdf_text(file_path: str, max_chars: int) -> str:
+    """
+    The first max_chars characters of the book (same text as the start of
+    extract_text_from_pdf_file's full_text), reading only as many pages as needed.
+    """
+    pages = []
+    size = 0
+    for page in iter_pdf_pages(file_path, workers=1):
+        pages.append(page["text"])
+        size += len(page["text"]) + 1
+        if size >= max_chars:
+            break
+    return "\n".join(pages)[:max_chars]
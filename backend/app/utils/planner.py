@@ -1,6 +1,10 @@
+import os
 import requests
 from app.schemas import LessonPlan, Segment, VisualPrompt
 
+# Ollama model; recorded in the scene asset manifest so plans are redone when it changes
+PLANNER_MODEL = os.getenv("PLANNER_MODEL", "mistral")
+
 # --- OPTIMIZED PROMPT (No Quiz) ---
 PROMPT_TEMPLATE = """
 You are an expert educational content creator.
@@ -37,7 +41,7 @@ def generate_plan(scene_title: str, characters: list, content_summary: str) -> L
     # 2. Call Ollama
     try:
         response = requests.post("http://localhost:11434/api/generate", json={
-            "model": "mistral", # Ensure this matches your installed model
+            "model": PLANNER_MODEL, # Ensure this matches your installed model
             "prompt": prompt,
             "stream": False,
             "options": {
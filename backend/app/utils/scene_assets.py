@@ -0,0 +1,284 @@
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal
+from app.models.scene import Scene, SceneAsset
+from app.schemas import LessonPlan
+from app.utils.asset_cache import audio_cache, image_cache
+from app.utils.planner import generate_plan, PLANNER_MODEL
+from app.utils.tts_piper import generate_audio, narration_key
+from app.utils.tts_pool import voice_path
+from app.utils.visual_engine import build_visual_prompt, draft_key, MODEL_PATH, NUM_ANIMATION_FRAMES
+from app.utils.visual_scheduler import get_visual_scheduler, VisualQueueFullError
+
+# Per-scene asset manifest (SceneAsset rows) and the pre-render worker.
+# The manifest records a scene's lesson plan, and /plan/status derives the cache keys
+# of its narration and frames from it, so whatever made them (pre-render, /audio/speak,
+# /visuals/generate) the scene is ready once they are all on disk. While a learner
+# is on scene N, scenes N+1..N+PRERENDER_AHEAD are rendered in the background with the
+# same text, voice and prompts the player uses, so moving on is a cache hit.
+
+# --- PRE-RENDER CONFIG ---
+PRERENDER_AHEAD = int(os.getenv("PRERENDER_AHEAD", "3"))
+PRERENDER_WORKERS = int(os.getenv("PRERENDER_WORKERS", "1"))
+# Voice and image style the player requests (must match for the cache keys to match)
+PRERENDER_LANG = os.getenv("PRERENDER_LANG", "en")
+PRERENDER_STYLE = os.getenv("PRERENDER_STYLE", "cinematic")
+# A render not finished after this long is taken over by another worker
+PRERENDER_LEASE_SECONDS = float(os.getenv("PRERENDER_LEASE_SECONDS", "600"))
+
+def model_versions(lang: str = "") -> dict:
+    """Models the assets are made with (the voice of `lang`, PRERENDER_LANG by default)."""
+    return {
+        "planner": PLANNER_MODEL,
+        "voice": os.path.basename(voice_path(lang or PRERENDER_LANG)),
+        "image": os.path.basename(MODEL_PATH),
+        "frames": NUM_ANIMATION_FRAMES,
+    }
+
+def _manifest(db: Session, scene: Scene) -> SceneAsset:
+    asset = db.get(SceneAsset, scene.id)
+    if asset is None:
+        asset = SceneAsset(scene_id=scene.id, catalog_id=scene.catalog_id, status="pending",
+                           audio=[], images=[], models={})
+        db.add(asset)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker created it first
+            db.rollback()
+            asset = db.get(SceneAsset, scene.id)
+    return asset # type: ignore
+
+# --- PLAN ---
+def get_or_create_plan(db: Session, scene: Scene) -> LessonPlan:
+    """
+    The scene's lesson plan from its manifest, or a new one (recorded there). Reusing
+    it keeps the narration text, and so the audio/image cache keys, the same.
+    """
+    asset = _manifest(db, scene)
+    if asset.plan and (asset.models or {}).get("planner") == PLANNER_MODEL:
+        return LessonPlan(**asset.plan) # type: ignore
+
+    chars = scene.characters_present if scene.characters_present else [] # type: ignore
+    plan = generate_plan(
+        scene_title=str(scene.title),
+        characters=chars, # type: ignore
+        content_summary=str(scene.content_summary)
+    )
+    plan.scene_id = str(scene.id)
+    if plan.segments:
+        # Failed plans (Ollama down) are not recorded, so the next call tries again
+        asset.plan = plan.model_dump() # type: ignore
+        asset.models = {**(asset.models or {}), "planner": PLANNER_MODEL} # type: ignore
+        asset.updated_at = datetime.utcnow() # type: ignore
+        db.commit()
+    return plan
+
+# --- READINESS ---
+def segment_keys(segments: list, lang: str) -> tuple:
+    """
+    Audio and image cache keys of each plan segment, as the player requests them
+    (voice of `lang`, PRERENDER_STYLE frames of the segment's background).
+    """
+    voice = voice_path(lang)
+    audio = [narration_key(seg["text"], lang, voice) for seg in segments]
+    images = [draft_key(build_visual_prompt(seg["visual"]["background"], PRERENDER_STYLE))
+              for seg in segments]
+    return audio, images
+
+def scene_status(db: Session, scene_id: str, lang: str = "") -> dict:
+    """
+    Whether the scene's plan, narration (in `lang`, PRERENDER_LANG by default) and
+    frames are all available with the current models, plus their URLs (those of the
+    first segment at the top level, as the player uses them).
+    """
+    lang = lang or PRERENDER_LANG
+    asset = db.get(SceneAsset, scene_id)
+    if asset is None or not asset.plan:
+        return {"ready": False, "status": "missing" if asset is None else str(asset.status)}
+
+    segments = asset.plan.get("segments", []) # type: ignore
+    audio_keys, image_keys = segment_keys(segments, lang)
+    audio_urls, image_urls, missing = [], [], []
+    for key in audio_keys:
+        cached = audio_cache.peek(key)
+        if cached:
+            audio_urls.append(f"/api/audio/file/{cached[0]}")
+        else:
+            missing.append(f"audio:{key[:12]}")
+    for key in image_keys:
+        cached = image_cache.peek(key)
+        if cached:
+            image_urls.append([f"/static/images/{f}" for f in cached])
+        else:
+            missing.append(f"images:{key[:12]}")
+
+    # The keys include the voice and image model, so only the plan itself can be stale
+    stale = (asset.models or {}).get("planner") != PLANNER_MODEL # type: ignore
+    ready = bool(segments) and not missing and not stale
+    return {
+        "ready": ready,
+        "status": "ready" if ready else "stale" if stale else str(asset.status),
+        "missing": missing,
+        "error": asset.error,
+        "plan": asset.plan,
+        "text": segments[0]["text"] if segments else "",
+        "audio_url": audio_urls[0] if audio_urls else None,
+        "image_urls": image_urls[0] if image_urls else [],
+        "models": {**model_versions(lang), "planner": (asset.models or {}).get("planner")}, # type: ignore
+    }
+
+# --- RENDERING ---
+def _claim(db: Session, asset: SceneAsset) -> bool:
+    """Marks the scene as rendering unless another worker holds a live lease on it."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=PRERENDER_LEASE_SECONDS)
+    claimed = (
+        db.query(SceneAsset)
+        .filter(
+            SceneAsset.scene_id == asset.scene_id,
+            SceneAsset.updated_at == asset.updated_at,
+            or_(SceneAsset.status != "rendering",
+                and_(SceneAsset.status == "rendering", SceneAsset.locked_at < stale)),
+        )
+        .update({
+            SceneAsset.status: "rendering",
+            SceneAsset.locked_at: now,
+            SceneAsset.updated_at: now,
+        }, synchronize_session=False)
+    )
+    db.commit()
+    return bool(claimed)
+
+def render_scene(scene_id: str) -> bool:
+    """
+    Plan, narration and frames for one scene, recorded in its manifest.
+    Returns False if it was already ready or another worker has it.
+    """
+    db = SessionLocal()
+    try:
+        scene = db.get(Scene, scene_id)
+        if scene is None or scene_status(db, scene_id)["ready"]:
+            return False
+        asset = _manifest(db, scene)
+        if not _claim(db, asset):
+            return False
+        db.refresh(asset)
+
+        print(f"🎬 Pre-rendering scene {scene.order_index}: {scene.title}")
+        try:
+            plan = get_or_create_plan(db, scene)
+            if not plan.segments:
+                raise RuntimeError("The planner returned no segments")
+
+            # Frames are queued first (prefetch priority), narration runs meanwhile
+            scheduler = get_visual_scheduler()
+            prompts = [build_visual_prompt(seg.visual.background, PRERENDER_STYLE) for seg in plan.segments]
+            jobs = [scheduler.submit(prompt, "prefetch") for prompt in prompts]
+            audio_keys, image_keys = segment_keys(plan.model_dump()["segments"], PRERENDER_LANG)
+
+            audio = []
+            for seg, key in zip(plan.segments, audio_keys):
+                filename = generate_audio(seg.text, PRERENDER_LANG)
+                if filename == "error.wav":
+                    raise RuntimeError("Narration failed")
+                audio.append({"key": key, "filename": filename})
+
+            images = [
+                {"key": key, "filenames": job.future.result()}
+                for key, job in zip(image_keys, jobs)
+            ]
+
+            asset.audio, asset.images = audio, images # type: ignore
+            asset.models = model_versions() # type: ignore
+            asset.status, asset.error = "ready", None # type: ignore
+            print(f"✅ Scene {scene.order_index} pre-rendered")
+        except VisualQueueFullError:
+            # Busy with learners' own requests: leave it for later
+            asset.status, asset.error = "pending", None # type: ignore
+        except Exception as e:
+            print(f"❌ Pre-render of scene {scene_id} failed: {e}")
+            asset.status, asset.error = "failed", str(e) # type: ignore
+        asset.locked_at = None # type: ignore
+        asset.updated_at = datetime.utcnow() # type: ignore
+        db.commit()
+        return asset.status == "ready" # type: ignore
+    finally:
+        db.close()
+
+def next_scene_ids(db: Session, scene_id: str, ahead: int = 0) -> list:
+    """Ids of the `ahead` scenes after this one in the same book."""
+    scene = db.get(Scene, scene_id)
+    if scene is None:
+        return []
+    rows = (
+        db.query(Scene.id)
+        .filter(Scene.catalog_id == scene.catalog_id, Scene.order_index > scene.order_index)
+        .order_by(Scene.order_index)
+        .limit(ahead or PRERENDER_AHEAD)
+        .all()
+    )
+    return [str(row[0]) for row in rows]
+
+class ScenePrerenderer:
+    """Background threads rendering queued scenes in order, each scene queued once."""
+
+    def __init__(self, workers: int = 0):
+        self.jobs = queue.Queue()
+        self.queued = set()
+        self.rendered = 0
+        self._lock = threading.Lock()
+        self.workers = [
+            threading.Thread(target=self._run, name=f"prerender-{n}", daemon=True)
+            for n in range(workers or PRERENDER_WORKERS)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def enqueue(self, scene_ids: list) -> list:
+        """Queues the scenes not queued yet; returns those."""
+        added = []
+        with self._lock:
+            for scene_id in scene_ids:
+                if scene_id not in self.queued:
+                    self.queued.add(scene_id)
+                    self.jobs.put(scene_id)
+                    added.append(scene_id)
+        return added
+
+    def _run(self):
+        while True:
+            scene_id = self.jobs.get()
+            try:
+                if render_scene(scene_id):
+                    self.rendered += 1
+            except Exception as e:
+                print(f"❌ Pre-render worker error: {e}")
+            finally:
+                with self._lock:
+                    self.queued.discard(scene_id)
+
+    def stats(self) -> dict:
+        return {"workers": len(self.workers), "queued": len(self.queued), "rendered": self.rendered}
+
+_prerenderer = None
+_prerenderer_lock = threading.Lock()
+
+def get_prerenderer() -> ScenePrerenderer:
+    """The process-wide pre-render worker, started on first use."""
+    global _prerenderer
+    with _prerenderer_lock:
+        if _prerenderer is None:
+            _prerenderer = ScenePrerenderer()
+            print(f"🎬 Started scene pre-renderer: {len(_prerenderer.workers)} workers, {PRERENDER_AHEAD} scenes ahead")
+    return _prerenderer
+
+def prerender_after(db: Session, scene_id: str, ahead: int = 0) -> list:
+    """Queues the scenes after `scene_id` that aren't ready yet; returns their ids."""
+    pending = [sid for sid in next_scene_ids(db, scene_id, ahead) if not scene_status(db, sid)["ready"]]
+    return get_prerenderer().enqueue(pending)
@@ -1,64 +1,201 @@
 import spacy
 import re
+import os
+import multiprocessing
+from bisect import bisect_right
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from app.utils.aho_corasick import Automaton
+
+# --- NER THROUGHPUT CONFIG ---
+# Paragraphs handed to spaCy per batch
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "256"))
+# NER worker processes (each loads its own copy of the model, ~1s start-up)
+NER_PROCESSES = int(os.getenv("NER_PROCESSES", str(max(1, (os.cpu_count() or 1) // 2))))
+# Below this many paragraphs a single process is faster than starting the pool
+NER_PARALLEL_MIN_PARAGRAPHS = int(os.getenv("NER_PARALLEL_MIN_PARAGRAPHS", "2000"))
+# Longer paragraphs (e.g. PDFs without blank lines) are cut into pieces of this size for NER
+NER_MAX_CHARS = int(os.getenv("NER_MAX_CHARS", "10000"))
 
 # Load spaCy
+# Only the entity recognizer is used; the parser, tagger and lemmatizer would just cost time
 try:
-    nlp = spacy.load("en_core_web_sm")
+    nlp = spacy.load("en_core_web_sm", disable=["parser", "tagger", "attribute_ruler", "lemmatizer"])
 except:
-    nlp = spacy.blank("en") 
+    nlp = spacy.blank("en")
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+DIALOGUE_PATTERN = re.compile(r'“([^”]+)”|"([^"]+)"')
+
+def split_paragraphs(full_text: str) -> list:
+    return PARAGRAPH_BREAK.split(full_text)
+
+def _ner_pieces(paragraphs):
+    """Yields paragraph text in pieces of at most NER_MAX_CHARS (cut at whitespace)."""
+    for paragraph in paragraphs:
+        while len(paragraph) > NER_MAX_CHARS:
+            cut = paragraph.rfind(" ", 0, NER_MAX_CHARS)
+            cut = cut if cut > 0 else NER_MAX_CHARS
+            yield paragraph[:cut]
+            paragraph = paragraph[cut:]
+        if paragraph.strip():
+            yield paragraph
 
-def extract_scenes(full_text: str):
+def _count_batch(texts: list) -> Counter:
+    """Worker task: PERSON counts for one batch (only the counts travel back, not Docs)."""
+    counts = Counter()
+    for doc in nlp.pipe(texts, batch_size=len(texts) or 1):
+        counts.update(ent.text for ent in doc.ents if ent.label_ == "PERSON")
+    return counts
+
+def _batches(pieces, batch_size: int):
+    batch = []
+    for piece in pieces:
+        batch.append(piece)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def count_people(paragraphs: list, batch_size: int = 0, n_process: int = 0) -> Counter:
     """
-    Main pipeline to convert text into Scenes, Characters, and Dialogue.
-    High-Granularity Version: Splits by paragraphs/double-newlines.
+    Counts PERSON mentions over the whole book. Paragraphs are streamed through
+    nlp.pipe in batches, so only one batch of Docs per process is alive at a time.
+    Big books are spread over NER_PROCESSES worker processes.
     """
-    # Limit text size for MVP speed (increase this if you want more of the book processed)
-    # 300,000 chars is roughly 100 pages. For the full 500 pages, you might need 1,000,000+
-    # taking longer to process.
-    doc = nlp(full_text[:300000]) 
-
-    # --- 1. Entity Extraction ---
-    people = [ent.text for ent in doc.ents if ent.label_ == "PERSON"]
-    character_counts = Counter(people)
-    top_characters = [name for name, count in character_counts.most_common(20)]
+    batch_size = batch_size or NER_BATCH_SIZE
+    n_process = n_process or NER_PROCESSES
+    if len(paragraphs) < NER_PARALLEL_MIN_PARAGRAPHS:
+        n_process = 1
+
+    counts = Counter()
+    if n_process <= 1:
+        for doc in nlp.pipe(_ner_pieces(paragraphs), batch_size=batch_size):
+            counts.update(ent.text for ent in doc.ents if ent.label_ == "PERSON")
+        return counts
+
+    # Our own pool rather than nlp.pipe(n_process=...): spaCy would ship every Doc back
+    # to this process, which costs more than the NER itself for short paragraphs.
+    # "spawn" because ingest workers are threaded and have torch/FAISS loaded.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=n_process, mp_context=context) as pool:
+        pending = []
+        for batch in _batches(_ner_pieces(paragraphs), batch_size):
+            pending.append(pool.submit(_count_batch, batch))
+            # Bounded: at most two batches per process waiting
+            while len(pending) >= n_process * 2:
+                counts.update(pending.pop(0).result())
+        for future in pending:
+            counts.update(future.result())
+    return counts
+
+def paragraph_spans(full_text: str) -> list:
+    """(start, end) offsets of every paragraph, i.e. of split_paragraphs(full_text)."""
+    spans = []
+    pos = 0
+    for m in PARAGRAPH_BREAK.finditer(full_text):
+        spans.append((pos, m.start()))
+        pos = m.end()
+    spans.append((pos, len(full_text)))
+    return spans
+
+def _is_word(text: str, start: int, end: int) -> bool:
+    """
+    True unless the match is glued to letters/digits: "Ann" is not found in "Anna" or
+    "Anna's", while "Pierre's" (possessive) and "Pierre," count as "Pierre".
+    """
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
 
-    # --- 2. Dialogue Detection ---
-    dialogue_pattern = re.compile(r'“([^”]+)”|"([^"]+)"')
-    all_quotes = dialogue_pattern.findall(full_text)
-    clean_quotes = [q[0] or q[1] for q in all_quotes if q[0] or q[1]]
+def find_aliases(top_characters: list, character_counts: Counter, known_aliases: Optional[dict] = None) -> dict:
+    """
+    Aliases per character: the ones stored before (Character.aliases) plus single words
+    of the name that NER also tagged as a PERSON on their own ("Pierre" for
+    "Pierre Bezukhov"), when exactly one top character claims that word.
+    """
+    known_aliases = known_aliases or {}
+    claims = {}
+    for name in top_characters:
+        for part in name.split():
+            if part != name and part[:1].isupper() and character_counts.get(part):
+                claims.setdefault(part, set()).add(name)
+
+    aliases = {name: list(dict.fromkeys(known_aliases.get(name) or [])) for name in top_characters}
+    for part, names in claims.items():
+        if len(names) == 1 and part not in aliases:
+            owner = next(iter(names))
+            if part not in aliases[owner]:
+                aliases[owner].append(part)
+    return aliases
+
+def build_scenes(full_text: str, top_characters: list, aliases: dict) -> list:
+    """
+    One scene per paragraph (>= 50 chars) with the characters and quotes in it.
+    Names and aliases match whole words only (see _is_word). A quote that runs over a
+    paragraph break belongs to the paragraph where it opens.
+    Names/aliases (one Aho-Corasick pass) and quotes (one regex pass) are found once over
+    the whole book and dropped into paragraphs by binary search on the start offsets,
+    so the cost is linear in the book length instead of paragraphs x quotes x length.
+    """
+    spans = paragraph_spans(full_text)
+    starts = [start for start, _ in spans]
+
+    def paragraph_of(start: int, end: int) -> int:
+        index = bisect_right(starts, start) - 1
+        return index if end <= spans[index][1] else -1
+
+    # --- Who is in each paragraph ---
+    patterns = {}
+    for name in top_characters:
+        for pattern in [name] + (aliases.get(name) or []):
+            patterns.setdefault(pattern, name)
+    names_in = {}
+    for start, end, name in Automaton(patterns).matches(full_text):
+        if _is_word(full_text, start, end):
+            names_in.setdefault(paragraph_of(start, end), set()).add(name)
 
-    # --- 3. Scene Boundary Detection (High Granularity) ---
-    # Split by double newlines (paragraphs)
-    raw_scenes = re.split(r'\n\s*\n', full_text)
-    
+    # --- Dialogue in each paragraph ---
+    quotes_in = {}
+    for m in DIALOGUE_PATTERN.finditer(full_text):
+        # Multi-paragraph speech: kept whole (line breaks collapsed) in its first paragraph
+        quotes_in.setdefault(bisect_right(starts, m.start()) - 1, []).append(
+            {"text": " ".join((m.group(1) or m.group(2)).split()), "speaker": "Unknown"}
+        )
+
+    # --- Scene Boundary Detection (High Granularity) ---
     structured_scenes = []
     current_index = 0
-    
-    for segment in raw_scenes:
+    for i, (start, end) in enumerate(spans):
         # Skip only very short noise/headers (less than 50 chars)
-        if len(segment) < 50: 
+        if end - start < 50:
             continue
-        
-        # Check who is in this segment
-        chars_in_scene = [name for name in top_characters if name in segment]
-        
-        # Check for dialogue
-        scene_quotes = []
-        for quote in clean_quotes:
-            if quote in segment:
-                scene_quotes.append({"text": quote, "speaker": "Unknown"})
 
+        present = names_in.get(i, set())
         structured_scenes.append({
             "index": current_index,
             "title": f"Scene {current_index + 1}",
-            "content": segment[:500] + "...", # Summary for DB (first 500 chars)
-            "characters": list(set(chars_in_scene)),
-            "dialogues": scene_quotes
+            "content": full_text[start:min(end, start + 500)] + "...", # Summary for DB (first 500 chars)
+            "characters": [name for name in top_characters if name in present],
+            "dialogues": quotes_in.get(i, [])
         })
         current_index += 1
+    return structured_scenes
+
+def extract_scenes(full_text: str, known_aliases: Optional[dict] = None):
+    """
+    Main pipeline to convert text into Scenes, Characters, and Dialogue.
+    High-Granularity Version: Splits by paragraphs/double-newlines.
+    known_aliases: {name: [alias, ...]} already stored for the book's characters.
+    """
+    # --- 1. Entity Extraction (whole book, streamed) ---
+    character_counts = count_people(split_paragraphs(full_text))
+    top_characters = [name for name, count in character_counts.most_common(20)]
+    aliases = find_aliases(top_characters, character_counts, known_aliases)
 
+    # --- 2. Scenes with their characters + dialogue ---
     return {
         "characters": top_characters,
-        "scenes": structured_scenes
-    }
\ No newline at end of file
+        "aliases": aliases,
+        "scenes": build_scenes(full_text, top_characters, aliases)
+    }
@@ -0,0 +1,88 @@
+import json
+import os
+import struct
+import zlib
+import numpy as np
+from app.utils.fileio import atomic_write
+
+# Write-ahead log for the vector store.
+# Every add_vectors() call appends ONE segment (its new vectors + metadata) instead of
+# rewriting the whole index. Startup loads the last snapshot and replays the log on top.
+#
+# Segment layout:
+#   header  = MAGIC, start_id (int64), n (uint32), dim (uint32), meta_len (uint32)
+#   body    = n*dim float32 vectors, then meta_len bytes of JSON ({"ids": [...], ...})
+#   trailer = crc32(header + body) (uint32)
+
+MAGIC = b"VSEG"
+HEADER = struct.Struct("<4sqIII")
+TRAILER = struct.Struct("<I")
+
+def encode_segment(start_id: int, vectors: np.ndarray, meta: dict) -> bytes:
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    header = HEADER.pack(MAGIC, start_id, vectors.shape[0], vectors.shape[1], len(meta_bytes))
+    body = vectors.tobytes() + meta_bytes
+    return header + body + TRAILER.pack(zlib.crc32(header + body))
+
+def append_segment(path: str, start_id: int, vectors: np.ndarray, meta: dict) -> int:
+    """Appends one segment and fsyncs it. Returns the new log size in bytes."""
+    record = encode_segment(start_id, vectors, meta)
+    with open(path, "ab") as f:
+        f.write(record)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+def read_segments(path: str, offset: int = 0):
+    """
+    Yields (start_id, vectors, meta, end_offset) for every complete segment.
+    Stops at the first torn/corrupt segment (e.g. a crash mid-append) and cuts the
+    log back to the last good segment so the next append starts clean.
+    """
+    if not os.path.exists(path):
+        return
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        good_offset = offset
+        while True:
+            header = f.read(HEADER.size)
+            if not header:
+                break
+            if len(header) < HEADER.size:
+                break
+            magic, start_id, n, dim, meta_len = HEADER.unpack(header)
+            if magic != MAGIC:
+                break
+
+            body = f.read(n * dim * 4 + meta_len)
+            trailer = f.read(TRAILER.size)
+            if len(body) < n * dim * 4 + meta_len or len(trailer) < TRAILER.size:
+                break
+            if TRAILER.unpack(trailer)[0] != zlib.crc32(header + body):
+                break
+
+            vectors = np.frombuffer(body[:n * dim * 4], dtype="float32").reshape(n, dim)
+            meta = json.loads(body[n * dim * 4:].decode("utf-8"))
+            good_offset = f.tell()
+            yield start_id, vectors, meta, good_offset
+
+        file_size = os.fstat(f.fileno()).st_size
+
+    if good_offset < file_size:
+        print(f"⚠️ Segment log {path} has a torn tail ({file_size - good_offset} bytes). Truncating.")
+        with open(path, "r+b") as f:
+            f.truncate(good_offset)
+
+def drop_prefix(path: str, offset: int):
+    """
+    Removes the first `offset` bytes (segments already folded into a snapshot).
+    Segments appended after the snapshot was taken are kept.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        f.seek(offset)
+        tail = f.read()
+    atomic_write(path, tail)
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
+from app.utils.cache import get_redis
+from app.utils.file_lock import file_lock
+
+# Request coalescing for expensive generations (TTS, SD frames). When many identical
+# requests miss the asset cache together, one of them generates and the others wait
+# for it and share the result:
+# - in this process, followers wait on the leader's Future;
+# - across workers, the leader holds a lock on the cache key (Redis, else a lock file
+#   of its own, deleted on release) and re-checks the cache once it has it, so a
+#   worker that waited finds the file the other one just wrote.
+
+# "auto" = Redis when reachable, else lock files; "redis", "file", or "local" (this process only)
+SINGLE_FLIGHT_BACKEND = os.getenv("SINGLE_FLIGHT_BACKEND", "auto")
+# Longest a request waits for another worker's generation before doing its own
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "300"))
+
+POLL_SECONDS = 0.05
+
+# Deletes the Redis lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+class SingleFlight:
+    def __init__(self, name: str, lock_dir: str):
+        self.name = name
+        self.lock_dir = lock_dir
+        self._inflight = {}  # key -> Future of the leader in this process
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.cross_worker_hits = 0
+
+    def _backend(self) -> str:
+        if SINGLE_FLIGHT_BACKEND != "auto":
+            return SINGLE_FLIGHT_BACKEND
+        return "redis" if get_redis() is not None else "file"
+
+    @contextmanager
+    def _redis_lock(self, key: str):
+        client = get_redis()
+        lock_key = f"historabook:inflight:{self.name}:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+        acquired = False
+        try:
+            # The TTL frees the key if the holder dies mid-generation
+            while not client.set(lock_key, token, nx=True, px=int(SINGLE_FLIGHT_TIMEOUT * 1000)): # type: ignore
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(POLL_SECONDS)
+            else:
+                acquired = True
+        except Exception as e:
+            print(f"⚠️ Redis lock failed ({e}), generating without it.")
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    client.eval(_RELEASE_SCRIPT, 1, lock_key, token) # type: ignore
+                except Exception as e:
+                    print(f"⚠️ Redis unlock failed ({e}), it expires on its own.")
+
+    @contextmanager
+    def _file_lock(self, key: str):
+        # One file per key: unrelated generations never wait for each other
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        path = os.path.join(self.lock_dir, f".inflight-{digest}.lock")
+        with ExitStack() as stack:
+            try:
+                stack.enter_context(file_lock(path, timeout=SINGLE_FLIGHT_TIMEOUT, remove=True))
+            except TimeoutError:
+                print(f"⚠️ {self.name}: waited {SINGLE_FLIGHT_TIMEOUT:.0f}s for another worker, generating anyway.")
+            yield
+
+    @contextmanager
+    def _worker_lock(self, key: str):
+        backend = self._backend()
+        if backend == "redis" and get_redis() is not None:
+            with self._redis_lock(key):
+                yield
+        elif backend in ("redis", "file"):
+            with self._file_lock(key):
+                yield
+        else:
+            yield
+
+    def do(self, key: str, cached, generate):
+        """
+        Call after a cache miss. Runs generate() for key, at most once at a time across
+        threads and workers: followers in this process get the leader's result (or its
+        exception), a worker that waited on the lock gets cached() instead.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result() # type: ignore
+
+        try:
+            with self._worker_lock(key):
+                # Another worker may have finished it while we waited for the lock
+                result = cached()
+                if result is not None:
+                    self.cross_worker_hits += 1
+                else:
+                    result = generate()
+            future.set_result(result) # type: ignore
+            return result
+        except BaseException as e:
+            future.set_exception(e) # type: ignore
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self._backend(),
+            "in_flight": len(self._inflight),
+            "generations": self.leaders - self.cross_worker_hits,
+            "coalesced": self.coalesced,
+            "cross_worker_hits": self.cross_worker_hits,
+        }
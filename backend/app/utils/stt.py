@@ -1,22 +1,26 @@
 import whisper
 import os
 import warnings
+from app.utils.model_registry import model_registry
 
 # Suppress annoying warnings from the model
 warnings.filterwarnings("ignore")
 
 # We use the 'base' model. It's a good balance of speed/accuracy.
 MODEL_SIZE = "base"
-_model = None
+# Rough size of the 'base' weights, until the registry measures it
+MODEL_SIZE_MB = 150
+
+def _load_whisper():
+    print(f"👂 Loading Whisper ({MODEL_SIZE})...")
+    # This will download ~140MB the first time
+    return whisper.load_model(MODEL_SIZE)
+
+model_registry.register("whisper", _load_whisper, estimate_mb=MODEL_SIZE_MB)
 
 def get_whisper_model():
-    """Singleton: Load model once."""
-    global _model
-    if _model is None:
-        print(f"👂 Loading Whisper ({MODEL_SIZE})... This happens once.")
-        # This will download ~140MB the first time
-        _model = whisper.load_model(MODEL_SIZE)
-    return _model
+    """Loads the model on first use (the model registry may unload it when memory is needed)."""
+    return model_registry.get("whisper")
 
 def transcribe_audio(file_path: str) -> str:
     """
@@ -25,11 +29,10 @@ def transcribe_audio(file_path: str) -> str:
     if not os.path.exists(file_path):
         return ""
         
-    model = get_whisper_model()
-    
     # Run inference
     # fp16=False is safer for CPU usage
-    result = model.transcribe(file_path, fp16=False)
+    with model_registry.use("whisper") as model:
+        result = model.transcribe(file_path, fp16=False)
     
     # FIX: Pylance thinks this is a list, so we force it to be a string
     text = str(result["text"]).strip()
@@ -1,6 +1,4 @@
 import os
-import subprocess
-import uuid
 
 # --- CONFIG ---
 # Paths relative to this file (backend/app/utils/tts_piper.py)
@@ -27,47 +25,42 @@ VOICE_MAP = {
     "sa": "sa_IN-google-medium.onnx"
 }
 
+def narration_key(text: str, lang: str, model_path: str) -> str:
+    """Asset cache key of a narration: text + voice + model (shared by every TTS path)."""
+    from app.utils.asset_cache import asset_key
+    return asset_key("tts", text, lang, os.path.basename(model_path))
+
 def generate_audio(text: str, lang: str = "en") -> str:
     """
-    Runs Piper.exe via subprocess to generate audio.
+    Generates audio with a warm Piper worker (see tts_pool.py) and stores it in the
+    narration cache (see asset_cache.py). Returns the filename in static/audio.
     """
-    # 1. Check if Piper tool exists
-    if not os.path.exists(PIPER_EXE):
-        print(f"❌ Piper EXE not found at: {PIPER_EXE}")
-        return "error.wav"
+    from app.utils.tts_pool import get_tts_pool, voice_path
+    from app.utils.asset_cache import audio_cache, encode_audio
 
-    # 2. Find the correct model file for the language
-    model_filename = VOICE_MAP.get(lang, VOICE_MAP["en"])
-    model_path = os.path.join(MODELS_DIR, model_filename)
-    
+    # 1. Find the correct model file for the language
+    model_path = voice_path(lang)
     if not os.path.exists(model_path):
         print(f"❌ Voice Model not found for '{lang}': {model_path}")
         return "error.wav"
 
-    # 3. Prepare Output Path
-    filename = f"{uuid.uuid4()}.wav"
-    output_path = os.path.join(AUDIO_DIR, filename)
+    # 2. Cache Check (same key as the /api/audio routes)
+    key = narration_key(text, lang, model_path)
+    cached = audio_cache.get(key)
+    if cached:
+        return cached[0]
 
     try:
-        # Command: echo "text" | piper.exe -m model.onnx -f file.wav
-        cmd = [
-            PIPER_EXE,
-            "--model", model_path,
-            "--output_file", output_path
-        ]
+        # 3. Synthesize on a worker that already has the voice loaded
+        def generate():
+            data, extension = encode_audio(get_tts_pool().synthesize_wav(text, model_path))
+            return audio_cache.put(key, [(f"{key}{extension}", data)], {"lang": lang})
+
+        filename = audio_cache.generate_once(key, generate)[0]
 
-        # 4. Run the process
-        process = subprocess.Popen(
-            cmd, 
-            stdin=subprocess.PIPE, 
-            stdout=subprocess.DEVNULL, 
-            stderr=subprocess.DEVNULL
-        )
-        process.communicate(input=text.encode('utf-8'))
-        
         print(f"✅ Piper Generated ({lang}): {filename}")
         return filename
 
     except Exception as e:
         print(f"❌ Piper Critical Error: {e}")
-        return "error.wav"
\ No newline at end of file
+        return "error.wav"
@@ -0,0 +1,322 @@
+import io
+import json
+import os
+import queue
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Optional
+from app.utils.tts_piper import PIPER_EXE, MODELS_DIR, VOICE_MAP
+
+# Long-lived Piper workers. Starting `piper` per request reloads the ONNX voice every
+# time, which costs more than synthesizing a short narration line. Each worker thread
+# keeps its voices loaded (ONNX Runtime releases the GIL while it runs, so threads
+# synthesize in parallel) and requests for a voice go to a worker that already has it.
+
+# --- POOL CONFIG ---
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "2"))
+# Requests waiting or running across all workers; more are refused (HTTP 503)
+TTS_QUEUE_SIZE = int(os.getenv("TTS_QUEUE_SIZE", "64"))
+# Voices a worker keeps loaded (least recently used one is dropped)
+TTS_VOICES_PER_WORKER = int(os.getenv("TTS_VOICES_PER_WORKER", "2"))
+# At most this many workers load the same voice (its concurrency limit)
+TTS_WORKERS_PER_VOICE = int(os.getenv("TTS_WORKERS_PER_VOICE", str(TTS_WORKERS)))
+# "python" = piper-tts package in-process, "process" = one `piper --json-input`
+# process per loaded voice, "auto" = python if the package is installed
+TTS_BACKEND = os.getenv("TTS_BACKEND", "auto")
+# Sentences of a streamed narration synthesized ahead of the one being sent
+TTS_STREAM_AHEAD = int(os.getenv("TTS_STREAM_AHEAD", str(TTS_WORKERS)))
+# Voices (VOICE_MAP keys) every worker loads at startup, e.g. "en,hi-ma"
+TTS_PRELOAD_VOICES = [v for v in os.getenv("TTS_PRELOAD_VOICES", "").split(",") if v]
+
+try:
+    from piper import PiperVoice  # type: ignore
+except ImportError:
+    PiperVoice = None
+
+class TTSBusyError(RuntimeError):
+    """The pool's queue is full; the caller should retry later."""
+
+def voice_path(lang: str = "en") -> str:
+    """Model file for a VOICE_MAP key (English if unknown)."""
+    return os.path.join(MODELS_DIR, VOICE_MAP.get(lang, VOICE_MAP["en"]))
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """16-bit mono PCM -> WAV file bytes."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+def wav_stream_header(sample_rate: int) -> bytes:
+    """WAV header for PCM of unknown length that follows (players read until the stream ends)."""
+    header = bytearray(pcm_to_wav(b"", sample_rate))
+    struct.pack_into("<I", header, 4, 0xFFFFFFFF)       # RIFF size
+    struct.pack_into("<I", header, 40, 0xFFFFFFFF - 36) # data size
+    return bytes(header)
+
+class _PythonVoice:
+    """Voice loaded in this process with the piper-tts package."""
+
+    def __init__(self, model_path: str):
+        self.voice = PiperVoice.load(model_path) # type: ignore
+
+    def synthesize(self, text: str):
+        """Returns (sample_rate, 16-bit mono PCM bytes)."""
+        voice = self.voice
+        if hasattr(voice, "synthesize_wav"):
+            # piper-tts >= 1.3: synthesize() yields one AudioChunk per sentence
+            chunks = list(voice.synthesize(text))
+            rate = chunks[0].sample_rate if chunks else voice.config.sample_rate
+            return rate, b"".join(chunk.audio_int16_bytes for chunk in chunks)
+        # piper-tts 1.2
+        return voice.config.sample_rate, b"".join(voice.synthesize_stream_raw(text))
+
+    def close(self):
+        pass
+
+class _ProcessVoice:
+    """
+    One persistent `piper --json-input` process: the model is loaded once, then every
+    request is a JSON line on stdin and piper answers with the written file's path.
+    """
+
+    def __init__(self, model_path: str):
+        self.tmp_dir = tempfile.mkdtemp(prefix="piper-")
+        self.proc = subprocess.Popen(
+            [PIPER_EXE, "--model", model_path, "--json-input", "--output_dir", self.tmp_dir],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def synthesize(self, text: str):
+        output_path = os.path.join(self.tmp_dir, f"{time.time_ns()}.wav")
+        line = json.dumps({"text": " ".join(text.split()), "output_file": output_path})
+        self.proc.stdin.write(line.encode("utf-8") + b"\n") # type: ignore
+        self.proc.stdin.flush() # type: ignore
+        if not self.proc.stdout.readline(): # type: ignore
+            raise RuntimeError(f"Piper exited with code {self.proc.poll()}")
+        try:
+            with wave.open(output_path, "rb") as wav:
+                return wav.getframerate(), wav.readframes(wav.getnframes())
+        finally:
+            os.remove(output_path)
+
+    def close(self):
+        try:
+            self.proc.stdin.close() # type: ignore
+            self.proc.wait(timeout=5)
+        except Exception:
+            self.proc.kill()
+        try:
+            os.rmdir(self.tmp_dir)
+        except OSError:
+            pass
+
+def _backend() -> str:
+    if TTS_BACKEND != "auto":
+        return TTS_BACKEND
+    return "python" if PiperVoice is not None else "process"
+
+def load_voice(model_path: str):
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Voice model not found at {model_path}")
+    if _backend() == "python":
+        if PiperVoice is None:
+            raise RuntimeError("piper-tts is not installed (pip install piper-tts)")
+        return _PythonVoice(model_path)
+    if not os.path.exists(PIPER_EXE):
+        raise FileNotFoundError(f"Piper EXE not found at {PIPER_EXE}")
+    return _ProcessVoice(model_path)
+
+class _Worker(threading.Thread):
+    def __init__(self, pool, number: int):
+        super().__init__(name=f"tts-worker-{number}", daemon=True)
+        self.pool = pool
+        self.jobs = queue.Queue()
+        self.voices = OrderedDict()   # model_path -> loaded voice (LRU)
+        self.assigned = OrderedDict() # model_path -> None, voices the pool routes here
+        self.load = 0                 # Jobs queued or running on this worker
+        self.synthesized = 0
+        self.synth_seconds = 0.0
+
+    def _voice(self, model_path: str):
+        voice = self.voices.get(model_path)
+        if voice is None:
+            start = time.perf_counter()
+            voice = load_voice(model_path)
+            print(f"🔊 {self.name} loaded {os.path.basename(model_path)} in {time.perf_counter() - start:.2f}s")
+            self.voices[model_path] = voice
+            while len(self.voices) > TTS_VOICES_PER_WORKER:
+                _, old = self.voices.popitem(last=False)
+                old.close()
+        self.voices.move_to_end(model_path)
+        return voice
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            text, model_path, future = job
+            try:
+                if future.set_running_or_notify_cancel():
+                    voice = self._voice(model_path)
+                    if text is None:
+                        # preload(): only load the voice
+                        future.set_result(None)
+                        continue
+                    start = time.perf_counter()
+                    try:
+                        result = voice.synthesize(text)
+                    except Exception:
+                        # A crashed piper process is replaced on the next request
+                        self.voices.pop(model_path, None)
+                        voice.close()
+                        raise
+                    self.synthesized += 1
+                    self.synth_seconds += time.perf_counter() - start
+                    future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self.pool._finished(self)
+
+        for voice in self.voices.values():
+            voice.close()
+
+class TTSPool:
+    """
+    Fixed set of TTS worker threads. submit() routes each request to a worker that
+    already has the voice loaded (the least busy one); a voice is spread to another
+    worker only when all its workers are busy, another worker is idle, and it is on
+    fewer than TTS_WORKERS_PER_VOICE workers.
+    """
+
+    def __init__(self, workers: int = 0, queue_size: int = 0):
+        self.queue_size = queue_size or TTS_QUEUE_SIZE
+        self.workers = [_Worker(self, n) for n in range(workers or TTS_WORKERS)]
+        self.pending = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        for worker in self.workers:
+            worker.start()
+
+    def _pick(self, model_path: str) -> _Worker:
+        holders = [w for w in self.workers if model_path in w.assigned]
+        best = min(holders, key=lambda w: w.load) if holders else None
+        if best is None or (best.load > 0 and len(holders) < TTS_WORKERS_PER_VOICE):
+            others = [w for w in self.workers if w not in holders]
+            idle = min(others, key=lambda w: w.load) if others else None
+            if idle is not None and (best is None or idle.load == 0):
+                best = idle
+
+        best.assigned[model_path] = None # type: ignore
+        best.assigned.move_to_end(model_path) # type: ignore
+        while len(best.assigned) > TTS_VOICES_PER_WORKER: # type: ignore
+            best.assigned.popitem(last=False) # type: ignore
+        return best # type: ignore
+
+    def submit(self, text: str, model_path: str) -> Future:
+        """Queues one synthesis. The future resolves to (sample_rate, PCM bytes)."""
+        future = Future()
+        with self._lock:
+            if self.pending >= self.queue_size:
+                self.rejected += 1
+                raise TTSBusyError(f"TTS queue is full ({self.pending} requests)")
+            worker = self._pick(model_path)
+            worker.load += 1
+            self.pending += 1
+        worker.jobs.put((text, model_path, future))
+        return future
+
+    def _finished(self, worker: _Worker):
+        with self._lock:
+            worker.load -= 1
+            self.pending -= 1
+
+    def synthesize(self, text: str, model_path: str, timeout: Optional[float] = None):
+        """Blocking: (sample_rate, PCM bytes)."""
+        return self.submit(text, model_path).result(timeout)
+
+    def synthesize_wav(self, text: str, model_path: str, timeout: Optional[float] = None) -> bytes:
+        sample_rate, pcm = self.synthesize(text, model_path, timeout)
+        return pcm_to_wav(pcm, sample_rate)
+
+    def stream(self, sentences: list, model_path: str, ahead: int = 0):
+        """
+        Yields (sample_rate, PCM bytes) per sentence, in order. Up to `ahead` sentences
+        are queued at once, so later ones synthesize on other workers while earlier
+        ones are being sent. Closing the generator cancels what hasn't started.
+        """
+        ahead = ahead or TTS_STREAM_AHEAD
+        in_flight = deque()
+        next_sentence = 0
+        try:
+            while next_sentence < len(sentences) or in_flight:
+                while next_sentence < len(sentences) and len(in_flight) < ahead:
+                    try:
+                        in_flight.append(self.submit(sentences[next_sentence], model_path))
+                    except TTSBusyError:
+                        if not in_flight:
+                            raise
+                        break  # Queue is full: send what we have, then try again
+                    next_sentence += 1
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def preload(self, model_path: str):
+        """Loads a voice on every worker (runs through the queues, returns at once)."""
+        for worker in self.workers:
+            with self._lock:
+                worker.assigned[model_path] = None
+                worker.load += 1
+                self.pending += 1
+            worker.jobs.put((None, model_path, Future()))
+
+    def stats(self) -> dict:
+        return {
+            "backend": _backend(),
+            "pending": self.pending,
+            "queue_size": self.queue_size,
+            "rejected": self.rejected,
+            "workers": [
+                {
+                    "name": w.name,
+                    "load": w.load,
+                    "voices": [os.path.basename(p) for p in w.voices],
+                    "synthesized": w.synthesized,
+                    "avg_synth_seconds": round(w.synth_seconds / w.synthesized, 3) if w.synthesized else 0.0,
+                }
+                for w in self.workers
+            ],
+        }
+
+    def close(self):
+        for worker in self.workers:
+            worker.jobs.put(None)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_tts_pool() -> TTSPool:
+    """The process-wide pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = TTSPool()
+            print(f"🔊 Started TTS pool: {len(_pool.workers)} workers, backend '{_backend()}'")
+            for lang in TTS_PRELOAD_VOICES:
+                _pool.preload(voice_path(lang))
+    return _pool
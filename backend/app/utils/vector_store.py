@@ -1,68 +1,797 @@
 import faiss  # type: ignore
 import numpy as np
+import io
+import math
 import os
 import pickle
+import shutil
+import threading
+import time
+from typing import Optional
+from app.utils.fileio import atomic_write
+from app.utils.file_lock import file_lock
+from app.utils.segment_log import append_segment, read_segments, drop_prefix
 
+# --- ON-DISK LAYOUT ---
+# vector_snapshots/<generation>/   immutable snapshot, never modified after publish
+#     vector_store.index           FAISS index
+#     chunk_ids.npy                int ID -> Chunk UUID as a fixed-width byte array (mmap-able)
+#     book_map.pkl                 catalog_id -> integer IDs of that book's vectors
+#     raw_vectors.txt              name of the vectors file below (absent = vectors.f32)
+# vector_store.current             generation number of the published snapshot
+# vector_store.log                 write-ahead log of vectors added/removed since (see segment_log.py)
+# vectors.f32                      full-precision float32 rows (row i = ID i), append-only;
+#                                  a purge writes a renumbered copy, vectors.<generation>.f32
+# vector_store.lock                cross-process lock held while appending / publishing
+SNAPSHOT_DIR = "vector_snapshots"
+CURRENT_FILE = "vector_store.current"
 INDEX_FILE = "vector_store.index"
+CHUNK_IDS_FILE = "chunk_ids.npy"
+BOOK_MAP_FILE = "book_map.pkl"
+LOG_FILE = "vector_store.log"
+RAW_VECTORS_FILE = "vectors.f32"
+RAW_NAME_FILE = "raw_vectors.txt"
+LOCK_FILE = "vector_store.lock"
+# Pre-snapshot format (still loaded if no snapshot has been published yet)
 ID_MAP_FILE = "id_map.pkl"
+KEEP_SNAPSHOTS = 3
+
+# Fold the log into a fresh snapshot (in a background thread) once it grows past this
+COMPACT_BYTES = int(os.getenv("VECTOR_LOG_COMPACT_BYTES", str(64 * 1024 * 1024)))
+
+# --- REMOVALS ---
+# remove_chunks() only tombstones vectors (they are skipped at search time). Once
+# tombstones make up this share of the index, compaction rebuilds it without them
+# and renumbers the live IDs, so re-ingesting books doesn't grow the index forever.
+PURGE_FRACTION = float(os.getenv("VECTOR_PURGE_FRACTION", "0.2"))
+
+# --- MULTI-WORKER MODE ---
+# "writer": loads into RAM, accepts adds. Several writer processes (ingest workers)
+#           can share one store: appends are serialized by vector_store.lock and each
+#           writer replays what the others logged before adding.
+# "readonly": memory-maps the published snapshot so all API workers share one copy
+#             through the OS page cache, and reloads when the writer publishes.
+STORE_MODE = os.getenv("VECTOR_STORE_MODE", "writer")
+# Publish a snapshot after every add so read-only workers see new books quickly
+PUBLISH_ON_ADD = os.getenv("VECTOR_PUBLISH_ON_ADD", "0") == "1"
+# How often workers check for a new generation / log entries from other processes
+RELOAD_CHECK_SECONDS = float(os.getenv("VECTOR_RELOAD_CHECK_SECONDS", "2"))
+
+# --- INDEX CONFIG ---
+# "flat" is exact (scans everything). The others are approximate but keep
+# latency flat as the library grows: "ivf_flat", "ivf_pq", "hnsw".
+# "sq8" (int8, 4x smaller) and "pq" (48 bytes/vector, 32x smaller) compress the
+# stored vectors so a node holds more books.
+# Changing this only takes effect after running rebuild_index.py.
+INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "pq")
+# Types that keep only compressed codes in RAM
+QUANTIZED_TYPES = ("sq8", "pq", "ivf_pq")
+
+IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", "0"))     # 0 = pick from library size
+PQ_M = int(os.getenv("VECTOR_PQ_M", "48"))              # 384 / 48 = 8 dims per sub-quantizer
+HNSW_M = int(os.getenv("VECTOR_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", "200"))
+
+# Per-query knobs (can be overridden on every search call)
+DEFAULT_NPROBE = int(os.getenv("VECTOR_NPROBE", "16"))
+DEFAULT_EF_SEARCH = int(os.getenv("VECTOR_EF_SEARCH", "64"))
+# Quantized indexes fetch k * this many candidates, then re-rank them with the
+# full-precision vectors from vectors.f32 (1 = no re-ranking)
+RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+
+def build_index(index_type: str, vectors: np.ndarray, dimension: int = 384):
+    """
+    Creates (and trains, if needed) a FAISS index of the given type filled with `vectors`.
+    Vectors are added in order, so row i keeps integer ID i.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}")
+
+    n = len(vectors)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+        print(f"🏋️ Training sq8 index on {n} vectors...")
+        index.train(vectors) # type: ignore
+    elif index_type == "pq":
+        if n < 256:
+            raise ValueError(f"PQ needs at least 256 vectors to train (have {n})")
+        index = faiss.IndexPQ(dimension, PQ_M, 8)
+        print(f"🏋️ Training pq index (M={PQ_M}) on {n} vectors...")
+        index.train(vectors) # type: ignore
+    else:
+        # Rule of thumb: ~4*sqrt(N) lists, but FAISS wants >= 39 training points per list
+        nlist = IVF_NLIST or int(4 * math.sqrt(max(n, 1)))
+        nlist = max(1, min(nlist, n // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            if n < 256:
+                raise ValueError(f"IVF-PQ needs at least 256 vectors to train (have {n})")
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_M, 8)
+
+        print(f"🏋️ Training {index_type} index (nlist={nlist}) on {n} vectors...")
+        index.train(vectors) # type: ignore
+
+    if n:
+        index.add(vectors) # type: ignore
+    return index
+
+def index_type_of(index) -> str:
+    """Maps a loaded FAISS index back to our config name."""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    return "flat"
+
+class RawVectorFile:
+    """
+    Full-precision float32 copy of every vector on disk (row i = integer ID i).
+    Compressed indexes keep only codes in RAM; the exact rows are paged in lazily
+    (via mmap) for the few candidates being re-ranked.
+    """
+    def __init__(self, path: str, dimension: int):
+        self.path = path
+        self.dimension = dimension
+        self._map = None
+
+    @property
+    def rows(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // (4 * self.dimension)
+
+    def ensure(self, start_id: int, vectors: np.ndarray):
+        """Writes rows start_id.. unless the file already has them (log replays are idempotent)."""
+        if self.rows >= start_id + len(vectors):
+            return
+        mode = "r+b" if os.path.exists(self.path) else "wb"
+        with open(self.path, mode) as f:
+            f.seek(start_id * 4 * self.dimension)
+            f.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def covers(self, ids: np.ndarray) -> bool:
+        if len(ids) == 0:
+            return True
+        needed = int(ids.max()) + 1
+        if self._map is None or len(self._map) < needed:
+            rows = self.rows
+            if rows < needed:
+                return False
+            self._map = np.memmap(self.path, dtype="float32", mode="r", shape=(rows, self.dimension))
+        return True
+
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        """Call covers(ids) first."""
+        return np.asarray(self._map[ids]) # type: ignore
+
+def exact_top_k(queries: np.ndarray, ids: np.ndarray, rows: np.ndarray, k: int):
+    """
+    Exact L2 top-k of every query over a small set of candidate rows (rows[j] has ID ids[j]).
+    Returns (D, I) shaped like index.search().
+    """
+    rows = np.ascontiguousarray(rows, dtype='float32')
+    queries = np.ascontiguousarray(queries, dtype='float32').reshape(-1, rows.shape[1])
+    D, local = faiss.knn(queries, rows, min(k, len(ids)))
+    I = np.where(local >= 0, ids[np.maximum(local, 0)], -1)
+    return D, I
+
+class ChunkIdArray:
+    """
+    Read-only int ID -> Chunk UUID map backed by a (memory-mapped) fixed-width byte array.
+    Behaves like the dict the writer keeps, without a Python object per chunk.
+    """
+    def __init__(self, array: np.ndarray):
+        self.array = array
+
+    def __contains__(self, idx) -> bool:
+        return 0 <= idx < len(self.array) and bool(self.array[idx])
+
+    def __getitem__(self, idx) -> str:
+        return self.array[idx].decode("ascii")
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.array))
+
+    def empty_ids(self) -> set:
+        """IDs without a chunk, i.e. tombstoned vectors."""
+        return set(np.flatnonzero(self.array == b"").tolist())
+
+    def items(self):
+        for idx in np.flatnonzero(self.array):
+            yield int(idx), self.array[idx].decode("ascii")
+
+def chunk_id_array(id_map, ntotal: int) -> np.ndarray:
+    """Packs an id_map dict into the compact array stored in snapshots."""
+    width = max([len(c) for c in id_map.values()] + [36])
+    array = np.zeros(ntotal, dtype=f"S{width}")
+    for idx, chunk_id in id_map.items():
+        array[idx] = chunk_id.encode("ascii")
+    return array
 
 class VectorStore:
-    def __init__(self):
+    def __init__(self, base_dir: str = ".", read_only: Optional[bool] = None):
         # 384 is the dimension of 'all-MiniLM-L6-v2'
         self.dimension = 384
         self.index = faiss.IndexFlatL2(self.dimension)
         self.id_map = {}  # Maps integer ID (0,1,2) -> Chunk UUID ("c1-...")
+        self.book_ids = {}  # Maps catalog_id -> int64 array of that book's integer IDs
+        self.deleted = set()  # Tombstoned integer IDs (still in the index, never returned)
+        self.generation = 0  # Published snapshot currently loaded
+        self._selector = None  # Cached "not deleted" IDSelector (rebuilt after removals)
+
+        self.read_only = (STORE_MODE == "readonly") if read_only is None else read_only
+        self.base_dir = base_dir
+        self.snapshot_dir = os.path.join(base_dir, SNAPSHOT_DIR)
+        self.current_file = os.path.join(base_dir, CURRENT_FILE)
+        self.log_file = os.path.join(base_dir, LOG_FILE)
+        self.lock_file = os.path.join(base_dir, LOCK_FILE)
+        self.raw = RawVectorFile(os.path.join(base_dir, RAW_VECTORS_FILE), self.dimension)
+
+        # Guards index + id_map + log appends (ingest and compaction run on other threads)
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._log_size = 0
+        self._last_reload_check = 0.0
         
         self.load_index()
 
-    def add_vectors(self, vectors: list, chunk_ids: list):
+    @property
+    def index_type(self) -> str:
+        return index_type_of(self.index)
+
+    @property
+    def version(self) -> str:
+        """Changes whenever search results could change (new vectors, new snapshot/rebuild)."""
+        self._maybe_reload()
+        return f"{self.generation}:{self.index.ntotal}:{len(self.deleted)}"
+
+    def add_vectors(self, vectors, chunk_ids: list, catalog_id: str = ""):
         """
-        vectors: List of list of floats
+        vectors: (N, 384) float32 numpy array (or list of list of floats)
         chunk_ids: List of strings (UUIDs)
+        catalog_id: Book these chunks belong to (enables per-book search)
         """
-        if not vectors:
+        if len(vectors) == 0:
             return
+        if self.read_only:
+            raise RuntimeError("Vector store is read-only (VECTOR_STORE_MODE=readonly). Ingest from the writer process.")
             
-        np_vectors = np.array(vectors).astype('float32')
-        
-        # Current count is the starting ID for these new vectors
-        start_id = self.index.ntotal
+        # No copy when the embedder already hands us contiguous float32
+        np_vectors = np.ascontiguousarray(vectors, dtype='float32')
         
-        # Add to FAISS
-        # Pylance often struggles with C++ bindings, so we ignore the error
-        self.index.add(np_vectors) # type: ignore
+        # Lock order everywhere: file lock (other processes) first, then thread lock
+        with file_lock(self.lock_file), self._lock:
+            # Another writer process may have logged or published since we last looked
+            self._catch_up()
+
+            # Current count is the starting ID for these new vectors
+            start_id = self.index.ntotal
+            meta = {"ids": list(chunk_ids), "catalog_id": catalog_id, "generation": self.generation}
+
+            # 1. Make it durable: append only the new vectors to the log (O(new vectors))
+            self._log_size = append_segment(self.log_file, start_id, np_vectors, meta)
+
+            # 2. Make it searchable
+            self._apply_segment(start_id, np_vectors, meta)
+
+            needs_compaction = (PUBLISH_ON_ADD or self._log_size >= COMPACT_BYTES) and not self._compact_lock.locked()
+
+        if needs_compaction:
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def remove_chunks(self, chunk_ids: list, catalog_id: str = "") -> int:
+        """
+        Tombstones the vectors of these chunks (e.g. superseded by a re-ingest).
+        catalog_id: book they belong to (saves a scan over the whole id_map)
+        Returns the number of vectors removed.
+        """
+        if not chunk_ids:
+            return 0
+        if self.read_only:
+            raise RuntimeError("Vector store is read-only (VECTOR_STORE_MODE=readonly). Ingest from the writer process.")
+
+        wanted = set(chunk_ids)
+        with file_lock(self.lock_file), self._lock:
+            self._catch_up()
+            if catalog_id in self.book_ids:
+                candidates = self.book_ids[catalog_id].tolist()
+            else:
+                candidates = list(self.id_map)
+            ids = [i for i in candidates if self.id_map.get(i) in wanted]
+            if not ids:
+                return 0
+
+            # Logged like an add (zero vectors), so other writers and restarts replay it
+            meta = {"deleted": ids, "catalog_id": catalog_id, "generation": self.generation}
+            empty = np.zeros((0, self.dimension), dtype='float32')
+            self._log_size = append_segment(self.log_file, self.index.ntotal, empty, meta)
+            self._apply_segment(self.index.ntotal, empty, meta)
+
+            needs_compaction = self._needs_purge() and not self._compact_lock.locked()
+
+        if needs_compaction:
+            threading.Thread(target=self.compact, daemon=True).start()
+        return len(ids)
+
+    def book_chunk_ids(self, catalog_id: str) -> set:
+        """Chunk UUIDs that currently have a (live) vector for this book."""
+        self._maybe_reload()
+        with self._lock:
+            ids = self.book_ids.get(catalog_id)
+            if ids is None:
+                return set()
+            return {self.id_map[i] for i in ids.tolist() if i in self.id_map}
+
+    def _tombstone(self, ids: list, catalog_id: str = ""):
+        for idx in ids:
+            self.id_map.pop(idx, None)
+        self.deleted.update(ids)
+        self._selector = None
+
+        books = [catalog_id] if catalog_id in self.book_ids else list(self.book_ids)
+        removed = np.array(ids, dtype='int64')
+        for book in books:
+            self.book_ids[book] = np.setdiff1d(self.book_ids[book], removed)
+
+    def _needs_purge(self) -> bool:
+        ntotal = self.index.ntotal
+        return bool(self.deleted) and len(self.deleted) >= PURGE_FRACTION * ntotal
+
+    def _live_selector(self):
+        """IDSelector that skips tombstoned IDs inside FAISS (so they never take a top-k slot)."""
+        if not self.deleted:
+            return None
+        if self._selector is None:
+            # The inner selector must stay referenced for as long as the outer one is used
+            inner = faiss.IDSelectorBatch(np.array(sorted(self.deleted), dtype='int64'))
+            self._selector = (faiss.IDSelectorNot(inner), inner)
+        return self._selector[0]
+
+    def _apply_segment(self, start_id: int, vectors: np.ndarray, meta: dict):
+        """Adds one logged batch to the in-memory index + id_map + book map."""
+        if meta.get("generation", self.generation) < self.generation:
+            # Logged before the loaded snapshot was taken, so already folded into it
+            # (a purge renumbers IDs, replaying it again would corrupt the maps)
+            return
+        if "deleted" in meta:
+            self._tombstone(meta["deleted"], meta.get("catalog_id") or "")
+            return
+
+        ntotal = self.index.ntotal
+        if start_id < ntotal:
+            # Already inside the snapshot (crash after snapshot rename, before log trim)
+            pass
+        else:
+            if start_id > ntotal:
+                print(f"⚠️ Segment log gap: expected ID {ntotal}, got {start_id}.")
+            # Pylance often struggles with C++ bindings, so we ignore the error
+            self.index.add(vectors) # type: ignore
+
+        # Keep the full-precision copy used for re-ranking / exact rebuilds
+        self.raw.ensure(start_id, vectors)
         
         # Update map
+        chunk_ids = meta["ids"]
         for i, chunk_id in enumerate(chunk_ids):
             self.id_map[start_id + i] = chunk_id
-            
-        self.save_index()
 
-    def search(self, query_vector: list, k: int = 5):
-        """Returns list of (chunk_id, distance)"""
-        np_vector = np.array([query_vector]).astype('float32')
+        catalog_id = meta.get("catalog_id")
+        if catalog_id:
+            self._assign_book(catalog_id, np.arange(start_id, start_id + len(chunk_ids), dtype='int64'))
+
+    def _assign_book(self, catalog_id: str, ids: np.ndarray):
+        existing = self.book_ids.get(catalog_id)
+        if existing is not None:
+            ids = np.union1d(existing, ids)  # sorted + de-duplicated (replays are idempotent)
+        self.book_ids[catalog_id] = ids
+
+    def set_book_chunks(self, catalog_id: str, chunk_ids: list):
+        """
+        Backfills the book map for vectors added before per-book search existed.
+        chunk_ids: the book's Chunk UUIDs (from Postgres)
+        """
+        wanted = set(chunk_ids)
+        with self._lock:
+            ids = np.array([i for i, c_id in self.id_map.items() if c_id in wanted], dtype='int64')
+            if len(ids):
+                self._assign_book(catalog_id, ids)
+        return len(ids)
+
+    def _ids_for_books(self, book_ids: dict, catalog_ids: list) -> np.ndarray:
+        parts = [book_ids[c] for c in catalog_ids if c in book_ids]
+        if not parts:
+            return np.zeros(0, dtype='int64')
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def _search_params(self, index, nprobe: int = 0, ef_search: int = 0, selector=None):
+        """Per-query tuning. Passed to FAISS per call so concurrent requests don't fight over globals."""
+        if isinstance(index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(nprobe=nprobe or DEFAULT_NPROBE, sel=selector)
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(efSearch=ef_search or DEFAULT_EF_SEARCH, sel=selector)
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+    def _search_books(self, index, queries: np.ndarray, k: int, ids: np.ndarray, nprobe: int, ef_search: int):
+        """Top-k restricted to the given integer IDs, filtered inside the index."""
+        if index_type_of(index) in ("flat", "hnsw"):
+            # Per-book sub-index: full vectors are stored as-is, so pull just this book's
+            # rows and scan them exactly. Cost is O(book size), not O(library size).
+            return exact_top_k(queries, ids, index.reconstruct_batch(ids), k)
+
+        if self.raw.covers(ids):
+            # Compressed / IVF index: the exact rows are on disk, scan just this book's
+            return exact_top_k(queries, ids, self.raw.get(ids), k)
+
+        # No full-precision copy (old data): only the probed lists are scanned and the ID selector drops other books
+        # before they enter the heap, so the top-k is exact for the book (no post-filter).
+        selector = faiss.IDSelectorBatch(ids)
+        params = self._search_params(index, nprobe, ef_search, selector)
+        return index.search(queries, k, params=params) # type: ignore
+
+    def search(self, query_vector, k: int = 5, nprobe: int = 0, ef_search: int = 0, catalog_ids: Optional[list] = None):
+        """
+        Returns list of (chunk_id, distance)
+        nprobe: IVF lists to visit (higher = better recall, slower)
+        ef_search: HNSW candidate list size (higher = better recall, slower)
+        catalog_ids: only return chunks from these books (None = whole library)
+        """
+        return self.search_batch(query_vector, k, nprobe, ef_search, catalog_ids)[0]
+
+    def search_batch(self, query_vectors, k: int = 5, nprobe: int = 0, ef_search: int = 0, catalog_ids: Optional[list] = None):
+        """
+        Same as search() for many queries at once: one multi-row FAISS call.
+        query_vectors: (N, 384) float32 matrix (or a single vector)
+        Returns one list of (chunk_id, distance) per query row.
+        """
+        queries = np.ascontiguousarray(query_vectors, dtype='float32').reshape(-1, self.dimension)
+
+        self._maybe_reload()
+        # Grab one consistent view; a reload may swap these while we search
+        with self._lock:
+            index, id_map, book_ids = self.index, self.id_map, self.book_ids
+            deleted = len(self.deleted)
+            selector = self._live_selector() if deleted else None
         
         # D = distances, I = indices (IDs)
         # Pylance expects C++ inputs, but Python wrapper returns tuple. Ignore error.
-        D, I = self.index.search(np_vector, k) # type: ignore
+        if catalog_ids:
+            ids = self._ids_for_books(book_ids, catalog_ids)
+            if len(ids) == 0:
+                return [[] for _ in range(len(queries))]
+            D, I = self._search_books(index, queries, k, ids, nprobe, ef_search)
+        else:
+            # Compressed codes only approximate distances: over-fetch, then re-rank exactly
+            rerank = RERANK_FACTOR > 1 and index_type_of(index) in QUANTIZED_TYPES
+            fetch = k * RERANK_FACTOR if rerank else k
+
+            post_filter = selector is not None and index_type_of(index) == "pq"
+            if post_filter:
+                # IndexPQ can't take an ID selector: over-fetch past the tombstones instead
+                fetch = min(fetch + deleted, fetch * 4)
+                selector = None
+
+            params = self._search_params(index, nprobe, ef_search, selector)
+            if params is None:
+                D, I = index.search(queries, fetch) # type: ignore
+            else:
+                D, I = index.search(queries, fetch, params=params) # type: ignore
+
+            if post_filter:
+                # Re-ranking must not pick tombstoned candidates
+                I = np.where([[idx in id_map for idx in row] for row in I], I, -1)
+
+            if rerank:
+                D, I = self._rerank(queries, D, I, k)
         
-        results = []
-        for i, idx in enumerate(I[0]):
-            if idx != -1 and idx in self.id_map:
-                results.append((self.id_map[idx], float(D[0][i])))
+        all_results = []
+        for D_row, I_row in zip(D, I):
+            results = []
+            for distance, idx in zip(D_row, I_row):
+                if idx != -1 and idx in id_map:
+                    results.append((id_map[idx], float(distance)))
+            all_results.append(results)
                 
-        return results
+        return all_results
+
+    def _rerank(self, queries: np.ndarray, D: np.ndarray, I: np.ndarray, k: int):
+        """Re-scores each row's candidates with the full-precision vectors."""
+        out_D = np.full((len(queries), k), np.inf, dtype='float32')
+        out_I = np.full((len(queries), k), -1, dtype='int64')
+        for row in range(len(queries)):
+            candidates = I[row][I[row] >= 0]
+            if len(candidates) == 0:
+                continue
+            if self.raw.covers(candidates):
+                d, i = exact_top_k(queries[row], candidates, self.raw.get(candidates), k)
+            else:
+                # Vectors from before vectors.f32 existed: keep the approximate order
+                d, i = D[row:row + 1, :k], I[row:row + 1, :k]
+            out_D[row, :d.shape[1]] = d[0]
+            out_I[row, :i.shape[1]] = i[0]
+        return out_D, out_I
+
+    def all_vectors(self) -> np.ndarray:
+        """
+        Pulls every stored vector back out (row i = ID i). Uses the full-precision
+        copy on disk when there is one; otherwise reconstructs from the index, which
+        is exact for flat/ivf_flat/hnsw but only approximate for quantized types.
+        """
+        ntotal = self.index.ntotal
+        if ntotal == 0:
+            return np.zeros((0, self.dimension), dtype='float32')
+        all_ids = np.arange(ntotal, dtype='int64')
+        if self.raw.covers(all_ids):
+            return self.raw.get(all_ids)
+        if isinstance(self.index, faiss.IndexIVF):
+            # IVF needs a direct map to look vectors up by ID
+            self.index.make_direct_map()
+        return self.index.reconstruct_n(0, ntotal)
+
+    def rebuild_index(self, index_type: str = ""):
+        """
+        Re-creates the index as `index_type` (default: VECTOR_INDEX_TYPE) from the
+        vectors already stored, training it if needed. IDs and id_map stay the same.
+        """
+        index_type = index_type or INDEX_TYPE
+
+        with file_lock(self.lock_file), self._lock:
+            self._catch_up()
+            exact = self.raw.covers(np.arange(self.index.ntotal, dtype='int64'))
+            if not exact and self.index_type in QUANTIZED_TYPES:
+                print(f"⚠️ Rebuilding from a {self.index_type} index without vectors.f32: vectors are lossy approximations.")
+
+            vectors = self.all_vectors()
+            if not exact and self.index_type not in QUANTIZED_TYPES:
+                # Backfill the full-precision copy so the new index can re-rank exactly
+                self.raw.ensure(0, vectors)
+            self.index = build_index(index_type, vectors, self.dimension)
+        self.compact()
+        print(f"✅ Rebuilt vector index as '{index_type}' with {self.index.ntotal} vectors.")
+
+    def compact(self):
+        """
+        Publishes a new snapshot generation (index + maps in a fresh folder, then an
+        atomic rename of the CURRENT pointer), then drops the log segments it now
+        contains. Segments added meanwhile stay in the log.
+        """
+        if self.read_only:
+            return
+
+        # The file lock is held throughout so two processes never publish the same generation
+        with self._compact_lock, file_lock(self.lock_file):
+            with self._lock:
+                self._catch_up()
+                log_offset = self._log_size
+                generation = self.generation + 1
+                raw_name = os.path.basename(self.raw.path)
+                purge = self._needs_purge()
+                if not purge:
+                    index_bytes = faiss.serialize_index(self.index)
+                    chunk_ids = chunk_id_array(self.id_map, self.index.ntotal)
+                    book_map_bytes = pickle.dumps(self.book_ids)
+
+            purged = None
+            if purge:
+                # Only this thread can change the store while the file lock is held
+                # (adds/removals/catch-ups take it first), so searches keep running meanwhile
+                purged = self._purge(generation)
+                index, id_map, book_ids, raw_name = purged
+                index_bytes = faiss.serialize_index(index)
+                chunk_ids = chunk_id_array(id_map, index.ntotal)
+                book_map_bytes = pickle.dumps(book_ids)
+
+            # Slow disk writes happen outside the thread lock so search keeps going
+            folder = self._snapshot_path(generation)
+            os.makedirs(folder, exist_ok=True)
+            buffer = io.BytesIO()
+            np.save(buffer, chunk_ids)
+            atomic_write(os.path.join(folder, INDEX_FILE), index_bytes.tobytes())
+            atomic_write(os.path.join(folder, CHUNK_IDS_FILE), buffer.getvalue())
+            atomic_write(os.path.join(folder, BOOK_MAP_FILE), book_map_bytes)
+            atomic_write(os.path.join(folder, RAW_NAME_FILE), raw_name.encode("utf-8"))
+
+            # Publish: readers switch over once this pointer changes
+            atomic_write(self.current_file, str(generation).encode("ascii"))
+
+            with self._lock:
+                drop_prefix(self.log_file, log_offset)
+                self._log_size -= log_offset
+                self.generation = generation
+                if purged is not None:
+                    self.index, self.id_map, self.book_ids = purged[:3]
+                    self.raw = RawVectorFile(os.path.join(self.base_dir, purged[3]), self.dimension)
+                    self.deleted = set()
+                    self._selector = None
+
+            self._prune_snapshots(generation)
+            print(f"🗜️ Vector store snapshot {generation} published ({len(chunk_ids)} vectors).")
+
+    def _purge(self, generation: int):
+        """
+        Copy of the index without tombstoned vectors, live IDs renumbered 0..n-1 (old
+        order kept). The trained quantizers are reused (clone + reset), so nothing is
+        retrained. The full-precision rows go to a new vectors.<generation>.f32.
+        Caller holds the file lock; nothing is swapped in here.
+        Returns (index, id_map, book_ids, raw file name).
+        """
+        live = np.array(sorted(self.id_map), dtype='int64')
+        vectors = self.all_vectors()[live] if len(live) else np.zeros((0, self.dimension), dtype='float32')
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+
+        index = faiss.clone_index(self.index)
+        index.reset()
+        if len(live):
+            index.add(vectors) # type: ignore
+
+        raw_name = f"vectors.{generation:08d}.f32"
+        raw_path = os.path.join(self.base_dir, raw_name)
+        tmp_path = raw_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, raw_path)
+
+        id_map = {new: self.id_map[int(old)] for new, old in enumerate(live)}
+        book_ids = {
+            catalog_id: np.searchsorted(live, ids[np.isin(ids, live)]).astype('int64')
+            for catalog_id, ids in self.book_ids.items()
+        }
+        print(f"🧹 Purged {len(self.deleted)} removed vectors ({self.index.ntotal} -> {index.ntotal}).")
+        return index, id_map, book_ids, raw_name
 
     def save_index(self):
-        faiss.write_index(self.index, INDEX_FILE)
-        with open(ID_MAP_FILE, "wb") as f:
-            pickle.dump(self.id_map, f)
+        self.compact()
 
-    def load_index(self):
-        if os.path.exists(INDEX_FILE) and os.path.exists(ID_MAP_FILE):
-            self.index = faiss.read_index(INDEX_FILE)
-            with open(ID_MAP_FILE, "rb") as f:
+    def _snapshot_path(self, generation: int) -> str:
+        return os.path.join(self.snapshot_dir, f"{generation:08d}")
+
+    def _prune_snapshots(self, current: int):
+        """Deletes old generations. Workers still mapping them keep their pages (POSIX)."""
+        for name in os.listdir(self.snapshot_dir):
+            if name.isdigit() and int(name) <= current - KEEP_SNAPSHOTS:
+                shutil.rmtree(os.path.join(self.snapshot_dir, name), ignore_errors=True)
+
+        # Vectors files left behind by purges once no kept snapshot uses them
+        in_use = {os.path.basename(self.raw.path)}
+        for name in os.listdir(self.snapshot_dir):
+            if name.isdigit():
+                in_use.add(self._raw_name(self._snapshot_path(int(name))))
+        for name in os.listdir(self.base_dir or "."):
+            if name.startswith("vectors.") and name.endswith(".f32") and name not in in_use:
+                os.remove(os.path.join(self.base_dir, name))
+
+    def _raw_name(self, folder: str) -> str:
+        try:
+            with open(os.path.join(folder, RAW_NAME_FILE), "rb") as f:
+                return f.read().decode("utf-8").strip() or RAW_VECTORS_FILE
+        except FileNotFoundError:
+            return RAW_VECTORS_FILE
+
+    def _read_generation(self) -> int:
+        try:
+            with open(self.current_file, "rb") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _maybe_reload(self):
+        """
+        Cheap check (a tiny file read + a stat, at most every few seconds) for changes
+        made by other processes: a newly published generation, or new log entries.
+        """
+        now = time.monotonic()
+        if now - self._last_reload_check < RELOAD_CHECK_SECONDS:
+            return
+        self._last_reload_check = now
+
+        generation = self._read_generation()
+        if self.read_only:
+            if generation and generation != self.generation:
+                print(f"🔄 Vector store generation {self.generation} -> {generation}, reloading...")
+                self._load_snapshot(generation)
+            return
+
+        log_size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        if generation != self.generation or log_size != self._log_size:
+            with file_lock(self.lock_file), self._lock:
+                self._catch_up()
+
+    def _catch_up(self):
+        """
+        Applies what other writer processes published / logged since we last looked.
+        Caller holds the file lock and the thread lock.
+        """
+        generation = self._read_generation()
+        if generation and generation != self.generation:
+            # Someone else published (and trimmed the log): start from their snapshot
+            self._load_snapshot(generation)
+            self._log_size = 0
+
+        for start_id, vectors, meta, end_offset in read_segments(self.log_file, self._log_size):
+            self._apply_segment(start_id, vectors, meta)
+            self._log_size = end_offset
+
+    def _load_snapshot(self, generation: int):
+        folder = self._snapshot_path(generation)
+        if self.read_only:
+            # Map the files instead of copying them onto this worker's heap
+            flags = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+            index = faiss.read_index(os.path.join(folder, INDEX_FILE), flags)
+            id_map = ChunkIdArray(np.load(os.path.join(folder, CHUNK_IDS_FILE), mmap_mode="r"))
+        else:
+            index = faiss.read_index(os.path.join(folder, INDEX_FILE))
+            id_map = dict(ChunkIdArray(np.load(os.path.join(folder, CHUNK_IDS_FILE))).items())
+        with open(os.path.join(folder, BOOK_MAP_FILE), "rb") as f:
+            book_ids = pickle.load(f)
+        deleted = ChunkIdArray(np.load(os.path.join(folder, CHUNK_IDS_FILE), mmap_mode="r")).empty_ids()
+        raw_path = os.path.join(self.base_dir, self._raw_name(folder))
+
+        with self._lock:
+            self.index, self.id_map, self.book_ids = index, id_map, book_ids
+            self.deleted, self._selector = deleted, None
+            if raw_path != self.raw.path:
+                self.raw = RawVectorFile(raw_path, self.dimension)
+            self.generation = generation
+
+    def _load_legacy(self):
+        """Single-file index + pickled id_map written before snapshots existed."""
+        index_file = os.path.join(self.base_dir, INDEX_FILE)
+        id_map_file = os.path.join(self.base_dir, ID_MAP_FILE)
+        book_map_file = os.path.join(self.base_dir, BOOK_MAP_FILE)
+        if os.path.exists(index_file) and os.path.exists(id_map_file):
+            self.index = faiss.read_index(index_file)
+            with open(id_map_file, "rb") as f:
                 self.id_map = pickle.load(f)
+            if os.path.exists(book_map_file):
+                with open(book_map_file, "rb") as f:
+                    self.book_ids = pickle.load(f)
+
+    def load_index(self):
+        if self.read_only:
+            # Readers only see published snapshots; writers own the log
+            generation = self._read_generation()
+            if generation:
+                self._load_snapshot(generation)
+            else:
+                self._load_legacy()
+            return
+
+        # Hold the file lock so a half-appended segment from another writer isn't mistaken for a torn tail
+        with file_lock(self.lock_file), self._lock:
+            generation = self._read_generation()
+            if generation:
+                self._load_snapshot(generation)
+            else:
+                self._load_legacy()
+
+            # Replay everything added since the snapshot
+            before = self.index.ntotal
+            self._catch_up()
+            replayed = self.index.ntotal - before
+
+        if replayed:
+            print(f"🔁 Replayed {replayed} vectors from the segment log.")
 
 # Global instance
-vector_store = VectorStore()
\ No newline at end of file
+vector_store = VectorStore()
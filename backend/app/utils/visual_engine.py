@@ -1,8 +1,10 @@
 import torch
 import os
-import hashlib
+from typing import Optional
 from diffusers.pipelines.auto_pipeline import AutoPipelineForText2Image
-from app.utils.llm import unload_model as unload_llm 
+from app.utils.model_registry import model_registry, disk_size_mb
+from app.utils.asset_cache import image_cache, asset_key, encode_image
+from app.utils.cache import LRUCache
 
 # --- CONFIG ---
 IMAGE_DIR = "static/images"
@@ -25,102 +27,196 @@ print(f"📂 DEBUG Project Path: {BACKEND_DIR}")
 print(f"📂 DEBUG Model Path:   {MODEL_PATH}")
 
 # Global variables
-_pipeline = None
 NUM_ANIMATION_FRAMES = 3 
 
-def get_visual_pipeline():
+# Frames per pipeline call. Frames of several prompts share a call when this is
+# larger than NUM_ANIMATION_FRAMES (more VRAM, better throughput)
+VISUAL_BATCH_SIZE = int(os.getenv("VISUAL_BATCH_SIZE", str(NUM_ANIMATION_FRAMES)))
+# Base seed; every frame's seed is derived from it and the prompt, so a prompt always
+# renders the same frames
+VISUAL_SEED = int(os.getenv("VISUAL_SEED", "0"))
+
+# Text-encoder output per frame prompt (tensors, so in-process only)
+_prompt_embeds_cache = LRUCache("prompt_embeds", max_items=int(os.getenv("PROMPT_EMBEDS_CACHE_SIZE", "256")), ttl_seconds=3600)
+
+def _load_visual_pipeline():
     """Loads the SD-Turbo model from LOCAL STORAGE."""
-    global _pipeline
-    if _pipeline is None:
-        print(f"🖼️ Loading SD-Turbo...")
-        
-        # Check if model exists
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"❌ Model missing at {MODEL_PATH}. Run 'python download_visuals.py' first!")
-
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        
-        # Load OFFLINE
-        try:
-            _pipeline = AutoPipelineForText2Image.from_pretrained(
-                MODEL_PATH, 
-                torch_dtype=torch.float16,
-                safety_checker=None,
-                local_files_only=True, # Forces offline mode
-                use_safetensors=True
-            ).to(device)
-
-            _pipeline.scheduler.set_timesteps(2, device=device)
-        except Exception as e:
-            print(f"❌ Error loading visual model: {e}")
-            raise e
-
-    return _pipeline
+    print(f"🖼️ Loading SD-Turbo...")
+    
+    # Check if model exists
+    if not os.path.exists(MODEL_PATH):
+        raise FileNotFoundError(f"❌ Model missing at {MODEL_PATH}. Run 'python download_visuals.py' first!")
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    # float16 is GPU-only in practice (very slow or unsupported on CPU)
+    dtype = torch.float16 if device == "cuda" else torch.float32
+    
+    # Load OFFLINE
+    try:
+        pipeline = AutoPipelineForText2Image.from_pretrained(
+            MODEL_PATH, 
+            torch_dtype=dtype,
+            safety_checker=None,
+            local_files_only=True, # Forces offline mode
+            use_safetensors=True
+        ).to(device)
+
+        pipeline.scheduler.set_timesteps(2, device=device)
+    except Exception as e:
+        print(f"❌ Error loading visual model: {e}")
+        raise e
+
+    return pipeline
+
+# The LLM is no longer unloaded before every generation: the registry unloads
+# whatever was used least recently, and only when SD-Turbo wouldn't fit otherwise
+model_registry.register(
+    "sd-turbo", _load_visual_pipeline,
+    estimate_mb=lambda: disk_size_mb(MODEL_PATH) if os.path.exists(MODEL_PATH) else 0,
+)
+
+def get_visual_pipeline():
+    """SD-Turbo, loaded on first use."""
+    return model_registry.get("sd-turbo")
 
 def unload_visual_pipeline():
-    """Unloads the SD-Turbo model."""
-    global _pipeline
-    if _pipeline is not None:
-        print("🪓 Unloading SD-Turbo from memory...")
-        del _pipeline
-        _pipeline = None
-        import torch
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+    """Unloads the SD-Turbo model (no-op while it is generating)."""
+    model_registry.unload("sd-turbo")
+
+def build_visual_prompt(prompt: str, style: str = "cinematic", character_focus: Optional[str] = None) -> str:
+    """
+    Day 32: Receives full Visual Spec to construct a better prompt.
+    """
+    # Construct a rich prompt based on the spec
+    # This helps consistency (Day 33/45 goal)
+    full_prompt = prompt
+
+    if character_focus:
+        full_prompt = f"focus on {character_focus}, {full_prompt}"
+
+    # Append style modifiers
+    if style == "cinematic":
+        full_prompt += ", cinematic lighting, 8k, detailed, depth of field"
+    elif style == "sketch":
+        full_prompt += ", pencil sketch, rough style, concept art"
+    else:
+        full_prompt += f", {style}"
+    return full_prompt
+
+def frame_prompts(prompt: str) -> list[str]:
+    """The per-frame prompts of one animation."""
+    return [
+        f"cinematic, highly detailed, {prompt}, frame {i+1} of {NUM_ANIMATION_FRAMES}, subtle camera motion"
+        for i in range(NUM_ANIMATION_FRAMES)
+    ]
+
+def frame_seed(prompt: str, frame: int) -> int:
+    """Seed of one frame: fixed for a prompt, different for every frame."""
+    return (int(asset_key("seed", prompt)[:8], 16) + VISUAL_SEED + frame) % 2**32
+
+def _prompt_embeds(pipeline, texts: list[str]):
+    """Text-encoder output for each text; texts not cached yet are encoded in one batch."""
+    embeds = {}
+    for text in texts:
+        cached = _prompt_embeds_cache.get(text)
+        if cached is not None:
+            embeds[text] = cached
+
+    missing = [t for t in dict.fromkeys(texts) if t not in embeds]
+    if missing:
+        with torch.no_grad():
+            encoded, _ = pipeline.encode_prompt(missing, pipeline.device, 1, False)
+        for text, embed in zip(missing, encoded):
+            embeds[text] = embed
+            _prompt_embeds_cache.set(text, embed)
+
+    return torch.stack([embeds[text] for text in texts])
+
+def render_frames(pipeline, prompts: list[str], batch_size: int = 0) -> list[list]:
+    """
+    All frames of all prompts, batch_size frames per pipeline call (prompt embeddings
+    from the cache, latents from seeded generators). Returns PIL images per prompt.
+    """
+    batch_size = batch_size or VISUAL_BATCH_SIZE
+    items = [(n, i, text) for n, prompt in enumerate(prompts) for i, text in enumerate(frame_prompts(prompt))]
+    images = [[] for _ in prompts]
+
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        # CPU generators give the same latents whatever device the pipeline is on
+        generators = [torch.Generator("cpu").manual_seed(frame_seed(prompts[n], i)) for n, i, _ in batch]
+        output = pipeline(
+            prompt_embeds=_prompt_embeds(pipeline, [text for _, _, text in batch]),
+            num_inference_steps=1,
+            guidance_scale=0.0,
+            generator=generators,
+        )
+        for (n, _, _), image in zip(batch, output.images):
+            images[n].append(image)
+        print(f"✅ Generated: {min(start + batch_size, len(items))}/{len(items)} frames")
+
+    return images
+
+def _store_frames(key: str, prompt: str, images: list) -> list[str]:
+    frames = []
+    for i, image in enumerate(images):
+        # File named after the cache key (Deterministic)
+        data, extension = encode_image(image)
+        frames.append((f"{key}_{i}{extension}", data))
+    # Written together, so a prompt is cached only with all its frames
+    return image_cache.put(key, frames, {"prompt": prompt[:200]})
+
+def draft_key(prompt: str) -> str:
+    """Image cache key of a prompt's frames."""
+    return asset_key("sd", prompt, os.path.basename(MODEL_PATH), NUM_ANIMATION_FRAMES)
+
+def _render_and_store(prompts: list[str]) -> list[list[str]]:
+    """Runs SD-Turbo for every frame of the prompts and stores them in the image cache."""
+    # Load Visuals pipeline (SD-Turbo), making room in RAM/VRAM if needed
+    with model_registry.use("sd-turbo") as pipeline:
+        images = render_frames(pipeline, prompts)
+    return [_store_frames(draft_key(prompt), prompt, frames) for prompt, frames in zip(prompts, images)]
+
+def generate_visual_drafts(prompts: list[str]) -> list[list[str]]:
+    """
+    Frame filenames for several prompts. Cached ones are returned as they are, the
+    rest are rendered together (VISUAL_BATCH_SIZE frames per pipeline call).
+    Raises on failure. Callers queueing prompts should dedupe them; unlike
+    generate_visual_draft() this does not wait for other requests' generations.
+    """
+    results = {}
+    missing = []
+    for prompt in dict.fromkeys(prompts):
+        # peek: the scheduler already counted this lookup when the job was queued
+        cached = image_cache.peek(draft_key(prompt))
+        if cached:
+            results[prompt] = cached
+        else:
+            missing.append(prompt)
+
+    if missing:
+        for prompt, filenames in zip(missing, _render_and_store(missing)):
+            results[prompt] = filenames
+
+    return [results[prompt] for prompt in prompts]
 
 def generate_visual_draft(prompt: str) -> list[str]: 
     """
-    Generates multiple images (frames).
-    UPDATE: Uses Prompt Hashing to cache images.
+    Generates multiple images (frames), all in one batched pipeline call.
+    UPDATE: Cached in the image asset cache (see asset_cache.py), keyed by prompt
+    (style included) + model + frame count. Identical prompts requested at the same
+    time share one generation.
     """
     try:
-        # 1. SMART CACHE CHECK
-        # Create a unique filename based on the text prompt
-        prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
-        
-        cached_filenames = []
-        all_cached = True
-        
-        # Check if we already have frames for this prompt
-        for i in range(NUM_ANIMATION_FRAMES):
-            filename = f"{prompt_hash}_{i}.png"
-            filepath = os.path.join(ABSOLUTE_IMAGE_DIR, filename)
-            if os.path.exists(filepath):
-                cached_filenames.append(filename)
-            else:
-                all_cached = False
-                break
-        
-        if all_cached:
-            print(f"⏩ Skipping generation (Cached): {prompt_hash[:8]}...")
+        # 1. SMART CACHE CHECK (peek: the scheduler already counted this lookup)
+        key = draft_key(prompt)
+        cached_filenames = image_cache.peek(key)
+        if cached_filenames:
+            print(f"⏩ Skipping generation (Cached): {key[:8]}...")
             return cached_filenames
 
-        # 2. GENERATION (If not cached)
-        # VRAM SWAP IN: UNLOAD LLM
-        unload_llm()
-        
-        # Load Visuals pipeline (SD-Turbo)
-        pipeline = get_visual_pipeline()
-        
-        generated_filenames = []
-        
-        for i in range(NUM_ANIMATION_FRAMES):
-            variation_prompt = f"{prompt}, frame {i+1} of {NUM_ANIMATION_FRAMES}, subtle camera motion"
-            full_prompt = f"cinematic, highly detailed, {variation_prompt}"
-            
-            image = pipeline(
-                full_prompt, 
-                num_inference_steps=1, 
-                guidance_scale=0.0 
-            ).images[0]
-            
-            # Save file with HASH name (Deterministic)
-            filename = f"{prompt_hash}_{i}.png" 
-            filepath = os.path.join(ABSOLUTE_IMAGE_DIR, filename)
-            image.save(filepath)
-            generated_filenames.append(filename)
-            
-            print(f"✅ Generated: {filename}")
+        # 2. GENERATION (If not cached, and nobody else is generating it)
+        generated_filenames = image_cache.generate_once(key, lambda: _render_and_store([prompt])[0])
 
         # 5. DO NOT UNLOAD (Keep ready for next scene)
         # unload_visual_pipeline()
@@ -129,4 +225,4 @@ def generate_visual_draft(prompt: str) -> list[str]:
 
     except Exception as e:
         print(f"❌ Visual Engine Error: {e}")
-        return ["error.png"]
\ No newline at end of file
+        return ["error.png"]
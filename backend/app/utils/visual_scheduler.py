@@ -0,0 +1,270 @@
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Optional
+
+# Image generations run here instead of on the request thread: a bounded queue
+# ordered by priority (the scene on screen before prefetched ones), served by a fixed
+# number of generator threads. When the queue is full, a request for the scene on
+# screen takes the place of the newest prefetch; otherwise submit() refuses at once
+# with an estimate of when to retry (HTTP 429), instead of letting requests pile up.
+
+# --- SCHEDULER CONFIG ---
+# Generations running at the same time (each holds SD-Turbo activations in VRAM)
+VISUAL_WORKERS = int(os.getenv("VISUAL_WORKERS", "1"))
+# Jobs waiting to start; more are refused
+VISUAL_QUEUE_SIZE = int(os.getenv("VISUAL_QUEUE_SIZE", "16"))
+# Finished jobs stay pollable this long
+VISUAL_JOB_TTL_SECONDS = float(os.getenv("VISUAL_JOB_TTL_SECONDS", "600"))
+# Queued prompts rendered together by one generator (their frames share pipeline calls)
+VISUAL_JOBS_PER_BATCH = int(os.getenv("VISUAL_JOBS_PER_BATCH", "1"))
+# Assumed seconds per generation until real ones are measured
+VISUAL_INITIAL_ESTIMATE_SECONDS = float(os.getenv("VISUAL_INITIAL_ESTIMATE_SECONDS", "5"))
+
+# Lower runs first
+PRIORITIES = {"current": 0, "prefetch": 1}
+
+class VisualQueueFullError(RuntimeError):
+    """The queue is full; retry_after is the estimated wait in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class VisualJob:
+    def __init__(self, key: str, prompt: str, priority: int):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.prompt = prompt
+        self.priority = priority
+        self.status = "queued"  # queued, running, done, failed
+        self.filenames = []
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = Future()  # Resolves to the filenames
+
+    def to_dict(self, position: Optional[int] = None) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": next(name for name, value in PRIORITIES.items() if value == self.priority),
+            "position": position,
+            "image_urls": [f"/static/images/{f}" for f in self.filenames],
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class VisualScheduler:
+    def __init__(self, render, render_batch=None, cached=None, key=None,
+                 workers: int = 0, queue_size: int = 0, jobs_per_batch: int = 0):
+        """
+        render(prompt) -> filenames, render_batch(prompts) -> [filenames, ...],
+        cached(key) -> filenames or None, key(prompt) -> cache key.
+        """
+        self.render = render
+        self.render_batch = render_batch
+        self.cached = cached or (lambda key: None)
+        self.key = key or (lambda prompt: prompt)
+        self.queue_size = queue_size or VISUAL_QUEUE_SIZE
+        self.jobs_per_batch = jobs_per_batch or VISUAL_JOBS_PER_BATCH
+
+        self._heap = []          # (priority, sequence, job); stale entries are skipped
+        self._sequence = itertools.count()
+        self._jobs = {}          # job id -> job
+        self._active = {}        # cache key -> queued/running job
+        self._queued = 0
+        self._running = 0
+        self._cond = threading.Condition()
+        self._avg_seconds = VISUAL_INITIAL_ESTIMATE_SECONDS
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.displaced = 0
+        self.deduplicated = 0
+
+        self.workers = [
+            threading.Thread(target=self._run, name=f"visual-worker-{n}", daemon=True)
+            for n in range(workers or VISUAL_WORKERS)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    # --- SUBMIT ---
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to be free."""
+        waiting = self._queued + self._running
+        return max(1, math.ceil(self._avg_seconds * waiting / len(self.workers)))
+
+    def submit(self, prompt: str, priority: str = "current") -> VisualJob:
+        """
+        Queues a generation and returns its job. Cached prompts come back already
+        done, and a prompt that is already queued or running returns that job
+        (moved up if this request has a higher priority).
+        """
+        rank = PRIORITIES.get(priority, PRIORITIES["prefetch"])
+        key = self.key(prompt)
+        with self._cond:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                self.deduplicated += 1
+                if job.status == "queued" and rank < job.priority:
+                    job.priority = rank
+                    heapq.heappush(self._heap, (rank, next(self._sequence), job))
+                return job
+
+            job = VisualJob(key, prompt, rank)
+            cached = self.cached(key)
+            if cached:
+                self._finish(job, cached, None)
+                self._jobs[job.id] = job
+                return job
+
+            if self._queued >= self.queue_size and not self._displace(rank):
+                self.rejected += 1
+                raise VisualQueueFullError(f"Image queue is full ({self._queued} jobs waiting)", self.retry_after())
+
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._queued += 1
+            heapq.heappush(self._heap, (rank, next(self._sequence), job))
+            self._cond.notify()
+        return job
+
+    def _displace(self, rank: int) -> bool:
+        """Drops the newest queued job of a lower priority than `rank` to free its slot."""
+        queued = [(p, s, j) for p, s, j in self._heap if j.status == "queued" and p == j.priority]
+        if not queued:
+            return False
+        priority, _, job = max(queued, key=lambda entry: entry[:2])
+        if priority <= rank:
+            return False
+        # Its heap entry goes stale and is skipped by _take()
+        job.status, job.error = "failed", "Dropped from the full queue for a higher-priority image."
+        job.finished_at = time.time()
+        self._queued -= 1
+        self._active.pop(job.key, None)
+        self.displaced += 1
+        job.future.set_exception(VisualQueueFullError(job.error, self.retry_after()))
+        return True
+
+    def get(self, job_id: str) -> Optional[VisualJob]:
+        return self._jobs.get(job_id)
+
+    def position(self, job: VisualJob) -> Optional[int]:
+        """Jobs that will start before this one (None once it has started)."""
+        with self._cond:
+            # Checked under the lock: a worker could otherwise pop the job in between
+            rank = min(((p, s) for p, s, j in self._heap if j is job), default=None)
+            if job.status != "queued" or rank is None:
+                return None
+            ahead = {id(j) for p, s, j in self._heap
+                     if j is not job and j.status == "queued" and (p, s) < rank}
+        return len(ahead)
+
+    # --- WORKERS ---
+    def _take(self) -> list:
+        """Highest-priority queued job plus the next ones for the same batch."""
+        jobs = []
+        while self._heap and len(jobs) < self.jobs_per_batch:
+            _, _, job = heapq.heappop(self._heap)
+            if job.status != "queued" or job in jobs:
+                continue  # Stale entry of a job that was moved up
+            job.status = "running"
+            job.started_at = time.time()
+            jobs.append(job)
+        self._queued -= len(jobs)
+        self._running += len(jobs)
+        return jobs
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                jobs = self._take()
+            if not jobs:
+                continue
+
+            start = time.perf_counter()
+            try:
+                if len(jobs) == 1 or self.render_batch is None:
+                    results = [self.render(job.prompt) for job in jobs]
+                else:
+                    results = self.render_batch([job.prompt for job in jobs])
+                errors = [None] * len(jobs)
+            except Exception as e:
+                print(f"❌ Visual job failed: {e}")
+                results, errors = [[] for _ in jobs], [str(e)] * len(jobs)
+            seconds = (time.perf_counter() - start) / len(jobs)
+
+            with self._cond:
+                # Moving average of one generation, for the 429 estimate
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * seconds
+                self._running -= len(jobs)
+                for job, filenames, error in zip(jobs, results, errors):
+                    self._finish(job, filenames, error)
+                    self._active.pop(job.key, None)
+
+    def _finish(self, job: VisualJob, filenames: list, error: Optional[str]):
+        if error is None and filenames == ["error.png"]:
+            error = "Visual generation failed (VRAM limit reached or SD error)."
+        job.finished_at = time.time()
+        if error is None:
+            job.status, job.filenames = "done", filenames
+            self.completed += 1
+            job.future.set_result(filenames)
+        else:
+            job.status, job.error = "failed", error
+            self.failed += 1
+            job.future.set_exception(RuntimeError(error))
+
+    def _prune(self):
+        """Forgets finished jobs older than VISUAL_JOB_TTL_SECONDS."""
+        cutoff = time.time() - VISUAL_JOB_TTL_SECONDS
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.workers),
+            "queued": self._queued,
+            "running": self._running,
+            "queue_size": self.queue_size,
+            "avg_generation_seconds": round(self._avg_seconds, 2),
+            "retry_after": self.retry_after(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "displaced": self.displaced,
+            "deduplicated": self.deduplicated,
+        }
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_visual_scheduler() -> VisualScheduler:
+    """The process-wide scheduler for SD-Turbo generations, started on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from app.utils import visual_engine
+            _scheduler = VisualScheduler(
+                render=visual_engine.generate_visual_draft,
+                render_batch=visual_engine.generate_visual_drafts,
+                cached=visual_engine.image_cache.get,
+                key=visual_engine.draft_key,
+            )
+            print(f"🎨 Started visual scheduler: {len(_scheduler.workers)} workers, queue {_scheduler.queue_size}")
+    return _scheduler
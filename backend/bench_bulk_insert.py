@@ -0,0 +1,90 @@
+"""
+Compares rows/sec for the old per-row ORM writes vs the bulk INSERT path
+(chunks, scenes, characters) against the database in DATABASE_URL.
+Everything is written under a throwaway book and deleted afterwards.
+
+Usage (from the backend folder):
+    python bench_bulk_insert.py
+    python bench_bulk_insert.py --chunks 20000 --scenes 2000 --characters 500
+"""
+import argparse
+import time
+import uuid
+from app.db.session import SessionLocal, engine, Base
+from app.db.schema_sync import sync_schema
+from app.models.catalog import Catalog
+from app.models.chunk import Chunk
+from app.models.scene import Scene, Character
+from app import crud
+
+parser = argparse.ArgumentParser(description="Benchmark per-row ORM vs bulk inserts")
+parser.add_argument("--chunks", type=int, default=5000)
+parser.add_argument("--scenes", type=int, default=1000)
+parser.add_argument("--characters", type=int, default=300)
+args = parser.parse_args()
+
+Base.metadata.create_all(bind=engine)
+sync_schema(engine, Base)
+
+def make_rows(catalog_id):
+    chunks = [
+        {"id": str(uuid.uuid4()), "catalog_id": catalog_id, "content": f"chunk text {i} " * 40,
+         "chunk_index": i, "page_number": i // 3 + 1, "page_end": i // 3 + 1}
+        for i in range(args.chunks)
+    ]
+    scenes = [
+        {"catalog_id": catalog_id, "order_index": i, "title": f"Scene {i}",
+         "content_summary": f"scene text {i} " * 60, "characters_present": ["A", "B"], "dialogues": []}
+        for i in range(args.scenes)
+    ]
+    # Extraction reports names with repeats; both paths must end up with unique rows
+    names = [f"Person {i % args.characters}" for i in range(args.characters * 2)]
+    return chunks, scenes, names
+
+def orm_path(db, catalog_id, chunks, scenes, names):
+    """The previous code: one ORM object per row, one SELECT per character."""
+    db.add_all([Chunk(**row) for row in chunks])
+    db.commit()
+    for name in names:
+        exists = db.query(Character).filter(Character.catalog_id == catalog_id, Character.name == name).first()
+        if not exists:
+            db.add(Character(catalog_id=catalog_id, name=name))
+            db.flush()
+    for row in scenes:
+        db.add(Scene(**row))
+    db.commit()
+
+def bulk_path(db, catalog_id, chunks, scenes, names):
+    crud.bulk_insert_chunks(db, chunks)
+    db.commit()
+    crud.bulk_insert_characters(db, catalog_id, names)
+    crud.bulk_insert_scenes(db, scenes)
+    db.commit()
+
+def run(label, write):
+    db = SessionLocal()
+    catalog_id = str(uuid.uuid4())
+    db.add(Catalog(id=catalog_id, title=f"bench {label}", author="bench"))
+    db.commit()
+    chunks, scenes, names = make_rows(catalog_id)
+    rows = len(chunks) + len(scenes) + len(names)
+    try:
+        start = time.perf_counter()
+        write(db, catalog_id, chunks, scenes, names)
+        seconds = time.perf_counter() - start
+        saved = db.query(Character).filter(Character.catalog_id == catalog_id).count()
+        print(f"{label:>5}: {seconds:7.2f}s  {rows / seconds:9.0f} rows/sec  ({saved} unique characters)")
+        return seconds
+    finally:
+        db.rollback()
+        for model in (Chunk, Scene, Character):
+            db.query(model).filter(model.catalog_id == catalog_id).delete()
+        db.query(Catalog).filter(Catalog.id == catalog_id).delete()
+        db.commit()
+        db.close()
+
+print(f"Writing {args.chunks} chunks, {args.scenes} scenes, {args.characters * 2} character mentions "
+      f"to {engine.dialect.name}...")
+orm_seconds = run("orm", orm_path)
+bulk_seconds = run("bulk", bulk_path)
+print(f"Speed-up: {orm_seconds / bulk_seconds:.1f}x")
@@ -0,0 +1,66 @@
+"""
+Shows that per-book search latency depends on the book's size, not the library's.
+Builds libraries of growing size (synthetic vectors, temp folder) with a fixed-size
+target book and times filtered vs unfiltered queries.
+
+Usage (from the backend folder):
+    python bench_filtered_search.py
+    python bench_filtered_search.py --type hnsw --book-size 2000
+"""
+import argparse
+import tempfile
+import time
+import uuid
+import faiss  # type: ignore
+import numpy as np
+from app.utils import vector_store as vs
+
+parser = argparse.ArgumentParser(description="Benchmark per-book filtered search")
+parser.add_argument("--type", default="flat", choices=vs.INDEX_TYPES)
+parser.add_argument("--book-size", type=int, default=1000)
+parser.add_argument("--sizes", default="10000,40000,160000", help="Library sizes (vectors)")
+parser.add_argument("--queries", type=int, default=200)
+args = parser.parse_args()
+
+# Keep the whole library in the log; we only care about search here
+vs.COMPACT_BYTES = 1 << 62
+rng = np.random.default_rng(7)
+
+def random_vectors(n):
+    x = rng.standard_normal((n, 384)).astype("float32")
+    faiss.normalize_L2(x)
+    return x
+
+def time_queries(store, queries, catalog_ids=None):
+    lat = []
+    for q in queries:
+        start = time.perf_counter()
+        store.search(q, k=10, catalog_ids=catalog_ids)
+        lat.append((time.perf_counter() - start) * 1000)
+    return np.percentile(lat, 50), np.percentile(lat, 99)
+
+print(f"📊 index={args.type}, book size={args.book_size}, {args.queries} queries\n")
+print(f"{'library':>10} {'book p50 ms':>12} {'book p99 ms':>12} {'all p50 ms':>11} {'all p99 ms':>11}")
+
+for size in [int(s) for s in args.sizes.split(",")]:
+    with tempfile.TemporaryDirectory() as folder:
+        store = vs.VectorStore(base_dir=folder)
+
+        # Target book first, then the rest of the library in book-sized batches
+        book = random_vectors(args.book_size)
+        store.add_vectors(book, [str(uuid.uuid4()) for _ in range(args.book_size)], catalog_id="target")
+        remaining = size - args.book_size
+        n = 0
+        while remaining > 0:
+            batch = min(args.book_size, remaining)
+            store.add_vectors(random_vectors(batch), [str(uuid.uuid4()) for _ in range(batch)], catalog_id=f"book-{n}")
+            remaining -= batch
+            n += 1
+
+        if args.type != "flat":
+            store.rebuild_index(args.type)
+
+        queries = book[rng.choice(args.book_size, size=args.queries)]
+        book_p50, book_p99 = time_queries(store, queries, catalog_ids=["target"])
+        all_p50, all_p99 = time_queries(store, queries)
+        print(f"{size:>10} {book_p50:>12.3f} {book_p99:>12.3f} {all_p50:>11.3f} {all_p99:>11.3f}")
@@ -0,0 +1,86 @@
+"""
+Recall-vs-latency report for the approximate index types, measured against the exact flat index.
+
+Usage (from the backend folder):
+    python bench_index.py                    # uses the vectors in vector_store.index
+    python bench_index.py --synthetic 200000 # random vectors, no saved index needed
+"""
+import argparse
+import time
+import faiss  # type: ignore
+import numpy as np
+from app.utils.vector_store import build_index, VectorStore
+
+parser = argparse.ArgumentParser(description="Benchmark vector index types")
+parser.add_argument("--synthetic", type=int, default=0, help="Number of random vectors to use instead of the saved index")
+parser.add_argument("--queries", type=int, default=200)
+parser.add_argument("--k", type=int, default=10)
+args = parser.parse_args()
+
+# --- 1. Load data ---
+rng = np.random.default_rng(42)
+if args.synthetic:
+    vectors = rng.standard_normal((args.synthetic, 384)).astype("float32")
+    faiss.normalize_L2(vectors)
+else:
+    vectors = VectorStore().all_vectors()
+
+if len(vectors) == 0:
+    raise SystemExit("❌ No vectors found. Ingest a book first or pass --synthetic N.")
+
+# Queries = stored vectors with a little noise (close to what real questions look like)
+picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+queries = vectors[picks] + 0.05 * rng.standard_normal((len(picks), vectors.shape[1])).astype("float32")
+queries = np.ascontiguousarray(queries, dtype="float32")
+
+print(f"📊 {len(vectors)} vectors, {len(queries)} queries, k={args.k}\n")
+
+def run(index, params=None):
+    """Returns (ids, per-query latencies in ms). Queries go one by one, like the API."""
+    ids = []
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        if params is None:
+            _, I = index.search(q.reshape(1, -1), args.k)
+        else:
+            _, I = index.search(q.reshape(1, -1), args.k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(I[0])
+    return np.array(ids), np.array(latencies)
+
+def recall(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+# --- 2. Ground truth ---
+flat = build_index("flat", vectors)
+truth, flat_lat = run(flat)
+
+print(f"{'index':<10} {'param':<14} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8}")
+print(f"{'flat':<10} {'-':<14} {1.0:>9.3f} {np.percentile(flat_lat, 50):>8.3f} {np.percentile(flat_lat, 99):>8.3f} {'-':>8}")
+
+# --- 3. Approximate indexes ---
+sweeps = {
+    "ivf_flat": [("nprobe", p) for p in (1, 4, 16, 64)],
+    "ivf_pq": [("nprobe", p) for p in (1, 4, 16, 64)],
+    "hnsw": [("efSearch", e) for e in (16, 32, 64, 128, 256)],
+}
+
+for index_type, settings in sweeps.items():
+    try:
+        start = time.perf_counter()
+        index = build_index(index_type, vectors)
+        build_seconds = time.perf_counter() - start
+    except ValueError as e:
+        print(f"{index_type:<10} skipped: {e}")
+        continue
+
+    for name, value in settings:
+        if name == "nprobe":
+            params = faiss.SearchParametersIVF(nprobe=value)
+        else:
+            params = faiss.SearchParametersHNSW(efSearch=value)
+        found, lat = run(index, params)
+        label = f"{name}={value}"
+        print(f"{index_type:<10} {label:<14} {recall(found, truth):>9.3f} {np.percentile(lat, 50):>8.3f} {np.percentile(lat, 99):>8.3f} {build_seconds:>8.2f}")
@@ -0,0 +1,74 @@
+"""
+Memory saved vs recall lost for the compressed vector storage modes (sq8, pq, ivf_pq),
+with and without re-ranking against the full-precision vectors.
+
+Usage (from the backend folder):
+    python bench_quantization.py                   # our corpus (vectors.f32 / saved index)
+    python bench_quantization.py --synthetic 50000 # random vectors
+"""
+import argparse
+import faiss  # type: ignore
+import numpy as np
+from app.utils.vector_store import build_index, exact_top_k, VectorStore
+
+parser = argparse.ArgumentParser(description="Benchmark quantized vector storage")
+parser.add_argument("--synthetic", type=int, default=0, help="Number of random vectors to use instead of the saved corpus")
+parser.add_argument("--queries", type=int, default=200)
+parser.add_argument("--k", type=int, default=10)
+parser.add_argument("--rerank", type=int, default=4, help="Candidates fetched per result before re-ranking")
+args = parser.parse_args()
+
+rng = np.random.default_rng(42)
+if args.synthetic:
+    vectors = rng.standard_normal((args.synthetic, 384)).astype("float32")
+    faiss.normalize_L2(vectors)
+else:
+    vectors = VectorStore(read_only=True).all_vectors()
+
+if len(vectors) == 0:
+    raise SystemExit("❌ No vectors found. Ingest a book first or pass --synthetic N.")
+
+picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+queries = vectors[picks] + 0.05 * rng.standard_normal((len(picks), vectors.shape[1])).astype("float32")
+queries = np.ascontiguousarray(queries, dtype="float32")
+k = args.k
+
+def recall(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def index_bytes(index):
+    return len(faiss.serialize_index(index))
+
+flat = build_index("flat", vectors)
+_, truth = flat.search(queries, k)
+flat_bytes = index_bytes(flat)
+
+print(f"📊 {len(vectors)} vectors, {len(queries)} queries, recall@{k}, re-rank x{args.rerank}\n")
+print(f"{'index':<8} {'MB':>9} {'B/vector':>9} {'saved':>7} {'recall':>8} {'+rerank':>8}")
+print(f"{'flat':<8} {flat_bytes / 1e6:>9.2f} {flat_bytes / len(vectors):>9.1f} {'1.0x':>7} {1.0:>8.3f} {'-':>8}")
+
+for index_type in ("sq8", "pq", "ivf_pq"):
+    try:
+        index = build_index(index_type, vectors)
+    except ValueError as e:
+        print(f"{index_type:<8} skipped: {e}")
+        continue
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = 16
+
+    size = index_bytes(index)
+    _, approx = index.search(queries, k)
+
+    # Re-rank: fetch more candidates from the compressed index, re-score them exactly
+    _, candidates = index.search(queries, k * args.rerank)
+    reranked = []
+    for q, cand in zip(queries, candidates):
+        cand = cand[cand >= 0]
+        _, I = exact_top_k(q, cand, vectors[cand], k)
+        reranked.append(I[0])
+
+    saved = f"{flat_bytes / size:.1f}x"
+    print(f"{index_type:<8} {size / 1e6:>9.2f} {size / len(vectors):>9.1f} {saved:>7} {recall(approx, truth):>8.3f} {recall(reranked, truth):>8.3f}")
+
+print("\nℹ️ Re-ranking reads the full-precision rows from vectors.f32 on disk, not RAM.")
@@ -0,0 +1,65 @@
+"""
+Narration latency: the old path (a fresh `piper` process per request, which reloads
+the voice every time) vs a warm worker from the TTS pool.
+Needs the Piper voices under app/models/llm_weights/piper/models.
+
+Usage (from the backend folder):
+    python bench_tts.py
+    python bench_tts.py --lang hi-ma --requests 20 --concurrency 4
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.utils import tts_pool as tp
+
+parser = argparse.ArgumentParser(description="Benchmark per-request Piper vs the TTS worker pool")
+parser.add_argument("--lang", default="en")
+parser.add_argument("--requests", type=int, default=10)
+parser.add_argument("--concurrency", type=int, default=1)
+parser.add_argument("--text", default="The army marched towards Moscow while snow fell over the quiet fields.")
+args = parser.parse_args()
+
+model_path = tp.voice_path(args.lang)
+
+def old_path(_):
+    """The previous code: one piper process per request."""
+    output = os.path.join(tempfile.gettempdir(), f"bench-{time.time_ns()}.wav")
+    start = time.perf_counter()
+    subprocess.run([tp.PIPER_EXE, "--model", model_path, "--output_file", output],
+                   input=args.text.encode("utf-8"), capture_output=True)
+    seconds = time.perf_counter() - start
+    if os.path.exists(output):
+        os.remove(output)
+    return seconds
+
+def pool_path(_):
+    start = time.perf_counter()
+    pool.synthesize(args.text, model_path)
+    return time.perf_counter() - start
+
+def run(label, fn):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as ex:
+        latencies = sorted(ex.map(fn, range(args.requests)))
+    total = time.perf_counter() - start
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:>8}: p50 {p50 * 1000:7.0f} ms  p95 {p95 * 1000:7.0f} ms  {args.requests / total:6.1f} req/s")
+    return p50
+
+if os.path.exists(tp.PIPER_EXE):
+    old_p50 = run("process", old_path)
+else:
+    old_p50 = 0.0
+    print(f"(no {tp.PIPER_EXE}, skipping the per-request baseline)")
+
+pool = tp.TTSPool(workers=max(1, args.concurrency))
+cold = pool_path(0)
+print(f"    pool: first request (loads the voice) {cold:.2f}s")
+pool_p50 = run("pool", pool_path)
+if old_p50:
+    print(f"Warm p50 speed-up: {old_p50 / pool_p50:.1f}x")
+pool.close()
@@ -0,0 +1,36 @@
+"""
+Recomputes every book's MinHash fingerprint (3-word shingles) from its stored text and
+fills the LSH bucket table used for near-duplicate detection at upload time.
+Run once for books ingested before the LSH index existed; new uploads are indexed automatically.
+
+Usage (from the backend folder):
+    python build_fingerprint_index.py
+"""
+from app.db.session import SessionLocal, engine, Base
+from app.db.schema_sync import sync_schema
+from app.models.catalog import Catalog
+from app.models.content import BookContent
+from app.utils.fingerprint import create_minhash, FINGERPRINT_CHARS
+from app import crud
+
+Base.metadata.create_all(bind=engine)
+sync_schema(engine, Base)
+
+db = SessionLocal()
+try:
+    rows = (
+        db.query(Catalog, BookContent.full_text)
+        .join(BookContent, BookContent.catalog_id == Catalog.id)
+        .all()
+    )
+    for book, full_text in rows:
+        if not full_text:
+            continue
+        book.fingerprints = create_minhash(full_text[:FINGERPRINT_CHARS]) # type: ignore
+        crud.index_fingerprint(db, str(book.id), book.fingerprints) # type: ignore
+        db.commit()
+        print(f"🔏 {book.title}")
+finally:
+    db.close()
+
+print("✅ Fingerprint index is up to date.")
@@ -0,0 +1,24 @@
+"""
+Backfills the BM25 lexical index for books ingested before it existed.
+New uploads are indexed automatically during ingestion.
+
+Usage (from the backend folder):
+    python build_lexical_index.py
+"""
+from app.db.session import SessionLocal
+from app.models.chunk import Chunk
+from app.utils.lexical_index import lexical_index
+
+db = SessionLocal()
+try:
+    book_ids = [row[0] for row in db.query(Chunk.catalog_id).distinct().all()]
+    for catalog_id in book_ids:
+        if lexical_index.has_book(str(catalog_id)):
+            print(f"⏩ {catalog_id} already indexed")
+            continue
+        rows = db.query(Chunk.id, Chunk.content).filter(Chunk.catalog_id == catalog_id).order_by(Chunk.chunk_index).all()
+        lexical_index.add_documents([str(r[0]) for r in rows], [str(r[1] or "") for r in rows], str(catalog_id))
+finally:
+    db.close()
+
+print("✅ Lexical index is up to date.")
@@ -0,0 +1,36 @@
+"""
+Rebuilds the FAISS vector index as a different index type (training it if needed).
+
+Usage (from the backend folder, with the API stopped):
+    python rebuild_index.py --type hnsw
+    python rebuild_index.py --type ivf_pq
+    python rebuild_index.py --backfill-books   # tag old vectors with their catalog_id
+
+Defaults to VECTOR_INDEX_TYPE from the environment.
+"""
+import argparse
+from app.utils.vector_store import vector_store, INDEX_TYPE, INDEX_TYPES
+
+parser = argparse.ArgumentParser(description="Rebuild the vector index")
+parser.add_argument("--type", default=INDEX_TYPE, choices=INDEX_TYPES)
+parser.add_argument("--backfill-books", action="store_true", help="Read chunk -> book links from Postgres for per-book search")
+args = parser.parse_args()
+
+print(f"📦 Current index: {vector_store.index_type} ({vector_store.index.ntotal} vectors)")
+
+if args.backfill_books:
+    from app.db.session import SessionLocal
+    from app.models.chunk import Chunk
+
+    db = SessionLocal()
+    try:
+        book_ids = [row[0] for row in db.query(Chunk.catalog_id).distinct().all()]
+        for catalog_id in book_ids:
+            chunk_ids = [row[0] for row in db.query(Chunk.id).filter(Chunk.catalog_id == catalog_id).all()]
+            tagged = vector_store.set_book_chunks(str(catalog_id), chunk_ids)
+            print(f"📚 {catalog_id}: {tagged} vectors tagged")
+    finally:
+        db.close()
+
+vector_store.rebuild_index(args.type)
+print("👉 Restart writer processes; read-only (VECTOR_STORE_MODE=readonly) workers reload on their own.")
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app from the backend folder, on a throwaway SQLite file (shared by
+# threads, unlike sqlite://) unless told otherwise
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
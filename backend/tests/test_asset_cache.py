@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from app.utils import single_flight
+from app.utils.asset_cache import AssetCache
+
+KB = 1024
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(single_flight, "SINGLE_FLIGHT_BACKEND", "local")
+    return AssetCache(str(tmp_path), budget_mb=1, name="test")
+
+def _put(cache, key, size_kb, used_at):
+    filename = cache.put(key, [(f"{key}.bin", b"x" * size_kb * KB)])[0]
+    os.utime(cache.path(filename), (used_at, used_at))
+    return filename
+
+def test_put_then_get(cache):
+    assert cache.get("a") is None
+    _put(cache, "a", 1, 1000)
+    assert cache.get("a") == ["a.bin"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_miss_then_generate_counts_one_miss(cache):
+    assert cache.get("a") is None
+    files = cache.generate_once("a", lambda: cache.put("a", [("a.bin", b"x")]))
+    assert files == ["a.bin"]
+    assert (cache.hits, cache.misses) == (0, 1)
+
+def test_evicts_least_recently_used_down_to_the_target(cache):
+    _put(cache, "old", 400, 1000)
+    _put(cache, "used", 400, 2000)
+    _put(cache, "new", 400, 3000)  # 1200 KB > 1024 KB budget
+
+    assert cache.peek("old") is None and not os.path.exists(cache.path("old.bin"))
+    assert cache.peek("used") and cache.peek("new")
+    assert cache.evicted == 1
+
+def test_get_counts_as_a_use(cache):
+    _put(cache, "a", 400, 1000)
+    _put(cache, "b", 400, 2000)
+    cache.get("a")  # Now newer than b
+    _put(cache, "c", 400, 3000)
+    assert cache.peek("a") and cache.peek("c")
+    assert cache.peek("b") is None
+
+def test_new_entry_is_kept_even_over_budget(cache):
+    _put(cache, "small", 100, 1000)
+    _put(cache, "huge", 2000, 500)  # Older mtime than everything, still kept
+    assert cache.peek("huge") == ["huge.bin"]
+    assert cache.peek("small") is None
+
+def test_untracked_files_are_adopted_and_evictable(tmp_path, monkeypatch):
+    monkeypatch.setattr(single_flight, "SINGLE_FLIGHT_BACKEND", "local")
+    legacy = tmp_path / "legacy.wav"
+    legacy.write_bytes(b"x" * 900 * KB)
+    os.utime(legacy, (1000, 1000))
+    cache = AssetCache(str(tmp_path), budget_mb=1, name="test")
+
+    _put(cache, "new", 400, 2000)
+    assert not legacy.exists()
+    assert cache.peek("new") == ["new.bin"]
+
+def test_peek_is_not_counted_and_keeps_mtime(cache):
+    _put(cache, "a", 1, 1000)
+    assert cache.peek("a") == ["a.bin"]
+    assert cache.peek("b") is None
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert os.path.getmtime(cache.path("a.bin")) == 1000
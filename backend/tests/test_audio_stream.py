@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import audio
+from app.utils.asset_cache import AssetCache
+
+TEXT = "The army crossed the river. Snow fell all night. Nobody slept."
+
+class FakeTTSPool:
+    """Yields one short PCM chunk per sentence, slowly, and counts syntheses."""
+    def __init__(self):
+        self.streams = 0
+
+    def stream(self, sentences, model_path):
+        self.streams += 1
+        for _ in sentences:
+            time.sleep(0.1)
+            yield 16000, b"\1\0" * 160
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    pool = FakeTTSPool()
+    monkeypatch.setattr(audio, "audio_cache", AssetCache(str(tmp_path), 10, "audio"))
+    monkeypatch.setattr(audio, "get_tts_pool", lambda: pool)
+    monkeypatch.setattr(audio, "_voice_model", lambda lang: "voice.onnx")
+    monkeypatch.setattr(audio, "AUDIO_DIR", str(tmp_path))
+    app = FastAPI()
+    app.include_router(audio.router, prefix="/api/audio")
+    return TestClient(app), pool
+
+def test_identical_streams_synthesize_once(client):
+    http, pool = client
+    responses = [None, None]
+
+    def get(i):
+        responses[i] = http.get("/api/audio/stream", params={"text": TEXT})
+
+    threads = [threading.Thread(target=get, args=(i,)) for i in range(2)]
+    threads[0].start()
+    time.sleep(0.05)  # The first one leads
+    threads[1].start()
+    for t in threads:
+        t.join()
+
+    assert pool.streams == 1
+    assert all(r.status_code == 200 for r in responses)
+    leader, follower = responses
+    # The live stream promises no file; the waiting request gets the finished one
+    assert "x-audio-url" not in leader.headers
+    assert http.get(follower.headers["x-audio-url"]).status_code == 200
+
+def test_cached_stream_sends_an_existing_file(client):
+    http, pool = client
+    first = http.get("/api/audio/stream", params={"text": TEXT})
+    assert first.status_code == 200 and len(first.content) > 960
+
+    again = http.get("/api/audio/stream", params={"text": TEXT})
+    assert pool.streams == 1
+    assert http.get(again.headers["x-audio-url"]).status_code == 200
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from app.utils.cache import LRUCache, RedisCache
+
+fakeredis = pytest.importorskip("fakeredis")
+
+def _redis_cache(max_items=3):
+    return RedisCache(fakeredis.FakeRedis(), "test", max_items=max_items, ttl_seconds=60)
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache("test", max_items=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+def test_redis_round_trips_vectors_and_results():
+    cache = _redis_cache()
+    vector = np.arange(4, dtype=np.float32) / 3
+    cache.set("vec", vector)
+    cache.set("res", [{"chunk_id": "c1", "score": np.float32(0.5), "page_number": None}])
+
+    loaded = cache.get("vec")
+    assert loaded.dtype == np.float32 and np.array_equal(loaded, vector)
+    assert cache.get("res") == [{"chunk_id": "c1", "score": 0.5, "page_number": None}]
+
+def test_redis_values_are_not_pickled():
+    cache = _redis_cache()
+    cache.set("res", {"a": 1})
+    assert cache.client.get(cache.prefix + "res") == b'{"a": 1}'
+
+def test_redis_keeps_max_items_least_recently_used():
+    cache = _redis_cache(max_items=3)
+    for key in "abc":
+        cache.set(key, key)
+    cache.get("a")  # b is now the least recently used
+    cache.set("d", "d")
+
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in "acd"] == ["a", "c", "d"]
+    assert cache.stats()["size"] == 3
+    assert not cache.client.exists(cache.prefix + "b")
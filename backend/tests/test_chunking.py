@@ -0,0 +1,15 @@
+from app.utils.chunking import chunk_pages
+
+# Plain text without page numbers, as ingest.process_chunks passes it
+TEXT = " ".join(f"Sentence number {n} is about the old city walls." for n in range(60))
+
+def test_text_without_page_numbers():
+    chunks = list(chunk_pages([{"page_number": None, "text": TEXT}], max_tokens=40, overlap_tokens=10))
+    assert len(chunks) > 1
+    assert all(c["page_start"] is None and c["page_end"] is None for c in chunks)
+
+def test_page_numbers_kept():
+    pages = [{"page_number": 1, "text": TEXT}, {"page_number": 2, "text": TEXT}]
+    chunks = list(chunk_pages(pages, max_tokens=40, overlap_tokens=10))
+    assert chunks[0]["page_start"] == 1
+    assert chunks[-1]["page_end"] == 2
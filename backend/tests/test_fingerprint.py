@@ -0,0 +1,36 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.session import Base
+from app.models.catalog import Catalog
+from app import crud
+from app.utils.fingerprint import create_minhash
+
+TEXT = " ".join(f"Chapter {n}: the army crossed the river at dawn near village {n}." for n in range(40))
+
+def _session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+def _add_book(db, signature):
+    book = Catalog(title="Book", author="Unknown", fingerprints=signature)
+    db.add(book)
+    db.flush()
+    crud.index_fingerprint(db, str(book.id), signature)
+    db.commit()
+    return book
+
+def test_textless_books_are_not_duplicates():
+    # Scanned PDFs: no text layer, or only a page number or two
+    assert create_minhash("") == []
+    assert create_minhash("12 13") == []
+
+    db = _session()
+    _add_book(db, create_minhash(""))
+    assert crud.find_similar_books(db, create_minhash(""), min_similarity=0.85) == []
+
+def test_same_text_is_a_duplicate():
+    db = _session()
+    original = _add_book(db, create_minhash(TEXT))
+    matches = crud.find_similar_books(db, create_minhash(TEXT), min_similarity=0.85)
+    assert [book.id for book, _ in matches] == [original.id]
@@ -0,0 +1,72 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.session import Base, SessionLocal, engine
+from app.models import catalog  # noqa: F401 (ingest_jobs references it)
+from app.models.job import IngestJob
+from app.utils import job_queue
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    session.query(IngestJob).delete()
+    session.commit()
+    yield session
+    session.close()
+
+def _job(db, job_id):
+    db.expire_all()
+    return db.get(IngestJob, job_id)
+
+def test_claimed_job_is_not_claimed_twice(db):
+    job = job_queue.enqueue_ingest_job(db, "book", "book.pdf")
+    assert job_queue.claim_next_job("w1") == job.id
+    assert job_queue.claim_next_job("w2") is None
+    assert _job(db, job.id).locked_by == "w1"
+
+def test_expired_lease_is_reclaimed(db):
+    job = job_queue.enqueue_ingest_job(db, "book", "book.pdf")
+    job_queue.claim_next_job("w1")
+    stale = _job(db, job.id)
+    stale.locked_at = datetime.utcnow() - timedelta(seconds=job_queue.LEASE_SECONDS + 1)
+    db.commit()
+
+    assert job_queue.claim_next_job("w2") == job.id
+    assert _job(db, job.id).attempts == 2
+    # The first worker finishing late doesn't overwrite the new owner's job
+    job_queue._finish_job(job.id, "w1")
+    assert _job(db, job.id).status == "running"
+    job_queue._finish_job(job.id, "w2")
+    assert _job(db, job.id).status == "done"
+
+def test_failed_job_is_retried_with_backoff(db):
+    job = job_queue.enqueue_ingest_job(db, "book", "book.pdf")
+    job_queue.claim_next_job("w1")
+    job_queue._finish_job(job.id, "w1", error="boom")
+    failed = _job(db, job.id)
+    assert failed.status == "queued" and failed.error == "boom"
+    assert failed.run_after > datetime.utcnow()
+    assert job_queue.claim_next_job("w2") is None  # Still backing off
+
+def test_heartbeat_keeps_a_silent_job_leased(db, monkeypatch):
+    monkeypatch.setattr(job_queue, "LEASE_SECONDS", 0.6)
+    monkeypatch.setattr(job_queue, "HEARTBEAT_SECONDS", 0.1)
+    job = job_queue.enqueue_ingest_job(db, "book", "book.pdf")
+    stop = threading.Event()
+    stolen = []
+
+    def handler(job_id, progress):
+        # A long stage that reports no progress (e.g. whole-book NER)
+        deadline = time.monotonic() + 1.5
+        while time.monotonic() < deadline:
+            stolen.append(job_queue.claim_next_job("w2"))
+            time.sleep(0.1)
+        stop.set()
+
+    job_queue.work_forever(handler, "w1", stop)
+    assert not any(stolen)
+    assert _job(db, job.id).status == "done"
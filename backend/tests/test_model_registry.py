@@ -0,0 +1,72 @@
+import threading
+import time
+
+from app.utils.model_registry import ModelRegistry
+
+MB = 1024 * 1024
+
+def _loader(size_mb):
+    def load():
+        model = b"\1" * (size_mb * MB)  # Touched pages, so they show up in RSS
+        time.sleep(0.2)
+        return model
+    return load
+
+def _load_together(registry, names):
+    threads = [threading.Thread(target=registry.get, args=(name,)) for name in names]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def test_concurrent_loads_measure_their_own_memory():
+    registry = ModelRegistry(ram_budget_mb=10_000)
+    for name in ("a", "b"):
+        registry.register(name, _loader(50), gpu=False)
+    _load_together(registry, ["a", "b"])
+
+    models = registry.stats()["models"]
+    assert 40 < models["a"]["ram_mb"] < 75
+    assert 40 < models["b"]["ram_mb"] < 75
+
+def test_concurrent_loads_stay_within_budget():
+    registry = ModelRegistry(ram_budget_mb=100)
+    resident, peak = [], []
+
+    def load():
+        model = _loader(60)()
+        resident.append(model)
+        peak.append(len(resident))
+        return model
+
+    for name in ("a", "b"):
+        registry.register(name, load, unloader=resident.remove, estimate_mb=60, gpu=False)
+    _load_together(registry, ["a", "b"])
+
+    # The second load waited and unloaded the first instead of overlapping it
+    assert max(peak) == 1
+    assert registry.stats()["ram_used_mb"] <= 100
+
+def test_model_in_use_is_not_unloaded():
+    registry = ModelRegistry(ram_budget_mb=100)
+    for name in ("a", "b", "c"):
+        registry.register(name, _loader(60), gpu=False)
+
+    with registry.use("a") as model:
+        registry.get("b")  # Over budget, but a is busy
+        assert registry.is_loaded("a") and registry.is_loaded("b")
+        assert registry.unload("a") is False
+        registry.get("c")  # b is idle, so it goes
+        assert not registry.is_loaded("b")
+        assert registry.is_loaded("a") and model is not None
+
+def test_least_recently_used_goes_first():
+    registry = ModelRegistry(ram_budget_mb=100)
+    for name in ("a", "b", "c"):
+        registry.register(name, _loader(40), gpu=False)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")
+    registry.get("c")
+    assert registry.is_loaded("a") and registry.is_loaded("c")
+    assert not registry.is_loaded("b")
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("diffusers")
+from app.db.session import Base, SessionLocal, engine
+from app.models.catalog import Catalog
+from app.models.scene import Scene, SceneAsset
+from app.utils import scene_assets, single_flight
+from app.utils.asset_cache import AssetCache
+from app.utils.planner import PLANNER_MODEL
+from app.utils.tts_piper import narration_key
+from app.utils.tts_pool import voice_path
+from app.utils.visual_engine import build_visual_prompt, draft_key
+
+SEGMENTS = [
+    {"text": "The army crossed the river.", "visual": {"background": "a frozen river at dawn"}},
+    {"text": "Snow fell all night.", "visual": {"background": "a snowy camp at night"}},
+]
+
+@pytest.fixture
+def scene(tmp_path, monkeypatch):
+    monkeypatch.setattr(single_flight, "SINGLE_FLIGHT_BACKEND", "local")
+    monkeypatch.setattr(scene_assets, "audio_cache", AssetCache(str(tmp_path / "audio"), 10, "audio"))
+    monkeypatch.setattr(scene_assets, "image_cache", AssetCache(str(tmp_path / "images"), 10, "images"))
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    book = Catalog(title="Book")
+    db.add(book)
+    db.flush()
+    scene = Scene(catalog_id=book.id, order_index=1, title="Crossing", content_summary="", characters_present=[])
+    db.add(scene)
+    db.flush()
+    db.add(SceneAsset(scene_id=scene.id, catalog_id=book.id, status="pending",
+                      plan={"scene_id": scene.id, "segments": SEGMENTS},
+                      audio=[], images=[], models={"planner": PLANNER_MODEL}))
+    db.commit()
+    yield db, scene.id
+    db.close()
+
+def _speak(lang):
+    """Narration stored the way /audio/speak stores it."""
+    for seg in SEGMENTS:
+        key = narration_key(seg["text"], lang, voice_path(lang))
+        scene_assets.audio_cache.put(key, [(f"{key}.wav", b"RIFF")])
+
+def _draw():
+    """Frames stored the way /visuals/generate stores them."""
+    for seg in SEGMENTS:
+        key = draft_key(build_visual_prompt(seg["visual"]["background"], "cinematic"))
+        scene_assets.image_cache.put(key, [(f"{key}_{n}.png", b"PNG") for n in range(2)])
+
+def test_assets_made_by_the_player_count(scene):
+    db, scene_id = scene
+    status = scene_assets.scene_status(db, scene_id)
+    assert not status["ready"] and len(status["missing"]) == 4
+
+    _speak("en")
+    _draw()
+    status = scene_assets.scene_status(db, scene_id)
+    assert status["ready"] and status["status"] == "ready"
+    assert status["audio_url"].startswith("/api/audio/file/")
+    assert len(status["image_urls"]) == 2
+
+def test_status_is_per_language(scene):
+    db, scene_id = scene
+    _speak("en")
+    _draw()
+    status = scene_assets.scene_status(db, scene_id, "hi-fe")
+    assert not status["ready"]
+    assert [m.split(":")[0] for m in status["missing"]] == ["audio", "audio"]
+    assert status["models"]["voice"] == os.path.basename(voice_path("hi-fe"))
+
+def test_plan_from_another_planner_is_stale(scene):
+    db, scene_id = scene
+    _speak("en")
+    _draw()
+    asset = db.get(SceneAsset, scene_id)
+    asset.models = {"planner": "old-planner"}  # type: ignore
+    db.commit()
+    status = scene_assets.scene_status(db, scene_id)
+    assert not status["ready"] and status["status"] == "stale"
@@ -0,0 +1,49 @@
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("spacy")
+from app.utils.scene_extraction import build_scenes, find_aliases
+
+FILLER = "The evening was long and the candles burned low over the table."
+
+def _scenes(paragraphs, characters, aliases=None):
+    text = "\n\n".join(f"{p} {FILLER}" for p in paragraphs)
+    return build_scenes(text, characters, aliases or {})
+
+def test_names_match_whole_words_only():
+    scenes = _scenes(["Anna's letter arrived.", "Ann walked in."], ["Ann"])
+    assert [s["characters"] for s in scenes] == [[], ["Ann"]]
+
+def test_possessive_counts_as_the_name():
+    scenes = _scenes(["Pierre's hat was wet."], ["Pierre"])
+    assert scenes[0]["characters"] == ["Pierre"]
+
+def test_alias_finds_the_full_name():
+    aliases = find_aliases(
+        ["Pierre Bezukhov", "Andrei Bolkonsky"],
+        Counter({"Pierre Bezukhov": 5, "Andrei Bolkonsky": 4, "Pierre": 3}),
+        known_aliases={"Andrei Bolkonsky": ["Prince Andrei"]},
+    )
+    assert aliases == {"Pierre Bezukhov": ["Pierre"], "Andrei Bolkonsky": ["Prince Andrei"]}
+
+    scenes = _scenes(["Pierre laughed.", "Prince Andrei frowned."],
+                     ["Pierre Bezukhov", "Andrei Bolkonsky"], aliases)
+    assert [s["characters"] for s in scenes] == [["Pierre Bezukhov"], ["Andrei Bolkonsky"]]
+
+def test_alias_claimed_by_two_characters_is_not_used():
+    aliases = find_aliases(["Natasha Rostova", "Nikolai Rostov", "Petya Rostov"],
+                           Counter({"Rostov": 2}))
+    assert "Rostov" not in aliases["Nikolai Rostov"] + aliases["Petya Rostov"]
+
+def test_quote_belongs_to_its_own_paragraph():
+    scenes = _scenes(['"Good evening," she said.', 'He smiled. "Good evening," he said.'], [])
+    assert [len(s["dialogues"]) for s in scenes] == [1, 1]
+    assert scenes[0]["dialogues"][0] == {"text": "Good evening,", "speaker": "Unknown"}
+
+def test_quote_over_a_paragraph_break_stays_in_the_opening_paragraph():
+    text = (f"{FILLER} He began: “We march at dawn.\n\nThe river will be frozen.”\n\n"
+            f"{FILLER} Nobody answered him.")
+    scenes = build_scenes(text, [], {})
+    assert scenes[0]["dialogues"] == [{"text": "We march at dawn. The river will be frozen.", "speaker": "Unknown"}]
+    assert all(not s["dialogues"] for s in scenes[1:])
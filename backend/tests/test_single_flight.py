@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app.utils import single_flight
+from app.utils.single_flight import SingleFlight
+
+@pytest.fixture
+def file_backend(monkeypatch):
+    monkeypatch.setattr(single_flight, "SINGLE_FLIGHT_BACKEND", "file")
+
+def _run(threads):
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def test_identical_calls_generate_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(single_flight, "SINGLE_FLIGHT_BACKEND", "local")
+    flight = SingleFlight("test", str(tmp_path))
+    calls, results = [], []
+
+    def generate():
+        calls.append(1)
+        time.sleep(0.2)
+        return "done"
+
+    _run([threading.Thread(target=lambda: results.append(flight.do("k", lambda: None, generate)))
+          for _ in range(8)])
+    assert len(calls) == 1
+    assert results == ["done"] * 8
+    assert flight.stats()["coalesced"] == 7
+
+def test_followers_get_the_leaders_exception(tmp_path, monkeypatch):
+    monkeypatch.setattr(single_flight, "SINGLE_FLIGHT_BACKEND", "local")
+    flight = SingleFlight("test", str(tmp_path))
+    errors = []
+
+    def generate():
+        time.sleep(0.2)
+        raise RuntimeError("boom")
+
+    def call():
+        try:
+            flight.do("k", lambda: None, generate)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    _run([threading.Thread(target=call) for _ in range(3)])
+    assert errors == ["boom"] * 3
+
+def test_other_worker_finds_the_cached_result(tmp_path, file_backend):
+    # Two instances sharing a lock folder stand in for two worker processes
+    first, second = SingleFlight("test", str(tmp_path)), SingleFlight("test", str(tmp_path))
+    cache = {}
+    calls = []
+
+    def generate():
+        calls.append(1)
+        time.sleep(0.3)
+        cache["k"] = "done"
+        return "done"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(first.do("k", lambda: cache.get("k"), generate)))
+    leader.start()
+    time.sleep(0.1)
+    results.append(second.do("k", lambda: cache.get("k"), generate))
+    leader.join()
+
+    assert len(calls) == 1
+    assert results == ["done", "done"]
+    assert second.cross_worker_hits == 1
+
+def test_unrelated_keys_do_not_wait_for_each_other(tmp_path, file_backend):
+    first, second = SingleFlight("test", str(tmp_path)), SingleFlight("test", str(tmp_path))
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    # These two keys used to share a lock file
+    leader = threading.Thread(target=lambda: first.do("key-4", lambda: None, slow))
+    leader.start()
+    started.wait(5)
+    t0 = time.monotonic()
+    assert second.do("key-80", lambda: None, lambda: "fast") == "fast"
+    assert time.monotonic() - t0 < 1
+    release.set()
+    leader.join()
+
+def test_lock_files_are_removed(tmp_path, file_backend):
+    flight = SingleFlight("test", str(tmp_path))
+    for key in ("a", "b", "c"):
+        flight.do(key, lambda: None, lambda: "x")
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".lock")]
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+@pytest.fixture
+def vs(tmp_path, monkeypatch):
+    # The module builds its global store in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    from app.utils import vector_store
+    # No background compaction unless a test asks for it
+    monkeypatch.setattr(vector_store, "PURGE_FRACTION", 2.0)
+    monkeypatch.setattr(vector_store, "RELOAD_CHECK_SECONDS", 0)
+    return vector_store
+
+def _vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, 384)).astype("float32")
+
+def _top(store, vector, **kwargs):
+    return store.search(vector, k=1, **kwargs)[0][0]
+
+def test_add_and_search(vs, tmp_path):
+    store = vs.VectorStore(str(tmp_path / "store"))
+    vectors = _vectors(4)
+    store.add_vectors(vectors[:2], ["a", "b"], "book1")
+    store.add_vectors(vectors[2:], ["c", "d"], "book2")
+
+    assert _top(store, vectors[2]) == "c"
+    results = store.search(vectors[2], k=4, catalog_ids=["book1"])
+    assert {chunk_id for chunk_id, _ in results} == {"a", "b"}
+    assert store.book_chunk_ids("book2") == {"c", "d"}
+
+def test_removed_chunks_are_not_returned(vs, tmp_path):
+    store = vs.VectorStore(str(tmp_path / "store"))
+    vectors = _vectors(3)
+    store.add_vectors(vectors, ["a", "b", "c"], "book")
+
+    assert store.remove_chunks(["b", "missing"], "book") == 1
+    assert "b" not in [chunk_id for chunk_id, _ in store.search(vectors[1], k=3)]
+    assert store.book_chunk_ids("book") == {"a", "c"}
+    assert store.remove_chunks(["b"], "book") == 0
+
+def test_log_is_replayed_on_restart(vs, tmp_path):
+    path = str(tmp_path / "store")
+    vectors = _vectors(3)
+    store = vs.VectorStore(path)
+    store.add_vectors(vectors, ["a", "b", "c"], "book")
+    store.remove_chunks(["a"], "book")
+
+    reopened = vs.VectorStore(path)
+    assert reopened.index.ntotal == 3
+    assert reopened.book_chunk_ids("book") == {"b", "c"}
+    assert _top(reopened, vectors[2]) == "c"
+
+def test_compact_publishes_a_snapshot_and_trims_the_log(vs, tmp_path):
+    path = str(tmp_path / "store")
+    vectors = _vectors(3)
+    store = vs.VectorStore(path)
+    store.add_vectors(vectors, ["a", "b", "c"], "book")
+    store.compact()
+
+    assert store.generation == 1 and store._log_size == 0
+    reopened = vs.VectorStore(path)
+    assert reopened.generation == 1
+    assert _top(reopened, vectors[1]) == "b"
+
+def test_compact_purges_removed_vectors(vs, tmp_path, monkeypatch):
+    store = vs.VectorStore(str(tmp_path / "store"))
+    vectors = _vectors(4)
+    store.add_vectors(vectors, ["a", "b", "c", "d"], "book")
+    store.remove_chunks(["a", "c"], "book")
+    monkeypatch.setattr(vs, "PURGE_FRACTION", 0.2)
+    store.compact()
+
+    # Live vectors renumbered 0..n-1, maps and search follow them
+    assert store.index.ntotal == 2 and not store.deleted
+    assert store.id_map == {0: "b", 1: "d"}
+    assert _top(store, vectors[3]) == "d"
+    assert store.book_chunk_ids("book") == {"b", "d"}
+
+def test_readonly_store_follows_the_writer(vs, tmp_path):
+    path = str(tmp_path / "store")
+    vectors = _vectors(3)
+    writer = vs.VectorStore(path, read_only=False)
+    writer.add_vectors(vectors[:2], ["a", "b"], "book")
+    writer.compact()
+
+    reader = vs.VectorStore(path, read_only=True)
+    assert _top(reader, vectors[1]) == "b"
+    with pytest.raises(RuntimeError):
+        reader.add_vectors(vectors[2:], ["c"], "book")
+    with pytest.raises(RuntimeError):
+        reader.remove_chunks(["a"], "book")
+
+    # Unpublished adds stay invisible to readers until the next snapshot
+    writer.add_vectors(vectors[2:], ["c"], "book")
+    assert _top(reader, vectors[2]) != "c"
+    writer.compact()
+    assert _top(reader, vectors[2]) == "c"
+    assert reader.generation == 2
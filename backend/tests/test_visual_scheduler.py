@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.visual_scheduler import VisualQueueFullError, VisualScheduler
+
+class Renderer:
+    """Renders instantly once released, blocking on the prompt "busy" first."""
+    def __init__(self):
+        self.order = []
+        self.release = threading.Event()
+
+    def __call__(self, prompt):
+        if prompt == "busy":
+            self.release.wait(5)
+        self.order.append(prompt)
+        return [f"{prompt}.png"]
+
+@pytest.fixture
+def scheduler():
+    renderer = Renderer()
+    scheduler = VisualScheduler(render=renderer, workers=1, queue_size=2)
+    # Occupy the only worker so everything after it stays queued
+    busy = scheduler.submit("busy")
+    while busy.status != "running":
+        time.sleep(0.01)
+    yield scheduler, renderer
+    renderer.release.set()
+
+def _wait(jobs):
+    return [job.future.result(timeout=5) for job in jobs]
+
+def test_current_runs_before_prefetch(scheduler):
+    scheduler, renderer = scheduler
+    jobs = [scheduler.submit("later", "prefetch"), scheduler.submit("now", "current")]
+    assert scheduler.position(jobs[1]) == 0 and scheduler.position(jobs[0]) == 1
+    renderer.release.set()
+    _wait(jobs)
+    assert renderer.order == ["busy", "now", "later"]
+
+def test_same_prompt_shares_a_job_and_moves_it_up(scheduler):
+    scheduler, renderer = scheduler
+    other = scheduler.submit("other", "prefetch")
+    first = scheduler.submit("scene", "prefetch")
+    again = scheduler.submit("scene", "current")
+    assert again is first and first.to_dict()["priority"] == "current"
+    renderer.release.set()
+    _wait([other, first])
+    assert renderer.order == ["busy", "scene", "other"]
+    assert scheduler.stats()["deduplicated"] == 1
+
+def test_full_queue_is_refused_with_retry_after(scheduler):
+    scheduler, renderer = scheduler
+    scheduler.submit("a", "current")
+    scheduler.submit("b", "current")
+    with pytest.raises(VisualQueueFullError) as refused:
+        scheduler.submit("c", "current")
+    assert refused.value.retry_after >= 1
+    with pytest.raises(VisualQueueFullError):
+        scheduler.submit("d", "prefetch")
+    assert scheduler.stats()["rejected"] == 2
+
+def test_current_takes_the_place_of_the_newest_prefetch(scheduler):
+    scheduler, renderer = scheduler
+    old = scheduler.submit("old", "prefetch")
+    new = scheduler.submit("new", "prefetch")
+    now = scheduler.submit("now", "current")
+
+    assert new.status == "failed"
+    with pytest.raises(VisualQueueFullError):
+        new.future.result(timeout=1)
+    renderer.release.set()
+    _wait([old, now])
+    assert renderer.order == ["busy", "now", "old"]
+    assert scheduler.stats()["displaced"] == 1
+    # The dropped prompt can be queued again
+    assert scheduler.submit("new", "prefetch") is not new
+
+def test_cached_prompt_is_done_without_queueing(scheduler):
+    scheduler, renderer = scheduler
+    scheduler.cached = lambda key: ["cached.png"] if key == "hit" else None
+    job = scheduler.submit("hit")
+    assert job.status == "done" and job.filenames == ["cached.png"]
+    assert scheduler.stats()["queued"] == 0
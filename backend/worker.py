@@ -0,0 +1,47 @@
+"""
+Ingestion worker. Takes queued books from the ingest_jobs table and runs
+parse -> chunk -> embed -> index -> scene graph on them.
+
+Run as many as you like (on one machine or several sharing Postgres/Redis/storage):
+    python worker.py                 # one worker process
+    python worker.py --processes 4   # four worker processes
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+
+def run_worker(number: int):
+    # Imported here so every process loads its own model + index
+    from app.db.session import engine, Base
+    from app.db.schema_sync import sync_schema
+    from app.models import catalog, content, job  # noqa: F401 (register tables)
+    from app.routes.ingest import run_ingest_job
+    from app.utils.job_queue import work_forever
+
+    Base.metadata.create_all(bind=engine)
+    sync_schema(engine, Base)
+    work_forever(run_ingest_job, worker_id=f"{socket.gethostname()}-{os.getpid()}-w{number}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Historabook ingestion worker")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(0)
+        return
+
+    workers = [multiprocessing.Process(target=run_worker, args=(n,)) for n in range(args.processes)]
+    for p in workers:
+        p.start()
+    print(f"🚀 Started {len(workers)} ingest worker processes.")
+    try:
+        for p in workers:
+            p.join()
+    except KeyboardInterrupt:
+        for p in workers:
+            p.terminate()
+
+if __name__ == "__main__":
+    main()